@@ -1,46 +1,91 @@
-from fastapi import FastAPI, Query
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from app.services import event_sync, geometry, metrics, org_registry, resilience, snapshots, spatial, stream, upstream
+from app.services import get_threat_alerts as threat_alerts
+from app.services.cache import cached, is_error_payload, response_cache
+from app.services.get_arr_mock import get_arr_mock as arr_mock_data
+from app.services.get_kill_chain_mock import get_kill_chain_mock_data
+from app.services.get_mitre_stats import day_cache, get_mitre_stats as load_mitre_stats
+from app.services.kill_chain import engine as kill_chain_engine
+from app.services.lifecycle import services
+from app.services.settings import settings
+from app.services.severity import SEVERITY_LEVELS, normalize_severity
+from app.services.singleflight import layer_flight, upstream_flight
 from app.services.get_nodes import get_all_nodes
-from app.services.get_layers import get_all_layers
-from app.services.get_nodeplot import get_nodes_and_links_by_layer
+from app.services.get_layers import get_layer_options
+from app.services.get_nodeplot import layer_graph, refresh_layer, refresh_layers
+from app.services.responses import FastJSONResponse, compressed_json, conditional_json, render_with_digest
 from pydantic import BaseModel
+from typing import Literal, Optional
 # from . import elastic_client, database, models, scheduler
 # from .routers import nodes, connections, rtarf_events, alerts, dashboard, network_graph, node_events
-import json
+from datetime import datetime, timezone
+import asyncio
 import logging
+import secrets
 import time
 
-# Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(name)s | %(levelname)s | %(message)s",
-    force=True
-)
 logger = logging.getLogger("app.main")
 
+@asynccontextmanager
+async def lifespan(app):
+    # Logging, snapshot refresher, event sync and optional warm-up (see services/lifecycle.py)
+    await services.start(settings)
+    yield
+    await services.stop()
+
 # FastAPI instance
 app = FastAPI(
     title="Defensive Operator API",
     description="API for nodes, layers, and nodeplot",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Request logging middleware
+# Request logging and metrics middleware
 @app.middleware("http")
 async def log_requests(request, call_next):
-    start_time = time.time()
-    logger.info(f"→ {request.method} {request.url.path}")
+    logger.debug("→ %s %s", request.method, request.url.path)
+
+    timing = metrics.RequestTiming()
+    metrics.current_timing.set(timing)
+    metrics.http_in_flight.inc(request.method)
+    status_code = 500
+    try:
+        # Every upstream call made for this request shares one deadline
+        with resilience.deadline(settings.request_deadline_seconds):
+            response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        metrics.http_in_flight.dec(request.method)
+        # Route template, not the raw path, so ids and query strings do not explode the label set
+        route = request.scope.get("route")
+        route_label = route.path if route is not None else "unmatched"
+        metrics.http_requests.inc(request.method, route_label, str(status_code))
+        metrics.http_duration.observe(request.method, route_label, str(status_code), value=time.perf_counter() - timing.started)
+    response.headers["Server-Timing"] = timing.header()
+
+    duration = time.perf_counter() - timing.started
+    logger.info("%s %s → %s (%.3fs)", request.method, request.url.path, status_code, duration, extra={
+        "method": request.method,
+        "path": request.url.path,
+        "route": route_label,
+        "status": status_code,
+        "duration_ms": round(duration * 1000, 2),
+    })
 
-    response = await call_next(request)
+    return response
 
-    process_time = time.time() - start_time
-    status_emoji = "✅" if response.status_code < 400 else "❌"
-    logger.info(
-        f"{status_emoji} {request.method} {request.url.path} → "
-        f"{response.status_code} ({process_time:.3f}s)"
-    )
+# Upstream calls cut short by the request deadline or an open circuit breaker
+@app.exception_handler(resilience.DeadlineExceeded)
+async def deadline_exceeded(request, exc):
+    return FastJSONResponse({"detail": str(exc)}, status_code=504)
 
-    return response
+@app.exception_handler(resilience.CircuitOpenError)
+async def circuit_open(request, exc):
+    return FastJSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": str(int(resilience.BREAKER_RESET_SECONDS))})
 
 allowed_origins = [
     "https://defnex-analytic.please-scan.com", #อันนี้ development environment
@@ -60,6 +105,25 @@ app.add_middleware(
 class MitreStatsRequest(BaseModel):
     FromDate: str
     ToDate: str
+
+class DistrictPoint(BaseModel):
+    id: Optional[str] = None
+    latitude: float
+    longitude: float
+    severity: Optional[str] = None
+
+class DistrictLookupRequest(BaseModel):
+    points: list[DistrictPoint]
+
+class OrgThreatEvent(BaseModel):
+    action: Literal["upsert", "resolve"] = "upsert"
+    org: str
+    # Same shape as a threat_list item; serverity is the numeric score
+    threat: Optional[dict] = None
+    incidentID: Optional[str] = None
+
+class OrgThreatIngestRequest(BaseModel):
+    events: list[OrgThreatEvent]
     
 # @app.on_event("startup")
 # async def startup_initialize():
@@ -126,101 +190,463 @@ class MitreStatsRequest(BaseModel):
 
 # Routes
 @app.get("/api/health", tags=["Health"])
-def health_check():
-    """Simple health check endpoint"""
-    return {"status": "healthy"}
+async def health_check():
+    """Simple health check endpoint; ready once startup (and warm-up, if enabled) finished"""
+    return {"status": "healthy", "ready": services.started}
 
 @app.get("/api/nodes", tags=["Nodes"])
-def get_nodes():
+async def get_nodes(request: Request):
     """Return all nodes"""
-    return get_all_nodes()
+    return conditional_json(request, await get_all_nodes())
+
+def read_snapshot(name):
+    """The named snapshot (or None), counted as a hit or miss for /metrics"""
+    snapshot = snapshots.store.get(name)
+    metrics.record_snapshot_read(name, snapshot is not None)
+    return snapshot
+
+async def from_snapshot(name, live_loader):
+    """Return (data, digest) from the named snapshot, else (cached live data, None)"""
+    snapshot = read_snapshot(name)
+    if snapshot is not None:
+        return snapshot.data, snapshot.content_hash
+    return await cached(name, live_loader), None
+
+def snapshot_body_response(request, snapshot):
+    """Serve a whole snapshot; its body and compressed variants are built once per version"""
+    return conditional_json(request, snapshot.data, snapshot.content_hash, body=snapshot.body, variants=snapshot.variants)
+
+def snapshot_part_response(request, snapshot, key, build_payload):
+    """Serve a payload derived from a snapshot (one layer, a set of layers), rendered once per version"""
+    body, digest = snapshot.rendered(key, lambda: render_with_digest(build_payload()))
+    return conditional_json(request, None, digest, body=body, variants=snapshot.variants)
+
+async def proxy_response(request, name):
+    """Serve a pure proxy route (GetDefConStatus, GetThreatSeverities, ...) without decoding it
+
+    Uses the snapshot's pre-rendered body when there is one, else the upstream
+    bytes and content type exactly as received, cached under `{name}:raw`.
+    """
+    snapshot = read_snapshot(name)
+    if snapshot is not None:
+        return snapshot_body_response(request, snapshot)
+    path = upstream.analytic_path(snapshots.ANALYTIC_SOURCES[name])
+    try:
+        raw = await cached(name, lambda: upstream.get_raw(path), key=f"{name}:raw")
+    except Exception as e:
+        # Same shape upstream.get_json_or_error reports failures in
+        return conditional_json(request, {"error": str(e)})
+    return conditional_json(request, None, raw.digest, body=raw.content, media_type=raw.media_type, variants=raw.variants)
+
+async def snapshot_response(request, name, loader):
+    """Serve the snapshot's pre-rendered body, else render what `loader` returns"""
+    snapshot = snapshots.store.get(name)
+    if snapshot is not None:
+        # A miss is counted by the loader's own snapshot read
+        metrics.record_snapshot_read(name, True)
+        return snapshot_body_response(request, snapshot)
+    return conditional_json(request, *await loader())
+
+async def load_layers():
+    return await from_snapshot("layers", get_layer_options)
+
+async def load_analytic(name):
+    """An ANALYTIC_SOURCES action from its snapshot, else from the upstream"""
+    path = upstream.analytic_path(snapshots.ANALYTIC_SOURCES[name])
+    return await from_snapshot(name, lambda: upstream.get_json_or_error(path))
+
+async def load_defcon_status():
+    return await load_analytic("defstatus")
+
+async def load_threat_severities():
+    return await load_analytic("severities")
+
+async def load_threat_distributions():
+    return await load_analytic("threatdistributions")
+
+async def load_threat_alerts():
+    return await load_analytic("threatalerts")
+
+async def load_bkk_org_status():
+    snapshot = snapshots.store.get("bkkthreat")
+    if snapshot is None:
+        snapshot = org_registry.registry.publish()
+    return snapshot.data, snapshot.content_hash
+
+async def load_arr_mock():
+    return arr_mock_data(), None
 
 @app.get("/api/layers", tags=["Layers"])
-def get_layers():
+async def get_layers(request: Request):
     """Return all layers with name and value"""
-    raw_layers = get_all_layers()
-    layers = [{"name": item["name"], "value": item["value"]} for item in raw_layers]
-    return layers
+    return await snapshot_response(request, "layers", load_layers)
 
 @app.get("/api/nodeplot", tags=["NodePlot"])
-def nodeplot(layer: str = Query(..., description="Layer name")):
-    """Return nodes and links for a specific layer"""
-    data = get_nodes_and_links_by_layer(layer)
-    if not data or not data.get('nodes'):
-        return [] 
-
-    nodes_list = []
-    for node_id, node in data['node_hash'].items():
-        status_json_str = data['status_hash'].get(node_id, {}).get('status', '{}')
-        try:
-            status = json.loads(status_json_str) if status_json_str else {}
-        except Exception:
-            status = {}
-
-        linked_nodes = []
-        for link in data['links']:
-            if link.get('sourceNode') == node_id and link.get('destinationNode'):
-                linked_nodes.append(link['destinationNode'])
-            elif link.get('destinationNode') == node_id and link.get('sourceNode'):
-                linked_nodes.append(link['sourceNode'])
-
-        nodes_list.append({
-            "id": node_id,
-            "name": node.get("name"),
-            "latitude": node.get("latitude"),
-            "longitude": node.get("longitude"),
-            "status": status,
-            "links": linked_nodes
-        })
-
-    return nodes_list
+async def nodeplot(
+    request: Request,
+    layer: str = Query(..., description="Layer name"),
+    edges: bool = Query(False, description="Return {nodes, edges} with a deduplicated edge list"),
+    bbox: Optional[str] = Query(None, description="west,south,east,north; only nodes inside are returned"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Map zoom; low zoom levels return clusters")
+):
+    """Return nodes and links for a specific layer, or only its visible part when bbox/zoom are given"""
+    viewport = bbox is not None or zoom is not None
+    try:
+        box = spatial.parse_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    snapshot = snapshots.store.get("nodeplot")
+    metrics.record_snapshot_read("nodeplot", snapshot is not None and layer in snapshot.data)
+    if snapshot is not None and layer in snapshot.data:
+        graph = snapshot.data[layer]
+        if viewport:
+            # Indexed once per snapshot version
+            index = snapshot.rendered(("spatial", layer), lambda: spatial.SpatialIndex(graph["nodes"]))
+            return conditional_json(request, spatial.viewport(index, graph, box, zoom, edges))
+        return snapshot_part_response(request, snapshot, ("nodeplot", layer, edges), lambda: graph if edges else graph["nodes"])
+
+    # Screens asking for the same layer at once share one graph build
+    data = await layer_flight.do(f"nodeplot:{layer}", lambda: refresh_layer(layer))
+    graph = layer_graph(data)
+    if viewport:
+        return conditional_json(request, spatial.viewport(spatial.SpatialIndex(graph["nodes"]), graph, box, zoom, edges))
+    return conditional_json(request, graph if edges else graph["nodes"])
+
+@app.get("/api/nodeplots", tags=["NodePlot"])
+async def nodeplots(
+    request: Request,
+    layers: Optional[str] = Query(None, description="Comma separated layer names; all layers when omitted"),
+    edges: bool = Query(False, description="Return {nodes, edges} per layer")
+):
+    """Return the graphs of several layers (or all of them) keyed by layer name"""
+    if layers:
+        requested = {name.strip() for name in layers.split(",") if name.strip()}
+    else:
+        all_layers, _ = await load_layers()
+        requested = {item["value"] for item in all_layers} if isinstance(all_layers, list) else set()
+    # Sorted so every order of the same layers shares one cached body on the snapshot
+    names = sorted(requested)
+
+    snapshot = snapshots.store.get("nodeplot")
+    metrics.record_snapshot_read("nodeplot", snapshot is not None and all(name in snapshot.data for name in names))
+    if snapshot is not None and all(name in snapshot.data for name in names):
+        return snapshot_part_response(
+            request, snapshot, ("nodeplots", tuple(names), edges),
+            lambda: {name: snapshot.data[name] if edges else snapshot.data[name]["nodes"] for name in names}
+        )
+
+    graphs = {}
+    missing = []
+    for name in names:
+        if snapshot is not None and name in snapshot.data:
+            graphs[name] = snapshot.data[name]
+        else:
+            missing.append(name)
+
+    if missing:
+        # Layers are built together so nodes shared between them are fetched once
+        key = "nodeplots:" + ",".join(sorted(missing))
+        fetched = await layer_flight.do(key, lambda: refresh_layers(missing))
+        for name, data in fetched.items():
+            graphs[name] = layer_graph(data)
+
+    result = {name: graphs[name] if edges else graphs[name]["nodes"] for name in names}
+    return conditional_json(request, result)
+
+async def load_geometry():
+    """District geometry; read from disk off the event loop on first use"""
+    try:
+        return await asyncio.to_thread(geometry.get_geometry)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=f"District geometry not available: {e.filename}")
+
+@app.get("/api/geo/districts", tags=["Geo"])
+async def get_districts(
+    request: Request,
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Map zoom; lower zoom levels get simpler outlines")
+):
+    """Bangkok district outlines simplified for the zoom level (full resolution when omitted)"""
+    geo = await load_geometry()
+    level = await asyncio.to_thread(geo.level, zoom)
+    # The file only changes with a deploy
+    return conditional_json(request, None, level.digest, cache_control="public, max-age=3600",
+                            body=level.body, variants=level.variants)
+
+@app.post("/api/geo/districts/lookup", tags=["Geo"])
+async def lookup_districts(body: DistrictLookupRequest):
+    """Assign points to districts and count them per district in one pass"""
+    if len(body.points) > geometry.MAX_LOOKUP_POINTS:
+        raise HTTPException(status_code=413, detail=f"At most {geometry.MAX_LOOKUP_POINTS} points per lookup")
+    geo = await load_geometry()
+    points = [
+        {**point.model_dump(), "severity": normalize_severity(point.severity) if point.severity else None}
+        for point in body.points
+    ]
+    # Point-in-polygon tests are CPU work; keep them off the event loop
+    assignments, districts, unmatched = await asyncio.to_thread(geo.assign, points)
+    return FastJSONResponse({"assignments": assignments, "districts": districts, "unmatched": unmatched})
+
+@app.get("/api/geo/districts/threats", tags=["Geo"])
+async def get_district_threats(
+    request: Request,
+    layer: Optional[str] = Query(None, description="Also count this nodeplot layer's nodes by status")
+):
+    """Per-district counts of current threat alerts with coordinates (and optionally a layer's nodes)"""
+    geo = await load_geometry()
+    alerts, _ = await load_threat_alerts()
+    if is_error_payload(alerts):
+        raise HTTPException(status_code=502, detail=str(alerts["error"]))
+    nodes = []
+    if layer:
+        snapshot = snapshots.store.get("nodeplot")
+        if snapshot is not None and layer in snapshot.data:
+            nodes = snapshot.data[layer]["nodes"]
+        else:
+            data = await layer_flight.do(f"nodeplot:{layer}", lambda: refresh_layer(layer))
+            nodes = layer_graph(data)["nodes"]
+
+    points = geometry.threat_points(nodes, threat_alerts.alerts_from_payload(alerts))
+    _, districts, unmatched = await asyncio.to_thread(geo.assign, points)
+    return conditional_json(request, {"layer": layer, "located": len(points), "unmatched": unmatched, "districts": districts})
+
+def require_ingest_token(authorization: Optional[str] = Header(None)):
+    """Bearer INGEST_TOKEN for routes that change server state; they are off when it is not set"""
+    if not settings.ingest_token:
+        raise HTTPException(status_code=503, detail="INGEST_TOKEN is not configured")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), settings.ingest_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of request, upstream, loop-lag, cache and snapshot metrics"""
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/cache/stats", tags=["Health"])
+async def cache_stats():
+    """Hit/miss counters for the upstream response cache and the MITRE day buckets"""
+    return {**response_cache.stats(), "mitre_days": day_cache.stats()}
+
+@app.get("/api/singleflight/stats", tags=["Health"])
+async def singleflight_stats():
+    """How many callers were coalesced onto a shared in-flight call"""
+    return {"upstream": upstream_flight.stats(), "nodeplot": layer_flight.stats()}
+
+@app.get("/api/upstream/status", tags=["Health"])
+async def get_upstream_status():
+    """Circuit breaker state, hedge delays and last-good fallbacks per upstream action"""
+    return resilience.status()
+
+@app.get("/api/scheduler/status", tags=["Scheduler"])
+async def get_scheduler_status():
+    """Snapshot refresher status plus event sync throughput, watermark and lag"""
+    return {
+        **snapshots.refresher.status(),
+        "event_sync": event_sync.syncer.status(),
+        "kill_chain": kill_chain_engine.stats(),
+        "startup": services.status(),
+    }
+
+@app.post("/api/scheduler/trigger-sync", tags=["Scheduler"], dependencies=[Depends(require_ingest_token)])
+async def trigger_manual_sync():
+    """Run one Elasticsearch event sync now and return its summary"""
+    if not event_sync.syncer.config.es_url:
+        raise HTTPException(status_code=503, detail="ES_URL is not configured")
+    return await event_sync.syncer.run_once()
 
 @app.get("/api/defstatus", tags=["DefconStatus"])
-def get_defcon_status():
-    from app.services.get_defcon_status import call_api, ORG_ID
-    return call_api(f"api/Analytic/org/{ORG_ID}/action/GetDefConStatus")
+async def get_defcon_status(request: Request):
+    return await proxy_response(request, "defstatus")
 
 @app.get("/api/severities", tags=["Severities"])
-def get_threat_severities():
-    from app.services.get_threat_severities import call_api, ORG_ID
-    return call_api(f"api/Analytic/org/{ORG_ID}/action/GetThreatSeverities")
+async def get_threat_severities(request: Request):
+    return await proxy_response(request, "severities")
 
 @app.get("/api/threatdistributions", tags=["ThreatDistributions"])
-def get_threat_alertsdistributions():
-    from app.services.get_threat_distributions import call_api, ORG_ID
-    return call_api(f"api/Analytic/org/{ORG_ID}/action/GetThreatDistributions")
+async def get_threat_alertsdistributions(request: Request):
+    return await proxy_response(request, "threatdistributions")
 
 @app.get("/api/threatalerts", tags=["ThreatAlerts"])
-def get_threat_alerts():
-    from app.services.get_threat_alerts import call_api, ORG_ID
-    return call_api(f"api/Analytic/org/{ORG_ID}/action/GetThreatAlerts")
+async def get_threat_alerts(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (default 100 when paging)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    severity: Optional[str] = Query(None, description="Comma separated: critical, high, medium, low"),
+    since: Optional[str] = Query(None, description="ISO-8601 lower bound on the alert time"),
+    until: Optional[str] = Query(None, description="ISO-8601 upper bound on the alert time"),
+    format: Optional[str] = Query(None, description="ndjson to stream one alert per line")
+):
+    """Full alert list, a page of {"alerts", "next_cursor"} when paging/filtering, or an NDJSON stream"""
+    streaming = format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", "")
+    if not streaming and limit is None and not any((cursor, severity, since, until)):
+        return await proxy_response(request, "threatalerts")
+
+    severities = frozenset(level.strip().lower() for level in (severity or "").split(",") if level.strip())
+    if severities - set(SEVERITY_LEVELS):
+        raise HTTPException(status_code=400, detail=f"Unknown severity: {', '.join(sorted(severities - set(SEVERITY_LEVELS)))}")
+    try:
+        alert_filter = threat_alerts.AlertFilter(
+            severities=severities,
+            since=threat_alerts.parse_time(since) if since else None,
+            until=threat_alerts.parse_time(until) if until else None,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since/until must be ISO-8601 timestamps")
+
+    if streaming:
+        if cursor:
+            raise HTTPException(status_code=400, detail="cursor is not supported with format=ndjson")
+        # Serve the in-memory snapshot when there is one, else decode the upstream as it arrives
+        snapshot = snapshots.store.get("threatalerts")
+        alerts = threat_alerts.alerts_from_payload(snapshot.data) if snapshot is not None else None
+        return StreamingResponse(
+            threat_alerts.alerts_ndjson(alerts, alert_filter, limit),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    data, _ = await load_threat_alerts()
+    if is_error_payload(data):
+        raise HTTPException(status_code=502, detail=str(data["error"]))
+    page_size = limit or threat_alerts.DEFAULT_PAGE_SIZE
+    try:
+        page, next_cursor = threat_alerts.paginate(
+            threat_alerts.alerts_from_payload(data), page_size, cursor, alert_filter
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return conditional_json(request, {"alerts": page, "next_cursor": next_cursor, "limit": page_size})
 
 @app.post("/api/mitrestats", tags=["Mitrestats"])
-def get_mitre_stats(body: MitreStatsRequest):
-    from app.services.get_mitre_stats import call_api, ORG_ID
-    
-    return call_api(
-        f"api/Analytic/org/{ORG_ID}/action/GetMitreStats",
-        payload=body.model_dump()
-    )
+async def get_mitre_stats(request: Request, body: MitreStatsRequest):
+    return compressed_json(request, await load_mitre_stats(body.FromDate, body.ToDate))
     
 @app.get("/api/bkkthreat", tags= ["BKKOrgStatus"])
-def get_bkk_org_status():
-    from app.services.get_bkk_org import get_all_org_status
-    return get_all_org_status()
+async def get_bkk_org_status(request: Request):
+    return await snapshot_response(request, "bkkthreat", load_bkk_org_status)
+
+@app.post("/api/bkkthreat/threats", tags= ["BKKOrgStatus"], dependencies=[Depends(require_ingest_token)])
+async def ingest_org_threats(body: OrgThreatIngestRequest):
+    """Add, update or resolve org threats; stats, status and top threats follow in the next read"""
+    events = []
+    for event in body.events:
+        if event.action == "upsert" and not (event.threat and event.threat.get("incidentID")):
+            raise HTTPException(status_code=400, detail="upsert events need a threat with an incidentID")
+        if event.action == "resolve" and not (event.incidentID or (event.threat or {}).get("incidentID")):
+            raise HTTPException(status_code=400, detail="resolve events need an incidentID")
+        events.append(event.model_dump())
+    try:
+        return org_registry.registry.apply(events)
+    except org_registry.UnknownOrgError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown org: {e.args[0]}")
+
+@app.get("/api/stream", tags=["Stream"])
+async def stream_updates(
+    request: Request,
+    topics: str = Query(..., description="Comma separated topics, e.g. defstatus,alerts,bkkthreat,nodeplot:RTARF-Internal")
+):
+    """Server-sent events: a full snapshot per topic, then JSON-patch diffs on change"""
+    topic_list = [topic.strip() for topic in topics.split(",") if topic.strip()]
+    invalid = [topic for topic in topic_list if not stream.is_valid_topic(topic)]
+    if not topic_list or invalid:
+        raise HTTPException(status_code=400, detail=f"Unknown topics: {', '.join(invalid) or topics}")
+
+    return StreamingResponse(
+        stream.event_stream(topic_list, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/api/arrmock", tags= ["ArrMock"])
-def get_arr_mock():
-    from app.services.get_arr_mock import get_arr_mock
-    return get_arr_mock()
+async def get_arr_mock(request: Request):
+    return conditional_json(request, *await load_arr_mock())
 
 @app.get("/api/killchain", tags=["CyberKillChain"])
-def get_cyber_kill_chain():
-    from app.services.get_kill_chain_mock import get_kill_chain_mock_data
-    default_day_range = 7
-    data = get_kill_chain_mock_data(day_range=default_day_range)
-    
-    return data
+async def get_cyber_kill_chain(
+    request: Request,
+    day_range: int = Query(7, alias="dayRange", ge=1, le=365),
+    tactic: str = Query("all", description="MITRE tactic name/ID or kill chain phase id"),
+    severity: str = Query("all", description="critical, high, medium, low or all"),
+    search: Optional[str] = Query(None, description="Not supported by the pre-aggregates; ignored")
+):
+    severity = severity.strip().lower()
+    if severity != "all" and severity not in SEVERITY_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Unknown severity: {severity}")
+
+    # Until the event sync feeds the engine, keep serving the mock
+    if kill_chain_engine.fed_by is None:
+        return conditional_json(request, get_kill_chain_mock_data(day_range=day_range))
+
+    data = kill_chain_engine.query(day_range=day_range, tactic=tactic, severity=severity)
+    return conditional_json(request, data)
+
+# Resources the dashboard batch endpoint can combine -> loader returning (data, digest)
+DASHBOARD_RESOURCES = {
+    "defstatus": load_defcon_status,
+    "severities": load_threat_severities,
+    "threatdistributions": load_threat_distributions,
+    "threatalerts": load_threat_alerts,
+    "layers": load_layers,
+    "bkkthreat": load_bkk_org_status,
+    "arrmock": load_arr_mock,
+}
+DEFAULT_DASHBOARD_RESOURCES = "defstatus,severities,threatdistributions,threatalerts,layers"
+
+@app.get("/api/dashboard", tags=["Dashboard"])
+async def get_dashboard(
+    request: Request,
+    resources: str = Query(DEFAULT_DASHBOARD_RESOURCES, description="Comma separated resource names")
+):
+    """Fetch several dashboard resources concurrently in one response
+
+    Each section carries its own status and freshness, so one failed upstream
+    does not fail the whole page. The ETag covers the section contents but
+    not their timestamps, so it is weak.
+    """
+    names = list(dict.fromkeys(name.strip() for name in resources.split(",") if name.strip()))
+    unknown = [name for name in names if name not in DASHBOARD_RESOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown resources: {', '.join(unknown)}")
+
+    results = await asyncio.gather(*(DASHBOARD_RESOURCES[name]() for name in names), return_exceptions=True)
+
+    sections = {}
+    # name -> what the ETag covers for that section
+    versions = {}
+    for name, result in zip(names, results):
+        digest = None
+        if not isinstance(result, Exception):
+            result, digest = result
+        snapshot = snapshots.store.get(name)
+        source = snapshots.refresher.sources.get(name)
+        if snapshot is not None and source is not None and source.last_refresh_at:
+            fetched_at, origin = source.last_refresh_at, "snapshot"
+        elif snapshot is not None and source is None:
+            # Pushed snapshots (the bkkthreat registry) have no refresher source
+            fetched_at, origin = snapshot.published_at, "snapshot"
+        elif response_cache.fetched_at(name):
+            fetched_at, origin = response_cache.fetched_at(name), "cache"
+        else:
+            fetched_at, origin = datetime.now(timezone.utc).isoformat(), "live"
+
+        if isinstance(result, Exception) or is_error_payload(result):
+            error = str(result) if isinstance(result, Exception) else result.get("error")
+            sections[name] = {"status": "error", "error": error, "data": None, "fetched_at": fetched_at, "source": origin}
+            versions[name] = ["error", error]
+        else:
+            sections[name] = {
+                "status": "ok",
+                "data": result,
+                "fetched_at": fetched_at,
+                "source": origin,
+                "version": snapshot.version if origin == "snapshot" else None
+            }
+            versions[name] = ["ok", digest or render_with_digest(result)[1]]
+
+    payload = {"generated_at": datetime.now(timezone.utc).isoformat(), "sections": sections}
+    _, digest = render_with_digest(versions)
+    return conditional_json(request, payload, digest, weak=True)
 
     
 
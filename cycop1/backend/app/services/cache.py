@@ -0,0 +1,150 @@
+"""
+In-process TTL cache for upstream responses.
+
+Entries are fresh for `ttl` seconds. After that they are served stale for up to
+`stale_ttl` more seconds while a single background refresh reloads them, so
+polling dashboards never wait on the upstream once a value is cached.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from app.services.settings import settings
+from app.services.upstream import parse_float_map
+
+# Per-endpoint (ttl, stale_ttl) in seconds
+DEFAULT_ENDPOINT_TTLS = {
+    "defstatus": (15.0, 300.0),
+    "severities": (15.0, 300.0),
+    "threatdistributions": (15.0, 300.0),
+    "threatalerts": (10.0, 300.0),
+    "layers": (60.0, 600.0),
+}
+
+
+def endpoint_ttls():
+    """Return the per-endpoint TTLs, with CACHE_TTLS overriding the fresh TTL"""
+    ttls = dict(DEFAULT_ENDPOINT_TTLS)
+    for name, ttl in parse_float_map(settings.cache_ttls).items():
+        stale_ttl = ttls.get(name, (ttl, ttl * 10))[1]
+        ttls[name] = (ttl, stale_ttl)
+    return ttls
+
+
+def is_error_payload(value):
+    """Loaders report failures as {"error": ...} (upstream.get_json_or_error); those are never cached"""
+    return isinstance(value, dict) and "error" in value
+
+
+@dataclass
+class CacheEntry:
+    value: object
+    stored_at: float
+    fresh_until: float
+    stale_until: float
+    fetched_at: str
+
+
+class TTLCache:
+    """Bounded LRU cache with per-key TTLs and stale-while-revalidate"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._refreshing = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+
+    def _store(self, key, value, ttl, stale_ttl):
+        now = time.monotonic()
+        fetched_at = datetime.now(timezone.utc).isoformat()
+        self._entries[key] = CacheEntry(value, now, now + ttl, now + ttl + stale_ttl, fetched_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _refresh(self, key, loader, ttl, stale_ttl, cacheable):
+        try:
+            value = await loader()
+            if cacheable(value):
+                self._store(key, value, ttl, stale_ttl)
+            else:
+                self.refresh_errors += 1
+        except Exception:
+            # Keep serving the stale value until it expires
+            self.refresh_errors += 1
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_load(self, key, loader, ttl, stale_ttl=0.0, cacheable=None):
+        """Return the cached value for key, calling `loader()` on a miss
+
+        A stale entry is returned immediately and refreshed in the background;
+        at most one refresh per key runs at a time.
+        """
+        cacheable = cacheable or (lambda value: not is_error_payload(value))
+        now = time.monotonic()
+        entry = self._entries.get(key)
+
+        if entry is not None and now < entry.stale_until:
+            self._entries.move_to_end(key)
+            if now < entry.fresh_until:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                if key not in self._refreshing:
+                    self.refreshes += 1
+                    self._refreshing[key] = asyncio.create_task(
+                        self._refresh(key, loader, ttl, stale_ttl, cacheable)
+                    )
+            return entry.value
+
+        self.misses += 1
+        value = await loader()
+        if cacheable(value):
+            self._store(key, value, ttl, stale_ttl)
+        return value
+
+    def fetched_at(self, key):
+        """Wall-clock time the cached value for key was loaded, if cached"""
+        entry = self._entries.get(key)
+        return entry.fetched_at if entry is not None else None
+
+    def invalidate(self, key=None):
+        """Drop one key, or every key when none is given"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "evictions": self.evictions,
+            "refreshing": len(self._refreshing),
+        }
+
+
+response_cache = TTLCache(maxsize=settings.cache_max_entries)
+ENDPOINT_TTLS = endpoint_ttls()
+
+
+async def cached(name, loader, key=None):
+    """Serve `loader()` through the shared response cache using `name`'s TTLs"""
+    ttl, stale_ttl = ENDPOINT_TTLS.get(name, (0.0, 0.0))
+    return await response_cache.get_or_load(key or name, loader, ttl, stale_ttl)
@@ -0,0 +1,516 @@
+"""
+Incremental Elasticsearch -> local store event sync.
+
+Each run opens a point-in-time (PIT) on the event index and pages through
+everything at or after the persisted high-watermark with `search_after`,
+oldest first. Pages flow through a bounded queue to a writer that upserts
+them in multi-row batches keyed on event_id; when the writer falls behind,
+the queue fills and the fetcher waits, so memory stays at a few pages no
+matter how many events are pending.
+
+The watermark (epoch millis of the newest written event) is stored in the
+same transaction as the rows it covers. Events that share the watermark
+timestamp are read again by the next run; the upsert compares them with the
+stored rows and skips the unchanged ones, so they are neither rewritten nor
+counted again.
+
+The target is any DB-API database that understands
+`INSERT ... ON CONFLICT (...) DO UPDATE`: SQLite (stdlib) or PostgreSQL
+(psycopg2).
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import httpx
+
+from app.services.settings import settings
+
+logger = logging.getLogger("app.event_sync")
+
+SYNC_NAME = "rtarf_events"
+
+EVENT_COLUMNS = ("event_id", "timestamp", "severity", "description", "tactics", "techniques", "document", "synced_at")
+SYNCED_AT = EVENT_COLUMNS.index("synced_at")
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS synced_events (
+        event_id VARCHAR(255) PRIMARY KEY,
+        timestamp VARCHAR(40) NOT NULL,
+        severity VARCHAR(50),
+        description TEXT,
+        tactics TEXT,
+        techniques TEXT,
+        document TEXT,
+        synced_at VARCHAR(40)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_synced_events_timestamp ON synced_events (timestamp)",
+    """
+    CREATE TABLE IF NOT EXISTS sync_metadata (
+        name VARCHAR(100) PRIMARY KEY,
+        watermark BIGINT,
+        total_synced BIGINT,
+        updated_at VARCHAR(40)
+    )
+    """,
+)
+
+
+@dataclass
+class SyncConfig:
+    es_url: str = ""
+    es_index: str = "rtarf-events-*"
+    es_username: str = ""
+    es_password: str = ""
+    es_verify_certs: bool = True
+    timestamp_field: str = "@timestamp"
+    database_url: str = "sqlite:///./events.db"
+    page_size: int = 1000
+    batch_size: int = 500
+    queue_pages: int = 4
+    pit_keep_alive: str = "1m"
+    interval_seconds: float = 300.0
+    start_from: str = ""
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            es_url=settings.es_url.rstrip("/"),
+            es_index=settings.es_index,
+            es_username=settings.es_username,
+            es_password=settings.es_password,
+            es_verify_certs=settings.es_verify_certs,
+            timestamp_field=settings.es_timestamp_field,
+            database_url=settings.event_sync_database_url,
+            page_size=settings.event_sync_page_size,
+            batch_size=settings.event_sync_batch_size,
+            queue_pages=settings.event_sync_queue_pages,
+            pit_keep_alive=settings.event_sync_pit_keep_alive,
+            interval_seconds=settings.rtarf_sync_interval_seconds,
+            start_from=settings.event_sync_start_from,
+        )
+
+
+def epoch_millis(value):
+    moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def millis_to_iso(millis):
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc).isoformat()
+
+
+def _first(source, *names):
+    for name in names:
+        if source.get(name):
+            return source[name]
+    return None
+
+
+def event_row(hit, synced_at):
+    """Map a search hit to a synced_events row (Palo-XSIAM / CrowdStrike / Suricata fields)"""
+    source = hit.get("_source") or {}
+    return (
+        str(source.get("event_id") or hit["_id"]),
+        millis_to_iso(hit["sort"][0]),
+        _first(source, "severity", "crowdstrike_severity"),
+        _first(source, "description", "crowdstrike_event_objective", "suricata_classification"),
+        json.dumps(_first(source, "mitre_tactics_ids_and_names", "crowdstrike_tactics") or [], ensure_ascii=False),
+        json.dumps(_first(source, "mitre_techniques_ids_and_names", "crowdstrike_techniques") or [], ensure_ascii=False),
+        json.dumps(source, ensure_ascii=False, default=str),
+        synced_at,
+    )
+
+
+@dataclass
+class UpsertResult:
+    """What one upsert batch did: new rows, (stored, new) pairs for changed rows, and a count of unchanged ones"""
+    inserted: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    unchanged: int = 0
+
+
+class EventStore:
+    """synced_events + sync_metadata on SQLite or PostgreSQL
+
+    One connection is shared by the worker threads that call it (the sync
+    writer, the kill chain load), so every use holds `_lock`.
+    """
+
+    def __init__(self, database_url):
+        self.database_url = database_url
+        self.is_sqlite = database_url.startswith("sqlite:")
+        # SQLite allows 32766 bound parameters per statement, PostgreSQL 65535
+        self.max_params = 32766 if self.is_sqlite else 65535
+        self.placeholder = "?" if self.is_sqlite else "%s"
+        self._conn = None
+        # Reentrant: the methods below call connect() while holding it
+        self._lock = threading.RLock()
+
+    def connect(self):
+        with self._lock:
+            if self._conn is not None:
+                return self._conn
+            if self.is_sqlite:
+                path = self.database_url.split("sqlite:///", 1)[-1] or ":memory:"
+                # Used from worker threads, one at a time under _lock
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            else:
+                import psycopg2
+
+                self._conn = psycopg2.connect(self.database_url)
+            cursor = self._conn.cursor()
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            self._conn.commit()
+            return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_watermark(self, name=SYNC_NAME):
+        """Return (watermark_millis, total_synced), or (None, 0) before the first sync"""
+        with self._lock:
+            cursor = self.connect().cursor()
+            cursor.execute(f"SELECT watermark, total_synced FROM sync_metadata WHERE name = {self.placeholder}", (name,))
+            row = cursor.fetchone()
+        return (row[0], row[1] or 0) if row else (None, 0)
+
+    def _existing(self, cursor, event_ids):
+        """Stored rows for event_ids, keyed by event_id"""
+        existing = {}
+        for start in range(0, len(event_ids), self.max_params):
+            chunk = event_ids[start:start + self.max_params]
+            cursor.execute(
+                f"SELECT {', '.join(EVENT_COLUMNS)} FROM synced_events "
+                f"WHERE event_id IN ({', '.join([self.placeholder] * len(chunk))})",
+                chunk,
+            )
+            for row in cursor.fetchall():
+                existing[row[0]] = tuple(row)
+        return existing
+
+    def upsert(self, rows, watermark, name=SYNC_NAME):
+        """Insert new rows, update changed ones and advance the watermark in one transaction
+
+        Rows identical to the stored ones (apart from synced_at), such as the
+        events re-read at the watermark after a resume, are not written and
+        not counted in total_synced.
+        """
+        # One statement may not touch the same row twice (PostgreSQL rejects it)
+        rows = list({row[0]: row for row in rows}.values())
+        with self._lock:
+            conn = self.connect()
+            cursor = conn.cursor()
+            row_sql = "(" + ", ".join([self.placeholder] * len(EVENT_COLUMNS)) + ")"
+            updates = ", ".join(f"{column} = excluded.{column}" for column in EVENT_COLUMNS[1:])
+            per_statement = max(1, self.max_params // len(EVENT_COLUMNS))
+            try:
+                existing = self._existing(cursor, [row[0] for row in rows])
+                result = UpsertResult()
+                changed = []
+                for row in rows:
+                    stored = existing.get(row[0])
+                    if stored is None:
+                        result.inserted.append(row)
+                    elif stored[:SYNCED_AT] != row[:SYNCED_AT]:
+                        result.updated.append((stored, row))
+                    else:
+                        result.unchanged += 1
+                        continue
+                    changed.append(row)
+                for start in range(0, len(changed), per_statement):
+                    chunk = changed[start:start + per_statement]
+                    cursor.execute(
+                        f"INSERT INTO synced_events ({', '.join(EVENT_COLUMNS)}) "
+                        f"VALUES {', '.join([row_sql] * len(chunk))} "
+                        f"ON CONFLICT (event_id) DO UPDATE SET {updates}",
+                        [value for row in chunk for value in row],
+                    )
+                p = self.placeholder
+                cursor.execute(
+                    f"INSERT INTO sync_metadata (name, watermark, total_synced, updated_at) VALUES ({p}, {p}, {p}, {p}) "
+                    "ON CONFLICT (name) DO UPDATE SET watermark = excluded.watermark, "
+                    "total_synced = sync_metadata.total_synced + excluded.total_synced, updated_at = excluded.updated_at",
+                    (name, watermark, len(changed), datetime.now(timezone.utc).isoformat()),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return result
+
+    def read_since(self, timestamp, after_id="", limit=5000):
+        """Up to `limit` rows at or after an ISO timestamp, ordered by (timestamp, event_id)
+
+        Pass the last row's timestamp and event_id back to read the next chunk.
+        """
+        p = self.placeholder
+        with self._lock:
+            cursor = self.connect().cursor()
+            cursor.execute(
+                f"SELECT {', '.join(EVENT_COLUMNS)} FROM synced_events "
+                f"WHERE timestamp > {p} OR (timestamp = {p} AND event_id > {p}) "
+                f"ORDER BY timestamp, event_id LIMIT {int(limit)}",
+                (timestamp, timestamp, after_id),
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def count(self):
+        with self._lock:
+            cursor = self.connect().cursor()
+            cursor.execute("SELECT COUNT(*) FROM synced_events")
+            return cursor.fetchone()[0]
+
+
+class ElasticSource:
+    """Pages of hits at/after a watermark, via PIT + search_after"""
+
+    def __init__(self, config, client=None):
+        self.config = config
+        self._client = client
+
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            auth = httpx.BasicAuth(self.config.es_username, self.config.es_password) if self.config.es_username else None
+            self._client = httpx.AsyncClient(
+                base_url=self.config.es_url,
+                auth=auth,
+                verify=self.config.es_verify_certs,
+                headers={"Content-Type": "application/json"},
+                timeout=httpx.Timeout(30.0, connect=5.0),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def pages(self, watermark):
+        """Yield lists of hits sorted by timestamp, one search page at a time"""
+        client = self.client()
+        response = await client.post(f"/{self.config.es_index}/_pit", params={"keep_alive": self.config.pit_keep_alive})
+        response.raise_for_status()
+        pit_id = response.json()["id"]
+
+        query = {"match_all": {}}
+        if watermark is not None:
+            query = {"range": {self.config.timestamp_field: {"gte": watermark, "format": "epoch_millis"}}}
+        body = {
+            "size": self.config.page_size,
+            "query": query,
+            "sort": [{self.config.timestamp_field: "asc"}, {"_shard_doc": "asc"}],
+            "track_total_hits": False,
+        }
+        try:
+            while True:
+                body["pit"] = {"id": pit_id, "keep_alive": self.config.pit_keep_alive}
+                response = await client.post("/_search", json=body)
+                response.raise_for_status()
+                result = response.json()
+                # The PIT id may change between pages
+                pit_id = result.get("pit_id", pit_id)
+                hits = result["hits"]["hits"]
+                if not hits:
+                    return
+                yield hits
+                if len(hits) < self.config.page_size:
+                    return
+                body["search_after"] = hits[-1]["sort"]
+        finally:
+            try:
+                await client.request("DELETE", "/_pit", json={"id": pit_id})
+            except httpx.HTTPError as e:
+                logger.warning("Failed to close PIT: %s", e, extra={"index": self.config.es_index})
+
+
+@dataclass
+class SyncRun:
+    started_at: str
+    pages: int = 0
+    fetched: int = 0
+    # Rows handed to the store; of those, only inserted + updated were written
+    processed: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    batches: int = 0
+    duration_seconds: float = 0.0
+    status: str = "running"
+    error: str = None
+
+    def as_dict(self):
+        return {
+            "started_at": self.started_at,
+            "status": self.status,
+            "error": self.error,
+            "pages": self.pages,
+            "fetched": self.fetched,
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "batches": self.batches,
+            "duration_seconds": round(self.duration_seconds, 3),
+            "events_per_second": round(self.processed / self.duration_seconds, 1) if self.duration_seconds else 0.0,
+        }
+
+
+class EventSync:
+    def __init__(self, config, store=None, source=None):
+        self.config = config
+        self.store = store or EventStore(config.database_url)
+        self.source = source or ElasticSource(config)
+        self.is_running = False
+        self.total_runs = 0
+        self.failed_runs = 0
+        self.last_run = None
+        self.watermark = None
+        # Called with each batch's UpsertResult once it is committed
+        self.listeners = []
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    async def run_once(self):
+        """Sync everything newer than the watermark; returns the run summary"""
+        async with self._lock:
+            run = SyncRun(started_at=datetime.now(timezone.utc).isoformat())
+            started = time.perf_counter()
+            self.total_runs += 1
+            self.last_run = run
+            try:
+                await self._sync(run)
+                run.status = "success"
+            except Exception as e:
+                self.failed_runs += 1
+                run.status = "error"
+                run.error = str(e) or type(e).__name__
+                logger.warning("Event sync failed after %s events: %s", run.processed, run.error,
+                               extra={"processed": run.processed, "pages": run.pages})
+            finally:
+                run.duration_seconds = time.perf_counter() - started
+            logger.info("Event sync %s: %s events (%s new, %s updated) in %.2fs",
+                        run.status, run.processed, run.inserted, run.updated, run.duration_seconds,
+                        extra={"status": run.status, "processed": run.processed, "inserted": run.inserted,
+                               "updated": run.updated, "unchanged": run.unchanged})
+            return run.as_dict()
+
+    async def _sync(self, run):
+        watermark, _ = await asyncio.to_thread(self.store.get_watermark)
+        if watermark is None and self.config.start_from:
+            watermark = epoch_millis(self.config.start_from)
+        self.watermark = watermark
+
+        # Bounded: the fetcher blocks once the writer is `queue_pages` pages behind
+        queue = asyncio.Queue(maxsize=self.config.queue_pages)
+
+        fetch_errors = []
+
+        async def fetch():
+            try:
+                async with aclosing(self.source.pages(watermark)) as pages:
+                    async for hits in pages:
+                        run.pages += 1
+                        run.fetched += len(hits)
+                        await queue.put(hits)
+            except Exception as e:
+                fetch_errors.append(e)
+            # Not reached on cancellation, when nobody is left to read it
+            await queue.put(None)
+
+        async def write(rows, last_sort):
+            result = await asyncio.to_thread(self.store.upsert, rows, last_sort)
+            run.processed += len(rows)
+            run.inserted += len(result.inserted)
+            run.updated += len(result.updated)
+            run.unchanged += result.unchanged
+            run.batches += 1
+            self.watermark = last_sort
+            for listener in self.listeners:
+                try:
+                    listener(result)
+                except Exception as e:
+                    logger.warning("Event sync listener %r failed: %r", listener, e,
+                                   extra={"rows": len(result.inserted) + len(result.updated)})
+
+        fetcher = asyncio.create_task(fetch())
+        try:
+            rows = []
+            last_sort = None
+            while (hits := await queue.get()) is not None:
+                synced_at = datetime.now(timezone.utc).isoformat()
+                for hit in hits:
+                    rows.append(event_row(hit, synced_at))
+                    last_sort = hit["sort"][0]
+                    if len(rows) >= self.config.batch_size:
+                        await write(rows, last_sort)
+                        rows = []
+            if rows:
+                await write(rows, last_sort)
+        finally:
+            fetcher.cancel()
+            await asyncio.gather(fetcher, return_exceptions=True)
+        # Pages are written in order, so a fetch error still leaves a valid watermark
+        if fetch_errors:
+            raise fetch_errors[0]
+
+    async def _run(self):
+        while self.is_running:
+            await self.run_once()
+            await asyncio.sleep(self.config.interval_seconds)
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info("Event sync started (interval: %ss)", self.config.interval_seconds,
+                    extra={"interval_seconds": self.config.interval_seconds})
+
+    async def stop(self):
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.source.close()
+        self.store.close()
+
+    def status(self):
+        lag = None
+        if self.watermark is not None:
+            lag = round(time.time() - self.watermark / 1000, 1)
+        return {
+            "is_running": self.is_running,
+            "interval_seconds": self.config.interval_seconds,
+            "total_syncs": self.total_runs,
+            "failed_syncs": self.failed_runs,
+            "watermark": millis_to_iso(self.watermark) if self.watermark is not None else None,
+            "lag_seconds": lag,
+            "last_sync": self.last_run.as_dict() if self.last_run else None,
+        }
+
+
+def sync_enabled():
+    return settings.rtarf_sync_enabled and bool(settings.es_url)
+
+
+syncer = EventSync(SyncConfig.from_settings(settings))
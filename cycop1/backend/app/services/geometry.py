@@ -0,0 +1,282 @@
+"""
+Bangkok district geometry.
+
+frontend/public/data/bangkok-districts.geojson is loaded once, on first use.
+Each simplification level (Douglas-Peucker at a tolerance of about one
+pixel for that zoom) is rendered to a JSON body once and served with its
+compressed variants, so the browser no longer downloads the full-resolution
+file for a zoomed-out city view.
+
+Points (nodes, threats) are assigned to districts through a grid over the
+city: each cell lists the districts whose bounding box touches it, and only
+those are ray-cast against the full-resolution polygons.
+"""
+import json
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.services.get_threat_alerts import alert_id, alert_severity
+from app.services.responses import render_with_digest
+from app.services.settings import settings
+from app.services.spatial import point_coordinates, status_level
+
+DEFAULT_GEOJSON_PATH = (
+    Path(__file__).resolve().parents[3] / "frontend" / "public" / "data" / "bangkok-districts.geojson"
+)
+
+# Simplified levels; zoom levels from FULL_RESOLUTION_ZOOM up get the original geometry
+SIMPLIFY_ZOOMS = (10, 12, 14)
+FULL_RESOLUTION_ZOOM = 16
+TOLERANCE_PIXELS = settings.geometry_tolerance_pixels
+COORDINATE_DECIMALS = 6
+GRID_SIZE = 64
+MAX_LOOKUP_POINTS = settings.geometry_max_lookup_points
+
+
+def tolerance_for_zoom(zoom):
+    """Degrees covered by TOLERANCE_PIXELS at a zoom level (256px tiles)"""
+    return 360.0 / (256 * 2 ** zoom) * TOLERANCE_PIXELS
+
+
+def _segment_distance(point, start, end):
+    (x, y), (x1, y1), (x2, y2) = point, start, end
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return math.hypot(x - x1, y - y1)
+    t = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+
+def douglas_peucker(points, tolerance):
+    """Simplify a polyline, keeping both end points (iterative, no recursion limit)"""
+    if len(points) < 3 or tolerance <= 0:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, index = 0.0, None
+        for i in range(first + 1, last):
+            distance = _segment_distance(points[i], points[first], points[last])
+            if distance > farthest:
+                farthest, index = distance, i
+        if index is not None and farthest > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_ring(ring, tolerance):
+    """Simplify a closed ring, falling back to the original if it would collapse"""
+    simplified = douglas_peucker(ring, tolerance)
+    if len(simplified) < 4:
+        return ring
+    return simplified
+
+
+def _round(ring):
+    return [[round(x, COORDINATE_DECIMALS), round(y, COORDINATE_DECIMALS)] for x, y, *_ in ring]
+
+
+def _polygons(geometry):
+    """Polygon and MultiPolygon as a list of polygons (each a list of rings)"""
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def simplify_geometry(geometry, tolerance):
+    polygons = [[_round(simplify_ring(ring, tolerance)) for ring in polygon] for polygon in _polygons(geometry)]
+    if geometry["type"] == "Polygon":
+        return {"type": "Polygon", "coordinates": polygons[0]}
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+
+def point_in_ring(x, y, ring):
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def point_in_polygons(x, y, polygons):
+    for outer, *holes in polygons:
+        if point_in_ring(x, y, outer) and not any(point_in_ring(x, y, hole) for hole in holes):
+            return True
+    return False
+
+
+@dataclass
+class District:
+    code: str
+    name: str
+    name_en: str
+    polygons: list = field(repr=False)
+    bbox: tuple
+
+    def contains(self, x, y):
+        west, south, east, north = self.bbox
+        return west <= x <= east and south <= y <= north and point_in_polygons(x, y, self.polygons)
+
+
+@dataclass
+class GeometryLevel:
+    zoom: int
+    body: bytes
+    digest: str
+    # Compressed variants of body, filled on first use
+    variants: dict = field(default_factory=dict, repr=False)
+
+
+class DistrictGeometry:
+    def __init__(self, collection):
+        self.collection = collection
+        self.districts = []
+        for feature in collection["features"]:
+            properties = feature.get("properties") or {}
+            polygons = _polygons(feature["geometry"])
+            xs = [point[0] for polygon in polygons for point in polygon[0]]
+            ys = [point[1] for polygon in polygons for point in polygon[0]]
+            self.districts.append(District(
+                code=str(properties.get("dcode")),
+                name=properties.get("dname"),
+                name_en=properties.get("dname_e"),
+                polygons=polygons,
+                bbox=(min(xs), min(ys), max(xs), max(ys)),
+            ))
+        self.bbox = (
+            min(d.bbox[0] for d in self.districts), min(d.bbox[1] for d in self.districts),
+            max(d.bbox[2] for d in self.districts), max(d.bbox[3] for d in self.districts),
+        )
+        self._levels = {}
+        self._build_grid()
+
+    @classmethod
+    def load(cls, path=None):
+        path = Path(path or settings.bangkok_geojson_path or DEFAULT_GEOJSON_PATH)
+        with open(path, encoding="utf-8") as handle:
+            return cls(json.load(handle))
+
+    def _cell(self, x, y):
+        west, south, east, north = self.bbox
+        column = int((x - west) / (east - west) * GRID_SIZE)
+        row = int((y - south) / (north - south) * GRID_SIZE)
+        return min(max(row, 0), GRID_SIZE - 1), min(max(column, 0), GRID_SIZE - 1)
+
+    def _build_grid(self):
+        self._grid = [[[] for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
+        for index, district in enumerate(self.districts):
+            min_row, min_column = self._cell(district.bbox[0], district.bbox[1])
+            max_row, max_column = self._cell(district.bbox[2], district.bbox[3])
+            for row in range(min_row, max_row + 1):
+                for column in range(min_column, max_column + 1):
+                    self._grid[row][column].append(index)
+
+    def locate(self, latitude, longitude):
+        """Return the District containing the point, or None"""
+        x, y = longitude, latitude
+        west, south, east, north = self.bbox
+        if not (west <= x <= east and south <= y <= north):
+            return None
+        row, column = self._cell(x, y)
+        for index in self._grid[row][column]:
+            if self.districts[index].contains(x, y):
+                return self.districts[index]
+        return None
+
+    def level_for_zoom(self, zoom):
+        """Nearest precomputed level at or below the zoom (full resolution from FULL_RESOLUTION_ZOOM)"""
+        if zoom is None or zoom >= FULL_RESOLUTION_ZOOM:
+            return FULL_RESOLUTION_ZOOM
+        candidates = [level for level in SIMPLIFY_ZOOMS if level <= zoom]
+        return candidates[-1] if candidates else SIMPLIFY_ZOOMS[0]
+
+    def level(self, zoom):
+        """Rendered GeoJSON for a zoom level, simplified and serialized on first use"""
+        level_zoom = self.level_for_zoom(zoom)
+        if level_zoom not in self._levels:
+            tolerance = 0.0 if level_zoom >= FULL_RESOLUTION_ZOOM else tolerance_for_zoom(level_zoom)
+            features = [
+                {
+                    "type": "Feature",
+                    "properties": {
+                        "dcode": district.code,
+                        "dname": district.name,
+                        "dname_e": district.name_en,
+                    },
+                    "geometry": simplify_geometry(feature["geometry"], tolerance),
+                }
+                for district, feature in zip(self.districts, self.collection["features"])
+            ]
+            body, digest = render_with_digest({"type": "FeatureCollection", "bbox": list(self.bbox), "features": features})
+            self._levels[level_zoom] = GeometryLevel(level_zoom, body, digest)
+        return self._levels[level_zoom]
+
+    def assign(self, points):
+        """Assign many {id, latitude, longitude, severity?} points to districts in one pass
+
+        Returns (assignments, districts, unmatched): the district code per
+        point id (None when outside every district), and per-district counts
+        broken down by the points' (already normalized) severity labels.
+        """
+        assignments = []
+        counts = {}
+        unmatched = 0
+        for point in points:
+            district = self.locate(point["latitude"], point["longitude"])
+            assignments.append({"id": point.get("id"), "dcode": district.code if district else None})
+            if district is None:
+                unmatched += 1
+                continue
+            entry = counts.get(district.code)
+            if entry is None:
+                entry = counts[district.code] = {
+                    "dname": district.name,
+                    "dname_e": district.name_en,
+                    "count": 0,
+                    "severity_counts": Counter(),
+                }
+            entry["count"] += 1
+            if point.get("severity") is not None:
+                entry["severity_counts"][point["severity"]] += 1
+        for entry in counts.values():
+            entry["severity_counts"] = dict(entry["severity_counts"])
+        return assignments, counts, unmatched
+
+
+def threat_points(nodes=(), alerts=()):
+    """Points for assign(): layer nodes by status level, alerts carrying coordinates by severity"""
+    points = []
+    for node in nodes:
+        coordinates = point_coordinates(node)
+        if coordinates is not None:
+            points.append({"id": node.get("id"), "latitude": coordinates[0], "longitude": coordinates[1],
+                           "severity": status_level(node.get("status"))})
+    for alert in alerts:
+        coordinates = point_coordinates(alert)
+        if coordinates is not None:
+            points.append({"id": alert_id(alert), "latitude": coordinates[0], "longitude": coordinates[1],
+                           "severity": alert_severity(alert)})
+    return points
+
+
+_geometry = None
+
+
+def get_geometry():
+    """The district geometry, loaded from disk on first use"""
+    global _geometry
+    if _geometry is None:
+        _geometry = DistrictGeometry.load()
+    return _geometry
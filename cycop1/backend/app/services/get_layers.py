@@ -1,41 +1,33 @@
-import os
-import requests
-from requests.auth import HTTPBasicAuth
-from dotenv import load_dotenv
+import asyncio
+import logging
 
-# โหลดค่า .env
-load_dotenv(".env")
+from app.services import upstream
+from app.services.upstream import ORG_ID
 
-API_PATH = os.getenv("API_PATH")
-API_KEY = os.getenv("API_AUTHEN_PASSWORD")
-ORG_ID = "default"
+logger = logging.getLogger("app.layers")
 
-def get_all_layers():
+
+async def get_all_layers():
     """เรียก API GetLayers และ return JSON หรือ raw text"""
     api_path = f"api/Node/org/{ORG_ID}/action/GetLayers"
-    url = f"{API_PATH}/{api_path}"
-
-    print("API_PATH = ", API_PATH)
-    print("API_KEY = ", API_KEY)
-    print("ORG_ID = ", ORG_ID)
-    print("Request →", url)
 
-    response = requests.get(
-        url,
-        auth=HTTPBasicAuth(ORG_ID, API_KEY)
-    )
-
-    print("Status code:", response.status_code)
-    print("Response text:", response.text[:500])  # debug แค่ 500 ตัวแรก
+    response = await upstream.request("get", api_path)
+    # ไม่ log เนื้อหา response ทุกครั้งแล้ว เก็บแค่ขนาด
+    logger.debug("GetLayers → %s", response.status_code, extra={"bytes": len(response.content)})
 
     response.raise_for_status()
 
     try:
         return response.json()
     except ValueError:
-        print("Response is not JSON")
+        logger.warning("GetLayers response is not JSON", extra={"preview": response.text[:200]})
         return response.text
 
+async def get_layer_options():
+    """Return layers as [{"name", "value"}] for the overlay list"""
+    raw_layers = await get_all_layers()
+    return [{"name": item["name"], "value": item["value"]} for item in raw_layers]
+
 if __name__ == "__main__":
-    layers = get_all_layers()
+    layers = asyncio.run(get_all_layers())
     print("Layers:", layers)
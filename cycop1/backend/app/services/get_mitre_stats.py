@@ -1,32 +1,191 @@
-import os
-import requests
-from dotenv import load_dotenv
-from requests.auth import HTTPBasicAuth
+"""
+GetMitreStats with a per-day rollup cache.
 
-load_dotenv()
+A FromDate/ToDate range is split into UTC day buckets. Each day is fetched
+from GetMitreStats on its own (missing days concurrently), and the per-day
+responses are merged back into the single response shape the frontend
+expects, keeping the upstream row fields. calculatedSeveritySummary is risk
+based and not known to be a per-day sum, so it is taken from a fetch of the
+whole range (the day fetch itself for a one-day range). Days and ranges that
+ended more than MITRE_SETTLE_SECONDS ago are final and stay cached until
+evicted; the current day is refetched every MITRE_TODAY_TTL seconds.
+"""
+import asyncio
+import math
+from datetime import datetime, timedelta, timezone
 
-API_PATH = os.getenv("API_PATH")
-API_KEY = os.getenv("API_AUTHEN_PASSWORD")
-ORG_ID = "default"
-print("API_PATH = ", API_PATH)
-print("API_KEY = ", API_KEY)
-print("ORG_ID = ", ORG_ID)
+from app.services import upstream
+from app.services.cache import TTLCache
+from app.services.settings import settings
+from app.services.severity import SEVERITY_LEVELS
+from app.services.upstream import ORG_ID
 
-def call_api(path: str, payload: dict):
-    url = f"{API_PATH}/{path}"
+MITRE_STATS_PATH = f"api/Analytic/org/{ORG_ID}/action/GetMitreStats"
 
-    headers = {
-        "Content-Type": "application/json"
-    }
+TODAY_TTL = settings.mitre_today_ttl
+# Late events can still land shortly after midnight
+SETTLE_SECONDS = settings.mitre_settle_seconds
+MAX_DAYS = settings.mitre_max_days
 
-    r = requests.post(
-        url,
-        json=payload,
-        headers=headers,
-        auth=HTTPBasicAuth("api", API_KEY)
-    )
+day_cache = TTLCache(maxsize=settings.mitre_day_cache_entries)
+
+# critical ก่อน low
+SEVERITY_RANK = {name: rank for rank, name in enumerate(reversed(SEVERITY_LEVELS), start=1)}
+
+
+async def call_api(path: str, payload: dict):
+    r = await upstream.request("post", path, payload=payload)
 
     if r.status_code != 200:
         return {"error": r.status_code, "message": r.text}
 
     return r.json()
+
+
+def parse_date(value):
+    moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def format_date(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def split_days(from_date, to_date):
+    """Split [from_date, to_date] into (start, end) pairs, one per UTC day
+
+    Day ends are inclusive at 23:59:59, matching what the frontend sends.
+    """
+    days = []
+    day_start = from_date
+    while day_start <= to_date:
+        midnight = day_start.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_end = min(midnight + timedelta(days=1) - timedelta(seconds=1), to_date)
+        days.append((day_start, day_end))
+        day_start = midnight + timedelta(days=1)
+    return days
+
+
+def day_ttl(day_end, now):
+    """Finished days never expire; today (or a day still settling) is short lived"""
+    if day_end < now - timedelta(seconds=SETTLE_SECONDS):
+        return math.inf
+    return TODAY_TTL
+
+
+def worst_severity(current, candidate):
+    if SEVERITY_RANK.get((candidate or "").lower(), 0) > SEVERITY_RANK.get((current or "").lower(), 0):
+        return candidate
+    return current
+
+
+def latest(current, candidate):
+    if not current:
+        return candidate
+    if not candidate:
+        return current
+    return max(current, candidate, key=parse_date)
+
+
+def _merge_rows(rows_per_day, key_fields):
+    """Sum quantities per key, keeping the worst severity and latest lastSeen
+
+    Only fields the upstream rows carry are merged, so a merged row has the
+    same shape as an unsplit response's.
+    """
+    merged = {}
+    for rows in rows_per_day:
+        for row in rows or []:
+            key = tuple(row.get(name) for name in key_fields)
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = dict(row, quantity=row.get("quantity") or 0)
+                continue
+            entry["quantity"] += row.get("quantity") or 0
+            if "severityName" in row:
+                entry["severityName"] = worst_severity(entry.get("severityName"), row["severityName"])
+            if "lastSeen" in row:
+                entry["lastSeen"] = latest(entry.get("lastSeen"), row["lastSeen"])
+    return list(merged.values())
+
+
+def merge_technique_rows(rows_per_day):
+    """tacticTechniqueSummary rows summed per (tactic, technique)"""
+    return _merge_rows(rows_per_day, ("tacticId", "tacticName", "techniqueId", "techniqueName"))
+
+
+def merge_tactic_rows(rows_per_day):
+    """tacticSummary rows summed per tactic"""
+    return _merge_rows(rows_per_day, ("tacticId", "tacticName"))
+
+
+def merge_severity_rows(rows_per_day):
+    merged = {}
+    for rows in rows_per_day:
+        for row in rows or []:
+            name = row.get("severityName")
+            merged[name] = merged.get(name, 0) + (row.get("quantity") or 0)
+    return [{"severityName": name, "quantity": quantity} for name, quantity in merged.items()]
+
+
+def merge_mitre_stats(days, whole_range):
+    """Merge per-day GetMitreStats responses into one response
+
+    `whole_range` is the response for the full range, which the
+    calculatedSeveritySummary comes from.
+    """
+    technique_summary = merge_technique_rows(day.get("tacticTechniqueSummary") for day in days)
+    return {
+        "totalEvent": sum(day.get("totalEvent") or 0 for day in days),
+        # A technique seen on several days is still one technique
+        "totalTechnique": len({row.get("techniqueId") for row in technique_summary if row.get("techniqueId")}),
+        "tacticSummary": merge_tactic_rows(day.get("tacticSummary") for day in days),
+        "severitySummary": merge_severity_rows(day.get("severitySummary") for day in days),
+        "calculatedSeveritySummary": whole_range.get("calculatedSeveritySummary") or [],
+        "tacticTechniqueSummary": technique_summary,
+    }
+
+
+async def fetch_day(day_start, day_end, now):
+    payload = {"FromDate": format_date(day_start), "ToDate": format_date(day_end)}
+    return await day_cache.get_or_load(
+        (payload["FromDate"], payload["ToDate"]),
+        lambda: call_api(MITRE_STATS_PATH, payload),
+        ttl=day_ttl(day_end, now),
+    )
+
+
+async def get_mitre_stats(from_date: str, to_date: str):
+    """GetMitreStats for a date range, assembled from cached day buckets
+
+    Ranges that cannot be split (unparseable dates, reversed or longer than
+    MITRE_MAX_DAYS) are forwarded to the upstream as-is.
+    """
+    payload = {"FromDate": from_date, "ToDate": to_date}
+    try:
+        days = split_days(parse_date(from_date), parse_date(to_date))
+    except ValueError:
+        days = []
+    if not days or len(days) > MAX_DAYS:
+        return await call_api(MITRE_STATS_PATH, payload)
+
+    now = datetime.now(timezone.utc)
+    semaphore = asyncio.Semaphore(upstream.config.fanout_concurrency)
+
+    async def fetch_one(day_start, day_end):
+        async with semaphore:
+            return await fetch_day(day_start, day_end, now)
+
+    fetches = [fetch_one(start, end) for start, end in days]
+    if len(days) > 1:
+        fetches.append(fetch_one(days[0][0], days[-1][1]))
+    results = await asyncio.gather(*fetches)
+
+    # Errors are not cached, so the next request retries only the failed fetches
+    for result in results:
+        if isinstance(result, dict) and "error" in result:
+            return result
+
+    return merge_mitre_stats(results[:len(days)], results[-1])
@@ -1,92 +1,299 @@
 #!/usr/bin/env python3
+import asyncio
+import hashlib
+import json
+import logging
 import os
-import requests
-from requests.auth import HTTPBasicAuth
-from dotenv import load_dotenv
-
-load_dotenv(".env")
-
-API_PATH = os.getenv("API_PATH")
-API_KEY = os.getenv("API_AUTHEN_PASSWORD")
-ORG_ID = "default"
-# print("API_PATH = ", API_PATH)
-# print("API_KEY = ", API_KEY)
-# print("ORG_ID = ", ORG_ID)
-
-def make_request(method, api_url, params=None):
-    """Make HTTP request to API with BasicAuth"""
-    url = f"{API_PATH}/{api_url}"
-    try:
-        if method.lower() == "get":
-            response = requests.get(url, params=params, auth=HTTPBasicAuth("api", API_KEY))
-        else:
-            response = requests.post(url, json=params, auth=HTTPBasicAuth("api", API_KEY))
-        response.raise_for_status()
-        print(f"[DEBUG] Request successful: {url}")
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.services import resilience, upstream
+from app.services.settings import settings
+from app.services.upstream import ORG_ID
+
+logger = logging.getLogger("app.nodeplot")
+
+def build_graph(node_hash, links):
+    """Build the adjacency map and canonical edge list for a layer in one pass over links
+
+    Each undirected link is kept once as a sorted [a, b] pair, even when it was
+    returned by both endpoints' GetNodeLinks calls.
+    """
+    adjacency = {node_id: [] for node_id in node_hash}
+    edges = []
+    seen = set()
+    for link in links:
+        src_id = link.get("sourceNode")
+        dst_id = link.get("destinationNode")
+        if not src_id or not dst_id:
+            continue
+        key = (src_id, dst_id) if src_id <= dst_id else (dst_id, src_id)
+        if key in seen:
+            continue
+        seen.add(key)
+        edges.append(list(key))
+        if src_id in adjacency:
+            adjacency[src_id].append(dst_id)
+        if dst_id in adjacency and dst_id != src_id:
+            adjacency[dst_id].append(src_id)
+    return adjacency, edges
+
+def build_node_list(data):
+    """Shape a layer fetch into the /api/nodeplot node list"""
+    nodes_list = []
+    link_errors = data.get("link_errors", {})
+    for node_id, node in data["node_hash"].items():
+        status_json_str = data["status_hash"].get(node_id, {}).get("status", "{}")
         try:
-            data = response.json()
-            print(f"[DEBUG] Response: {data if isinstance(data, list) else str(data)[:200]}")  # show preview
-            return data
-        except Exception as e:
-            print(f"[ERROR] Failed to parse JSON from {url}: {e}")
-            return []
-    except requests.exceptions.RequestException as e:
-        print(f"[ERROR] Request failed: {url} -> {e}")
-        return []
-
-def get_nodes_and_links_by_layer(layer):
-    """Fetch nodes, status, and links for a given layer"""
-    
-    # 1. Get nodes
-    api_url_get_nodes = f"api/Node/org/{ORG_ID}/action/GetNodesByLayer/{layer}"
-    print(f"[DEBUG] Fetching nodes from layer: {layer}")
-    nodes = make_request("get", api_url_get_nodes) or []
+            status = json.loads(status_json_str) if status_json_str else {}
+        except Exception:
+            status = {}
 
-    if not nodes:
-        print(f"[DEBUG] No nodes returned for layer: {layer}")
+        node_entry = {
+            "id": node_id,
+            "name": node.get("name"),
+            "latitude": node.get("latitude"),
+            "longitude": node.get("longitude"),
+            "status": status,
+            "links": data["adjacency"].get(node_id, [])
+        }
+        # Links for this node could not be fetched; keep the node but flag it
+        if node_id in link_errors:
+            node_entry["link_error"] = link_errors[node_id]
+        nodes_list.append(node_entry)
+    return nodes_list
 
-    # 2. Get node status
+def layer_graph(data):
+    """Shape a layer fetch as {"nodes": [...], "edges": [...]}"""
+    if not data or not data.get("nodes"):
+        return {"nodes": [], "edges": []}
+    return {"nodes": build_node_list(data), "edges": data["edges"]}
+
+async def fetch_node_links(node_ids, concurrency=None):
+    """Fetch GetNodeLinks for many nodes concurrently, at most `concurrency` in flight
+
+    Returns (links_by_node, errors) where errors maps node_id -> error message.
+    Every call shares the caller's deadline: once it passes, nodes still
+    queued fail at once instead of waiting for a slot.
+    """
+    semaphore = asyncio.Semaphore(concurrency or upstream.config.fanout_concurrency)
+
+    async def fetch_one(node_id):
+        async with semaphore:
+            return await upstream.get_json(f"api/Node/org/{ORG_ID}/action/GetNodeLinks/{node_id}")
+
+    results = await asyncio.gather(*(fetch_one(node_id) for node_id in node_ids), return_exceptions=True)
+
+    links_by_node = {}
+    errors = {}
+    skipped = 0
+    for node_id, result in zip(node_ids, results):
+        if isinstance(result, Exception):
+            # Deadline and open-circuit failures come in bulk; log them once below
+            if isinstance(result, (resilience.DeadlineExceeded, resilience.CircuitOpenError)):
+                skipped += 1
+            else:
+                logger.warning("GetNodeLinks failed for node %s: %r", node_id, result)
+            errors[node_id] = str(result) or type(result).__name__
+            links_by_node[node_id] = []
+        else:
+            links_by_node[node_id] = result or []
+    if skipped:
+        logger.warning("GetNodeLinks skipped for %d of %d nodes (deadline or open circuit)", skipped, len(node_ids))
+    return links_by_node, errors
+
+async def fetch_layer_nodes(layer):
+    """Fetch GetNodesByLayer and GetNodesStatus for a layer concurrently
+
+    Returns (nodes, nodes_status, errors) where errors maps the failed action to its message.
+    """
+    api_url_get_nodes = f"api/Node/org/{ORG_ID}/action/GetNodesByLayer/{layer}"
     api_url_get_nodes_status = f"api/Node/org/{ORG_ID}/action/GetNodesStatus/{layer}"
-    print(f"[DEBUG] Fetching node status for layer: {layer}")
-    nodes_status = make_request("get", api_url_get_nodes_status) or []
+    logger.debug("Fetching nodes and node status for layer: %s", layer)
+    nodes, nodes_status = await asyncio.gather(
+        upstream.get_json(api_url_get_nodes),
+        upstream.get_json(api_url_get_nodes_status),
+        return_exceptions=True,
+    )
 
-    # 3. Create node_hash and status_hash
+    errors = {}
+    if isinstance(nodes, Exception):
+        logger.error("GetNodesByLayer failed for layer %s: %r", layer, nodes)
+        errors["GetNodesByLayer"] = str(nodes) or type(nodes).__name__
+        nodes = []
+    if isinstance(nodes_status, Exception):
+        logger.error("GetNodesStatus failed for layer %s: %r", layer, nodes_status)
+        errors["GetNodesStatus"] = str(nodes_status) or type(nodes_status).__name__
+        nodes_status = []
+    nodes = nodes or []
+    nodes_status = nodes_status or []
+
+    if not nodes:
+        logger.debug("No nodes returned for layer: %s", layer)
+    return nodes, nodes_status, errors
+
+def assemble_layer(nodes, nodes_status, links_by_node, link_errors, errors):
+    """Index one layer's fetched data into node/status hashes, adjacency and edges"""
     node_hash = {node.get("id"): node for node in nodes if node.get("id")}
     status_hash = {status.get("nodeId"): status for status in nodes_status if status.get("nodeId")}
+    links = [link for node_id in node_hash for link in links_by_node.get(node_id, [])]
 
-    # 4. Fetch links for each node
-    links = []
-    for node in nodes:
-        node_id = node.get("id")
-        if not node_id:
-            continue
-        api_url_get_node_links = f"api/Node/org/{ORG_ID}/action/GetNodeLinks/{node_id}"
-        node_links = make_request("get", api_url_get_node_links) or []
-        links.extend(node_links)
-
-    print(f"[DEBUG] Total nodes: {len(nodes)}, Total links: {len(links)}")
-    
-    # 5. Debug printing like Ruby
-    for node_id, node in node_hash.items():
-        node_name = node.get("name", "Unknown")
-        lat = node.get("latitude", 0)
-        lon = node.get("longitude", 0)
-        status_str = status_hash.get(node_id, {}).get("status", "")
-        print(f"[DEBUG] Plotting node [{node_name}], lat=[{lat}], lon=[{lon}], nodeId=[{node_id}], status=[{status_str}]")
-    
-    for link in links:
-        src_id = link.get("sourceNode")
-        dst_id = link.get("destinationNode")
-        if src_id in node_hash and dst_id in node_hash:
-            print(f"[DEBUG] Plotting link [{node_hash[src_id]['name']}] ==> [{node_hash[dst_id]['name']}]")
+    # Index the graph once: adjacency per node plus deduplicated edges
+    adjacency, edges = build_graph(node_hash, links)
+
+    logger.debug("Layer assembled", extra={"nodes": len(nodes), "links": len(links), "edges": len(edges)})
+
+    # Per-item lines (like the Ruby version) only when app.nodeplot is at DEBUG;
+    # the log pipeline rate limits them per call site
+    if logger.isEnabledFor(logging.DEBUG):
+        for node_id, node in node_hash.items():
+            logger.debug("Plotting node [%s]", node.get("name", "Unknown"), extra={
+                "node_id": node_id,
+                "lat": node.get("latitude", 0),
+                "lon": node.get("longitude", 0),
+                "status": status_hash.get(node_id, {}).get("status", ""),
+            })
+        for src_id, dst_id in edges:
+            if src_id in node_hash and dst_id in node_hash:
+                logger.debug("Plotting link [%s] ==> [%s]", node_hash[src_id]["name"], node_hash[dst_id]["name"])
 
     return {
         "nodes": nodes,
         "links": links,
+        "edges": edges,
+        "adjacency": adjacency,
         "node_hash": node_hash,
-        "status_hash": status_hash
+        "status_hash": status_hash,
+        "link_errors": {node_id: link_errors[node_id] for node_id in node_hash if node_id in link_errors},
+        "errors": errors
     }
 
+async def get_nodes_and_links_by_layer(layer, concurrency=None):
+    """Fetch nodes, status, and links for a given layer"""
+    nodes, nodes_status, errors = await fetch_layer_nodes(layer)
+    node_ids = list(dict.fromkeys(node.get("id") for node in nodes if node.get("id")))
+    links_by_node, link_errors = await fetch_node_links(node_ids, concurrency=concurrency)
+    return assemble_layer(nodes, nodes_status, links_by_node, link_errors, errors)
+
+# Every Nth incremental refresh of a layer re-fetches all links, to pick up
+# link changes between nodes whose own records did not change
+FULL_REFRESH_EVERY = settings.nodeplot_full_refresh_every
+# Layers whose last graph is kept for incremental refreshes, least recently refreshed dropped first
+MAX_LAYER_STATES = settings.nodeplot_max_layer_states
+
+
+@dataclass(frozen=True)
+class LayerState:
+    """Last assembled graph of a layer; replaced whole on refresh, never mutated"""
+    fingerprints: dict
+    links_by_node: dict
+    link_errors: dict
+    data: dict
+    refresh_count: int
+
+# layer -> LayerState, oldest refresh first
+_layer_states = OrderedDict()
+
+def remember_layer_state(layer, state):
+    """Keep a layer's state, dropping the least recently refreshed beyond MAX_LAYER_STATES
+
+    /api/nodeplot refreshes whatever ?layer= a client sends, so without a
+    bound every misspelt layer name would stay here for good.
+    """
+    _layer_states[layer] = state
+    _layer_states.move_to_end(layer)
+    while len(_layer_states) > MAX_LAYER_STATES:
+        _layer_states.popitem(last=False)
+
+def node_fingerprint(node):
+    encoded = json.dumps(node, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+async def refresh_layers(layers, concurrency=None):
+    """Incrementally refresh several layers, returning {layer: data}
+
+    GetNodesByLayer/GetNodesStatus are always fetched, but GetNodeLinks is only
+    called for nodes that were added, whose record changed, or whose links
+    failed last time. Removed nodes and their links are dropped. Each layer's
+    new state is published as a fresh object, so readers never see a
+    half-updated graph.
+    """
+    layers = list(dict.fromkeys(layers))
+    fetched = await asyncio.gather(*(fetch_layer_nodes(layer) for layer in layers))
+
+    plans = {}
+    to_fetch = {}
+    for layer, (nodes, nodes_status, errors) in zip(layers, fetched):
+        previous = _layer_states.get(layer)
+        if errors.get("GetNodesByLayer") and previous is not None:
+            # Keep the last good graph rather than wiping the layer
+            plans[layer] = None
+            continue
+
+        fingerprints = {node.get("id"): node_fingerprint(node) for node in nodes if node.get("id")}
+        previous_fingerprints = previous.fingerprints if previous is not None else {}
+        added = [node_id for node_id in fingerprints if node_id not in previous_fingerprints]
+        modified = [
+            node_id for node_id, fingerprint in fingerprints.items()
+            if node_id in previous_fingerprints and previous_fingerprints[node_id] != fingerprint
+        ]
+        removed = set(previous_fingerprints) - set(fingerprints)
+
+        full = previous is None or (previous.refresh_count + 1) % FULL_REFRESH_EVERY == 0
+        if full:
+            stale = list(fingerprints)
+        else:
+            retry = [node_id for node_id in previous.link_errors if node_id in fingerprints]
+            stale = list(dict.fromkeys(added + modified + retry))
+
+        plans[layer] = (nodes, nodes_status, errors, fingerprints, removed, {
+            "full": full,
+            "added": len(added),
+            "modified": len(modified),
+            "removed": len(removed),
+            "link_fetches": len(stale),
+        })
+        for node_id in stale:
+            to_fetch[node_id] = True
+
+    links_by_node, link_errors = await fetch_node_links(list(to_fetch), concurrency=concurrency)
+
+    results = {}
+    for layer, plan in plans.items():
+        previous = _layer_states.get(layer)
+        if plan is None:
+            results[layer] = previous.data
+            continue
+        nodes, nodes_status, errors, fingerprints, removed, stats = plan
+
+        layer_links = {}
+        for node_id in fingerprints:
+            if node_id in links_by_node and (node_id not in link_errors or previous is None):
+                layer_links[node_id] = links_by_node[node_id]
+            else:
+                # Unchanged node, or its fetch failed: reuse its last links, minus any to removed nodes
+                layer_links[node_id] = [
+                    link for link in previous.links_by_node.get(node_id, [])
+                    if link.get("sourceNode") not in removed and link.get("destinationNode") not in removed
+                ]
+        layer_errors = {node_id: link_errors[node_id] for node_id in fingerprints if node_id in link_errors}
+
+        data = assemble_layer(nodes, nodes_status, layer_links, layer_errors, errors)
+        data["refresh"] = stats
+        remember_layer_state(layer, LayerState(
+            fingerprints=fingerprints,
+            links_by_node=layer_links,
+            link_errors=layer_errors,
+            data=data,
+            refresh_count=previous.refresh_count + 1 if previous is not None else 0,
+        ))
+        results[layer] = data
+    return results
+
+async def refresh_layer(layer, concurrency=None):
+    """Incrementally refresh one layer (see refresh_layers)"""
+    return (await refresh_layers([layer], concurrency=concurrency))[layer]
+
 
 # -----------------------------
 # Example usage
@@ -94,5 +301,5 @@ def get_nodes_and_links_by_layer(layer):
 if __name__ == "__main__":
     layer = os.getenv("LAYER", "RTARF-Internal")  # ใช้ชื่อ layer ตรงตาม GetLayers()
     print(f"Starting to fetch data for layer: {layer}")
-    data = get_nodes_and_links_by_layer(layer)
+    data = asyncio.run(get_nodes_and_links_by_layer(layer))
     print(f"[INFO] Fetched data: nodes={len(data['nodes'])}, links={len(data['links'])}")
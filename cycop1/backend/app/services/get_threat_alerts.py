@@ -1,36 +1,284 @@
-import os
-import requests
-from requests.auth import HTTPBasicAuth
-from dotenv import load_dotenv
+"""
+GetThreatAlerts plus paging, filtering and incremental decoding.
 
-load_dotenv(".env")
+Alerts keep the upstream order. A cursor is an opaque token holding the id
+of the last alert returned and its position; the next page resumes right
+after that id, or at the position when the id has rotated out.
+"""
+import base64
+import binascii
+import json
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
 
-API_PATH = os.getenv("API_PATH")
-API_KEY = os.getenv("API_AUTHEN_PASSWORD")
-ORG_ID = "default"
+from app.services import upstream
+from app.services.severity import normalize_severity
 
-print("API_PATH = ", API_PATH)
-print("API_KEY = ", API_KEY)
-print("ORG_ID = ", ORG_ID)
+logger = logging.getLogger("app.analytic")
 
-def call_api(api_name):
-    url = f"{API_PATH}/{api_name}"
+THREAT_ALERTS_PATH = upstream.analytic_path("GetThreatAlerts")
 
-    print("Request →", url)
+DEFAULT_PAGE_SIZE = 100
 
+# First field present is used as the alert time
+ALERT_TIME_FIELDS = ("timestamp", "createdDate", "createdAt", "detectedDate", "eventTime", "lastSeen")
+
+
+def alerts_from_payload(data):
+    """GetThreatAlerts returns either a list or {"alerts": [...]}"""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and isinstance(data.get("alerts"), list):
+        return data["alerts"]
+    return []
+
+
+def alert_id(alert):
+    value = alert.get("incidentID") or alert.get("id")
+    return str(value) if value is not None else None
+
+
+def alert_severity(alert):
+    # The upstream spells it "serverity" and sends a score
+    return normalize_severity(alert.get("serverity", alert.get("severity")))
+
+
+def parse_time(value):
+    moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def alert_time(alert):
+    for field in ALERT_TIME_FIELDS:
+        if alert.get(field):
+            try:
+                return parse_time(alert[field])
+            except ValueError:
+                return None
+    return None
+
+
+@dataclass
+class AlertFilter:
+    severities: frozenset = frozenset()
+    since: datetime = None
+    until: datetime = None
+
+    def matches(self, alert):
+        if self.severities and alert_severity(alert) not in self.severities:
+            return False
+        if self.since or self.until:
+            moment = alert_time(alert)
+            # An alert without a time cannot be shown to fall in the window
+            if moment is None:
+                return False
+            if self.since and moment < self.since:
+                return False
+            if self.until and moment > self.until:
+                return False
+        return True
+
+
+def encode_cursor(after, offset):
+    raw = json.dumps({"after": after, "offset": offset}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (after_id, offset); raises ValueError on a malformed cursor"""
     try:
-        response = requests.get(
-            url,
-            auth=HTTPBasicAuth("api", API_KEY), 
-            headers={"Content-Type": "application/json"},
-            timeout=10
-        )
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        after, offset = data.get("after"), int(data["offset"])
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return after, offset
 
-        response.raise_for_status()
-        return response.json()
 
-    except Exception as e:
-        return {"error": str(e)}
+def paginate(alerts, limit, cursor=None, alert_filter=None):
+    """Return (page, next_cursor) over the filtered alerts"""
+    alert_filter = alert_filter or AlertFilter()
+    start = 0
+    if cursor:
+        after, offset = decode_cursor(cursor)
+        start = offset
+        if after is not None:
+            for index, alert in enumerate(alerts):
+                if alert_id(alert) == after:
+                    start = index + 1
+                    break
+
+    page = []
+    index = start
+    while index < len(alerts) and len(page) < limit:
+        if alert_filter.matches(alerts[index]):
+            page.append(alerts[index])
+        index += 1
+
+    # Only hand out a cursor when something is left to read
+    has_more = any(alert_filter.matches(alert) for alert in alerts[index:])
+    next_cursor = encode_cursor(alert_id(alerts[index - 1]), index) if has_more and page else None
+    return page, next_cursor
+
+
+_WHITESPACE = re.compile(r"\s*")
 
-print(call_api(f"api/Analytic/org/{ORG_ID}/action/GetThreatAlerts"))
 
+class AlertStreamDecoder:
+    """Incrementally decode alerts from a JSON array or an object's "alerts" array
+
+    feed() returns the alerts completed by a chunk; only the undecoded tail is
+    kept, so memory is bounded by the largest single alert.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+
+    @property
+    def done(self):
+        return self._state == "done"
+
+    def _skip(self, pos):
+        return _WHITESPACE.match(self._buffer, pos).end()
+
+    def _value_at(self, pos):
+        """Decode a value at pos; None until the value and the delimiter after it have arrived"""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, pos)
+        except json.JSONDecodeError:
+            return None
+        # A number at the end of the buffer may still be cut short
+        if self._skip(end) >= len(self._buffer):
+            return None
+        return value, end
+
+    def _step(self, items):
+        """Advance one token; returns False when more input is needed"""
+        pos = self._skip(self._pos)
+        if pos >= len(self._buffer):
+            return False
+        char = self._buffer[pos]
+
+        if self._state == "start":
+            if char == "[":
+                self._state = "first_item"
+            elif char == "{":
+                self._state = "first_key"
+            else:
+                raise ValueError(f"Unexpected {char!r} at start of alerts payload")
+            self._pos = pos + 1
+            return True
+
+        if self._state in ("first_key", "key"):
+            if char == "}":
+                self._state = "done"
+                return True
+            if self._state == "key":
+                if char != ",":
+                    raise ValueError(f"Expected ',' between keys, got {char!r}")
+                pos = self._skip(pos + 1)
+            decoded = self._value_at(pos)
+            if decoded is None:
+                return False
+            key, end = decoded
+            pos = self._skip(end)
+            if self._buffer[pos] != ":":
+                raise ValueError(f"Expected ':' after key {key!r}")
+            pos = self._skip(pos + 1)
+            if pos >= len(self._buffer):
+                return False
+            if key == "alerts" and self._buffer[pos] == "[":
+                self._state = "first_item"
+                self._pos = pos + 1
+                return True
+            decoded = self._value_at(pos)
+            if decoded is None:
+                return False
+            self._state = "key"
+            self._pos = decoded[1]
+            return True
+
+        if self._state in ("first_item", "item"):
+            if char == "]":
+                self._state = "done"
+                return True
+            if self._state == "item":
+                if char != ",":
+                    raise ValueError(f"Expected ',' between alerts, got {char!r}")
+                pos = self._skip(pos + 1)
+            decoded = self._value_at(pos)
+            if decoded is None:
+                return False
+            items.append(decoded[0])
+            self._state = "item"
+            self._pos = decoded[1]
+            return True
+
+        return False
+
+    def feed(self, text):
+        self._buffer += text
+        items = []
+        while not self.done and self._step(items):
+            pass
+        # Drop what has been decoded once per chunk rather than per alert
+        self._buffer = "" if self.done else self._buffer[self._pos:]
+        self._pos = 0
+        return items
+
+    def close(self):
+        if self._state not in ("start", "done"):
+            raise ValueError("Alerts payload ended before the alert list was complete")
+
+
+async def stream_alerts(path=THREAT_ALERTS_PATH):
+    """Yield alerts one by one while the upstream response is still downloading"""
+    decoder = AlertStreamDecoder()
+    async for chunk in upstream.iter_text(path):
+        for alert in decoder.feed(chunk):
+            yield alert
+        if decoder.done:
+            return
+    decoder.close()
+
+
+def ndjson_line(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+
+
+async def alerts_ndjson(alerts=None, alert_filter=None, limit=None):
+    """Yield matching alerts as NDJSON lines
+
+    Reads `alerts` when given (e.g. a snapshot), otherwise decodes the upstream
+    response as it arrives. A failure after the first line is reported as a
+    final {"error": ...} line since the status code is already sent.
+    """
+    alert_filter = alert_filter or AlertFilter()
+    sent = 0
+    try:
+        if alerts is not None:
+            for alert in alerts:
+                if limit is not None and sent >= limit:
+                    return
+                if alert_filter.matches(alert):
+                    sent += 1
+                    yield ndjson_line(alert)
+            return
+        async for alert in stream_alerts():
+            if limit is not None and sent >= limit:
+                return
+            if alert_filter.matches(alert):
+                sent += 1
+                yield ndjson_line(alert)
+    except Exception as e:
+        logger.warning("GetThreatAlerts stream failed: %r", e, extra={"sent": sent})
+        yield ndjson_line({"error": str(e) or type(e).__name__})
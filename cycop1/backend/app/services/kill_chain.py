@@ -0,0 +1,427 @@
+"""
+Cyber Kill Chain aggregation engine.
+
+Events are mapped from their MITRE ATT&CK tactics to the seven kill chain
+phases and counted once per phase into hourly buckets keyed by (phase,
+the event's tactics in that phase, severity). A dayRange/tactic/severity
+query sums the buckets in range instead of scanning raw events, and
+returns the same shape as get_kill_chain_mock_data.
+
+The engine is fed from the Elasticsearch event sync (event_sync.py):
+KillChainFeed counts the events already in synced_events, then every batch
+the sync commits (new events, and the old and new version of changed ones),
+and prunes buckets past the retention window once an interval.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from app.services.event_sync import EVENT_COLUMNS
+from app.services.settings import settings
+from app.services.severity import SEVERITY_LEVELS, normalize_severity
+
+logger = logging.getLogger("app.kill_chain")
+
+PHASES = [
+    {"phase_id": "reconnaissance", "phase_name": "Reconnaissance", "phase_name_th": "การสอดแนม"},
+    {"phase_id": "weaponization", "phase_name": "Weaponization", "phase_name_th": "การสร้างอาวุธ"},
+    {"phase_id": "delivery", "phase_name": "Delivery", "phase_name_th": "การนำส่ง"},
+    {"phase_id": "exploitation", "phase_name": "Exploitation", "phase_name_th": "การใช้ประโยชน์"},
+    {"phase_id": "installation", "phase_name": "Installation", "phase_name_th": "การติดตั้ง"},
+    {"phase_id": "command_control", "phase_name": "Command and Control", "phase_name_th": "การควบคุมและสั่งการ"},
+    {"phase_id": "actions_objectives", "phase_name": "Actions on Objectives", "phase_name_th": "การปฏิบัติการตามเป้าหมาย"},
+]
+PHASE_IDS = [phase["phase_id"] for phase in PHASES]
+
+# MITRE ATT&CK tactic -> kill chain phase
+TACTIC_TO_PHASE = {
+    "reconnaissance": "reconnaissance",
+    "resource_development": "weaponization",
+    "initial_access": "delivery",
+    "execution": "exploitation",
+    "privilege_escalation": "exploitation",
+    "credential_access": "exploitation",
+    "persistence": "installation",
+    "defense_evasion": "installation",
+    "command_and_control": "command_control",
+    "discovery": "actions_objectives",
+    "lateral_movement": "actions_objectives",
+    "collection": "actions_objectives",
+    "exfiltration": "actions_objectives",
+    "impact": "actions_objectives",
+}
+
+TACTIC_IDS = {
+    "TA0043": "reconnaissance",
+    "TA0042": "resource_development",
+    "TA0001": "initial_access",
+    "TA0002": "execution",
+    "TA0003": "persistence",
+    "TA0004": "privilege_escalation",
+    "TA0005": "defense_evasion",
+    "TA0006": "credential_access",
+    "TA0007": "discovery",
+    "TA0008": "lateral_movement",
+    "TA0009": "collection",
+    "TA0011": "command_and_control",
+    "TA0010": "exfiltration",
+    "TA0040": "impact",
+}
+
+TOP_SOURCES = 3
+TOP_METHODS = 3
+
+RETENTION_DAYS = settings.kill_chain_retention_days
+PRUNE_INTERVAL = settings.kill_chain_prune_interval_seconds
+# Rows read from synced_events per chunk when loading the engine
+LOAD_CHUNK_ROWS = 5000
+
+_TACTIC_ID = re.compile(r"\bTA\d{4}\b", re.IGNORECASE)
+
+
+def normalize_tactic(value):
+    """Normalize a tactic name or ID ("Initial Access", "initial-access", "TA0001",
+    "TA0001 - Initial Access", {"id": "TA0001"}) to initial_access"""
+    if isinstance(value, dict):
+        value = value.get("id") or value.get("tactic_id") or value.get("name")
+    if not value:
+        return None
+    text = str(value).strip()
+    match = _TACTIC_ID.search(text)
+    if match and match.group(0).upper() in TACTIC_IDS:
+        return TACTIC_IDS[match.group(0).upper()]
+    return text.lower().replace("-", "_").replace(" ", "_")
+
+
+def parse_timestamp(value):
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def hour_floor(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class BucketCounters:
+    """Counts for one (hour, phase, tactics, severity) cell"""
+    __slots__ = ("count", "sources", "methods", "detections")
+
+    def __init__(self):
+        self.count = 0
+        self.sources = Counter()
+        self.methods = Counter()
+        self.detections = Counter()
+
+
+class KillChainEngine:
+    def __init__(self, retention_days=RETENTION_DAYS):
+        self.retention_days = retention_days
+        # hour start -> {(phase, sorted tactics in that phase, severity): BucketCounters}
+        self._buckets = defaultdict(dict)
+        self.events_ingested = 0
+        self.events_retracted = 0
+        self.events_skipped = 0
+        # Name of the source feeding the engine; until one is attached /api/killchain serves the mock
+        self.fed_by = None
+
+    @property
+    def is_empty(self):
+        return self.events_ingested == self.events_retracted
+
+    @staticmethod
+    def _phases(event):
+        """{phase: sorted tactics of the event in that phase}; an event counts once per phase"""
+        tactics = event.get("tactic") or event.get("tactics")
+        if not isinstance(tactics, (list, tuple)):
+            tactics = [tactics]
+        phases = defaultdict(set)
+        for tactic in tactics:
+            tactic = normalize_tactic(tactic)
+            if tactic in TACTIC_TO_PHASE:
+                phases[TACTIC_TO_PHASE[tactic]].add(tactic)
+        return {phase: tuple(sorted(names)) for phase, names in phases.items()}
+
+    @staticmethod
+    def _hour(event):
+        """The event's hour bucket, or None when its timestamp is missing or malformed"""
+        try:
+            return hour_floor(parse_timestamp(event.get("timestamp")))
+        except (TypeError, ValueError):
+            return None
+
+    def _count(self, event, hour, phases, delta):
+        severity = normalize_severity(event.get("severity"))
+        bucket = self._buckets[hour]
+        for phase, tactics in phases.items():
+            key = (phase, tactics, severity)
+            counters = bucket.get(key)
+            if counters is None:
+                if delta < 0:
+                    # Already pruned (or never counted); nothing to take back
+                    continue
+                counters = bucket[key] = BucketCounters()
+            counters.count += delta
+            if event.get("source"):
+                counters.sources[event["source"]] += delta
+            if event.get("detection_method"):
+                counters.methods[event["detection_method"]] += delta
+            if event.get("source_text"):
+                counters.detections[(event["source_text"], event.get("source_type", "event_name"))] += delta
+            if delta < 0:
+                # Counter.__pos__ drops zero and negative counts
+                counters.sources = +counters.sources
+                counters.methods = +counters.methods
+                counters.detections = +counters.detections
+                if counters.count <= 0:
+                    del bucket[key]
+        if not bucket:
+            del self._buckets[hour]
+
+    def ingest(self, event):
+        """Count one event; returns False (and counts it skipped) when it has no
+        kill chain phase or no usable timestamp"""
+        phases = self._phases(event)
+        hour = self._hour(event)
+        if not phases or hour is None:
+            self.events_skipped += 1
+            return False
+        self._count(event, hour, phases, 1)
+        self.events_ingested += 1
+        return True
+
+    def ingest_many(self, events):
+        for event in events:
+            self.ingest(event)
+
+    def retract(self, event):
+        """Take back an event counted earlier (e.g. the old version of an updated one)"""
+        phases = self._phases(event)
+        hour = self._hour(event)
+        if not phases or hour is None:
+            # Skipped when it was ingested, so nothing to take back
+            return False
+        self._count(event, hour, phases, -1)
+        self.events_retracted += 1
+        return True
+
+    def apply_upsert(self, result):
+        """Event sync listener: count new rows, swap the old version of updated rows for the new one"""
+        for row in result.inserted:
+            self.ingest(event_from_row(row))
+        for stored, row in result.updated:
+            self.retract(event_from_row(stored))
+            self.ingest(event_from_row(row))
+
+    def prune(self, now=None):
+        """Drop buckets older than the retention window"""
+        cutoff = hour_floor(now or datetime.now(timezone.utc)) - timedelta(days=self.retention_days)
+        for hour in [hour for hour in self._buckets if hour < cutoff]:
+            del self._buckets[hour]
+
+    def query(self, day_range=7, tactic="all", severity="all", now=None):
+        """Sum the hourly buckets covering the last `day_range` days"""
+        end = hour_floor(now or datetime.now(timezone.utc)) + timedelta(hours=1)
+        start = end - timedelta(days=day_range)
+
+        tactic_filter = None if not tactic or tactic == "all" else normalize_tactic(tactic)
+        severity_filter = None if not severity or severity == "all" else normalize_severity(severity)
+
+        totals = {phase_id: BucketCounters() for phase_id in PHASE_IDS}
+        hour = start
+        while hour < end:
+            for (phase_id, event_tactics, event_severity), counters in self._buckets.get(hour, {}).items():
+                # A tactic filter may name either an ATT&CK tactic or a phase id
+                if tactic_filter and tactic_filter != phase_id and tactic_filter not in event_tactics:
+                    continue
+                if severity_filter and severity_filter != event_severity:
+                    continue
+                total = totals[phase_id]
+                total.count += counters.count
+                total.sources.update(counters.sources)
+                total.methods.update(counters.methods)
+                total.detections.update(counters.detections)
+            hour += timedelta(hours=1)
+
+        phases = []
+        for phase in PHASES:
+            total = totals[phase["phase_id"]]
+            phases.append({
+                **phase,
+                "total_detections": total.count,
+                "sources": dict(total.sources.most_common()),
+                "detection_methods": [method for method, _ in total.methods.most_common(TOP_METHODS)],
+                "top_detection_sources": [
+                    {"source_text": text, "count": count, "source_type": source_type}
+                    for (text, source_type), count in total.detections.most_common(TOP_SOURCES)
+                ],
+            })
+
+        return {
+            "phases": phases,
+            "total_detections": sum(p["total_detections"] for p in phases),
+            "time_range": {"start": start.isoformat(), "end": end.isoformat()},
+            "active_phases": sum(1 for p in phases if p["total_detections"] > 0),
+            "methodology": "Cyber Kill Chain (MITRE tactic mapping, hourly pre-aggregates)",
+        }
+
+    def stats(self):
+        return {
+            "fed_by": self.fed_by,
+            "events_ingested": self.events_ingested,
+            "events_retracted": self.events_retracted,
+            "events_skipped": self.events_skipped,
+            "buckets": len(self._buckets),
+            "cells": sum(len(cells) for cells in self._buckets.values()),
+        }
+
+
+def _json_list(value):
+    try:
+        decoded = json.loads(value) if value else []
+    except (TypeError, ValueError):
+        return []
+    return decoded if isinstance(decoded, list) else [decoded]
+
+
+def _name(value):
+    if isinstance(value, dict):
+        return value.get("name") or value.get("id")
+    return value
+
+
+def event_source(document):
+    """Which product reported a synced event"""
+    if isinstance(document.get("source"), str) and document["source"]:
+        return document["source"]
+    if any(key.startswith("crowdstrike_") for key in document):
+        return "crowdstrike"
+    if any(key.startswith("suricata_") for key in document):
+        return "suricata"
+    if "mitre_tactics_ids_and_names" in document or "alert_categories" in document:
+        return "palo-xsiam"
+    return None
+
+
+def detection_source(document):
+    """(source_text, source_type) shown under top_detection_sources"""
+    if document.get("crowdstrike_event_name"):
+        return document["crowdstrike_event_name"], "event_name"
+    categories = document.get("alert_categories")
+    if isinstance(categories, list) and categories:
+        return str(_name(categories[0])), "alert_category"
+    if document.get("suricata_classification"):
+        return document["suricata_classification"], "alert_category"
+    if document.get("crowdstrike_event_objective"):
+        return document["crowdstrike_event_objective"], "event_objective"
+    return None, None
+
+
+def event_from_row(row):
+    """Shape a synced_events row (EVENT_COLUMNS order) as an engine event"""
+    record = dict(zip(EVENT_COLUMNS, row))
+    try:
+        document = json.loads(record["document"]) if record["document"] else {}
+    except ValueError:
+        document = {}
+    if not isinstance(document, dict):
+        document = {}
+    techniques = _json_list(record["techniques"])
+    text, source_type = detection_source(document)
+    if text is None and record["description"]:
+        text, source_type = record["description"], "event_name"
+    return {
+        "timestamp": record["timestamp"],
+        "tactic": _json_list(record["tactics"]),
+        "severity": record["severity"],
+        "source": event_source(document),
+        "detection_method": _name(techniques[0]) if techniques else None,
+        "source_text": text,
+        "source_type": source_type,
+    }
+
+
+class KillChainFeed:
+    """Keeps the engine in step with the event sync's synced_events table"""
+
+    def __init__(self, engine, prune_interval=PRUNE_INTERVAL):
+        self.engine = engine
+        self.prune_interval = prune_interval
+        self.loaded_rows = 0
+        self.task = None
+
+    async def load(self, store, now=None):
+        """Count the stored events inside the retention window, a chunk at a time"""
+        start = hour_floor(now or datetime.now(timezone.utc)) - timedelta(days=self.engine.retention_days)
+        timestamp, event_id = start.isoformat(), ""
+        while True:
+            rows = await asyncio.to_thread(store.read_since, timestamp, event_id, LOAD_CHUNK_ROWS)
+            # Counted on the event loop so queries never see a half-updated bucket
+            for row in rows:
+                self.engine.ingest(event_from_row(row))
+            self.loaded_rows += len(rows)
+            if len(rows) < LOAD_CHUNK_ROWS:
+                return
+            timestamp, event_id = rows[-1][1], rows[-1][0]
+
+    async def _run(self, syncer):
+        await self.load(syncer.store)
+        # Attached only now, so no event is counted by both the load and a sync batch
+        syncer.add_listener(self.engine.apply_upsert)
+        self.engine.fed_by = "event_sync"
+        syncer.start()
+        logger.info("Kill chain engine loaded %s synced events", self.loaded_rows, extra={"rows": self.loaded_rows})
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            self.engine.prune()
+
+    def start(self, syncer):
+        """Load the engine from the store, then start the sync with the engine listening"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run(syncer))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+
+def generate_events(count, days=30, seed=0, now=None):
+    """Generate a reproducible local event set for exercising the engine"""
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    tactics = list(TACTIC_TO_PHASE)
+    sources = ["crowdstrike", "palo-xsiam", "suricata", "firewall_logs", "dns_logs", "email_gateway"]
+    methods = ["Port Scan", "Phishing Link", "Shellcode", "New Service", "C2 Beacon", "Data Exfil"]
+    texts = [
+        ("External Port Scan Attempt", "event_name"),
+        ("Blocked Malicious Attachment", "alert_category"),
+        ("Web Shell Execution Attempt", "event_name"),
+        ("Registry Key Modified", "alert_category"),
+        ("Connection to Known C2 IP", "event_objective"),
+        ("Attempted Sensitive Data Exfil", "alert_category"),
+    ]
+    for _ in range(count):
+        text, source_type = rng.choice(texts)
+        yield {
+            "timestamp": now - timedelta(seconds=rng.uniform(0, days * 86400)),
+            "tactic": rng.choice(tactics),
+            "severity": rng.choice(SEVERITY_LEVELS),
+            "source": rng.choice(sources),
+            "detection_method": rng.choice(methods),
+            "source_text": text,
+            "source_type": source_type,
+        }
+
+
+engine = KillChainEngine()
+feed = KillChainFeed(engine)
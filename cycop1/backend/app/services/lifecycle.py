@@ -0,0 +1,92 @@
+"""
+Service registry started and stopped by the app lifespan.
+
+Importing the app only builds objects: settings, caches, the snapshot store.
+Anything that starts threads or tasks, opens connections or calls the
+upstream happens in `services.start()`, in a fixed order, and is undone in
+reverse by `services.stop()`.
+
+With WARMUP_ENABLED every snapshot source (and the district geometry) is
+loaded before the app starts serving, bounded by WARMUP_BUDGET_SECONDS;
+sources still loading when the budget runs out finish in the background.
+"""
+import asyncio
+import logging
+import time
+
+from app.services import event_sync, geometry, kill_chain, log_pipeline, metrics, org_registry, snapshots, upstream
+
+logger = logging.getLogger("app.lifecycle")
+
+
+class Services:
+    def __init__(self):
+        self.started = False
+        self.startup_seconds = None
+        self.warmup = None
+        self._warmup_tasks = []
+
+    async def start(self, settings):
+        started = time.perf_counter()
+        log_pipeline.configure_logging()
+        # Creating the client opens no connection; the first request does
+        upstream.get_client()
+        snapshots.register_default_sources()
+        # bkkthreat is pushed by the org threat registry rather than polled
+        org_registry.registry.publish()
+        if settings.warmup_enabled:
+            await self.warm_up(settings.warmup_budget_seconds)
+        if snapshots.refresh_enabled():
+            snapshots.refresher.start()
+        # Incremental Elasticsearch -> local store sync (RTARF_SYNC_ENABLED); the kill
+        # chain engine loads the stored events in the background, then starts the sync
+        if event_sync.sync_enabled():
+            kill_chain.feed.start(event_sync.syncer)
+        metrics.loop_monitor.start()
+        self.started = True
+        self.startup_seconds = round(time.perf_counter() - started, 4)
+        logger.info("Services started in %.3fs", self.startup_seconds, extra={"warmup": self.warmup})
+
+    async def warm_up(self, budget):
+        """Load every snapshot source and the district geometry concurrently, for at most `budget` seconds"""
+        started = time.perf_counter()
+        tasks = {name: asyncio.create_task(snapshots.refresher.refresh(name)) for name in snapshots.refresher.sources}
+        tasks["geometry"] = asyncio.create_task(asyncio.to_thread(geometry.get_geometry))
+        done, pending = await asyncio.wait(tasks.values(), timeout=budget)
+        # Still running: let them finish in the background (cancelled on stop)
+        self._warmup_tasks = list(pending)
+
+        sources = {}
+        for name, task in tasks.items():
+            if task not in done:
+                sources[name] = "pending"
+            elif task.exception() is not None:
+                sources[name] = f"error: {task.exception()}"
+            elif name in snapshots.refresher.sources and snapshots.refresher.sources[name].last_error:
+                sources[name] = f"error: {snapshots.refresher.sources[name].last_error}"
+            else:
+                sources[name] = "ok"
+        self.warmup = {
+            "budget_seconds": budget,
+            "duration_seconds": round(time.perf_counter() - started, 4),
+            "sources": sources,
+        }
+
+    async def stop(self):
+        for task in self._warmup_tasks:
+            task.cancel()
+        await asyncio.gather(*self._warmup_tasks, return_exceptions=True)
+        self._warmup_tasks = []
+        await metrics.loop_monitor.stop()
+        await kill_chain.feed.stop()
+        await event_sync.syncer.stop()
+        await snapshots.refresher.stop()
+        # Release pooled upstream connections
+        await upstream.close_client()
+        self.started = False
+
+    def status(self):
+        return {"started": self.started, "startup_seconds": self.startup_seconds, "warmup": self.warmup}
+
+
+services = Services()
@@ -0,0 +1,171 @@
+"""
+Non-blocking logging pipeline.
+
+Loggers hand records to a QueueHandler; a QueueListener thread formats them
+and writes to stdout, so a slow console or log collector never stalls the
+event loop. The queue is bounded and a full queue drops the record (counted
+in /metrics) instead of blocking the caller.
+
+Records are written as one JSON object per line (LOG_FORMAT=json, the
+default) with any `extra={...}` fields kept as top-level keys, or in the old
+"time | logger | level | message" layout with LOG_FORMAT=text.
+
+DEBUG records are rate limited per call site (LOG_DEBUG_RATE per second), so
+a per-node or per-link debug line in a loop costs a dictionary lookup after
+the first few; the next record let through reports how many were suppressed.
+
+    LOG_LEVEL=INFO
+    LOG_LEVELS="app.nodeplot=DEBUG,httpx=WARNING"
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from app.services import metrics
+from app.services.settings import settings
+
+LOG_QUEUE_SIZE = settings.log_queue_size
+LOG_DEBUG_RATE = settings.log_debug_rate
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+TEXT_FORMAT = "%(asctime)s | %(name)s | %(levelname)s | %(message)s"
+
+# httpx logs every upstream request at INFO, thousands per nodeplot fan-out
+DEFAULT_LEVELS = {"httpx": "WARNING", "httpcore": "WARNING"}
+
+
+def parse_levels(raw):
+    """Parse "app.nodeplot=DEBUG,httpx=WARNING" into {logger: level}"""
+    levels = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DebugRateLimit(logging.Filter):
+    """Let through at most `rate` DEBUG records per second per call site"""
+
+    def __init__(self, rate=LOG_DEBUG_RATE):
+        super().__init__()
+        self.rate = rate
+        # (pathname, lineno) -> [window start, passed, suppressed]
+        self._sites = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        site = self._sites.get(key)
+        if site is None or now - site[0] >= 1.0:
+            suppressed = site[2] if site is not None else 0
+            self._sites[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if site[1] < self.rate:
+            site[1] += 1
+            return True
+        site[2] += 1
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Merge args now (they may change later) but keep the traceback as its own field
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+_listener = None
+_lock = threading.Lock()
+
+
+def configure_logging():
+    """Route the root logger through the queue; safe to call more than once"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        writer = logging.StreamHandler(sys.stdout)
+        if settings.log_format.lower() == "text":
+            writer.setFormatter(logging.Formatter(TEXT_FORMAT))
+        else:
+            writer.setFormatter(JsonFormatter())
+
+        handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        handler.addFilter(DebugRateLimit())
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(settings.log_level.upper())
+        for name, level in {**DEFAULT_LEVELS, **parse_levels(settings.log_levels)}.items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = logging.handlers.QueueListener(handler.queue, writer, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush what is queued and stop the writer thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def _collect():
+    return [("log_records_dropped_total", "counter", "Log records dropped because the log queue was full",
+             [({}, DroppingQueueHandler.dropped)])]
+
+
+metrics.registry.add_collector(_collect)
@@ -0,0 +1,316 @@
+"""
+Prometheus-style metrics and per-request Server-Timing.
+
+Counters, gauges and histograms live in one process-wide registry and are
+rendered in the Prometheus text format (0.0.4) by /metrics. Values owned by
+other modules (cache hit ratios, snapshot versions, single-flight counts)
+are read at scrape time through collectors instead of being duplicated.
+
+Each request gets a RequestTiming in a context variable. Upstream calls and
+JSON rendering add to it, and the middleware turns it into a Server-Timing
+header: upstream (wall time with at least one upstream call in flight),
+serialize (rendering and compression) and assembly (everything else).
+"""
+import asyncio
+import math
+import re
+import time
+from contextvars import ContextVar
+
+from app.services.settings import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPSTREAM_BUCKETS = DEFAULT_BUCKETS + (30.0, 60.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+LOOP_MONITOR_INTERVAL = settings.metrics_loop_interval
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        for values, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, values)} {_number(value)}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, *labels, value):
+        state = self._values.get(labels)
+        if state is None:
+            # Per-bucket (non-cumulative) counts, sum, count
+            state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][index] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        for values, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_labels(self.labelnames, values, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, values)} {_number(round(total, 6))}"
+            yield f"{self.name}_count{_labels(self.labelnames, values)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        # Callables returning [(name, kind, help, [(labels dict, value)])] at scrape time
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.header()
+            lines += metric.samples()
+        for collector in self.collectors:
+            for name, kind, help_text, samples in collector():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels, labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+http_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status", ("method", "route", "status"))
+http_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests being handled", ("method",))
+
+upstream_duration = registry.histogram(
+    "upstream_request_duration_seconds", "Upstream analytic API latency by action and outcome",
+    ("endpoint", "method", "outcome"), UPSTREAM_BUCKETS)
+upstream_errors = registry.counter(
+    "upstream_errors_total", "Upstream calls that failed, by action and kind", ("endpoint", "kind"))
+upstream_timeouts = registry.counter(
+    "upstream_timeouts_total", "Upstream calls that timed out, by action", ("endpoint",))
+upstream_in_flight = registry.gauge(
+    "upstream_requests_in_flight", "Upstream calls in progress", ("endpoint",))
+
+snapshot_reads = registry.counter(
+    "snapshot_reads_total", "Route reads served from a snapshot (hit) or loaded live (miss)", ("name", "result"))
+
+loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a scheduled wake-up", (), LAG_BUCKETS)
+threadpool_lag = registry.histogram(
+    "threadpool_queue_seconds", "Round trip of a no-op through the default thread pool", (), LAG_BUCKETS)
+
+
+_ACTION = re.compile(r"/action/([^/?]+)")
+_IDS = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_name(path):
+    """GetNodeLinks for api/Node/org/x/action/GetNodeLinks/123; ids elsewhere become :id"""
+    match = _ACTION.search(f"/{path}")
+    if match:
+        return match.group(1)
+    return _IDS.sub("/:id", f"/{path}".split("?")[0])
+
+
+def record_snapshot_read(name, hit):
+    snapshot_reads.inc(name, "hit" if hit else "miss")
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.upstream = 0.0
+        self.serialize = 0.0
+        self._upstream_active = 0
+        self._upstream_since = 0.0
+
+    def upstream_started(self):
+        if self._upstream_active == 0:
+            self._upstream_since = time.perf_counter()
+        self._upstream_active += 1
+
+    def upstream_finished(self):
+        self._upstream_active -= 1
+        if self._upstream_active == 0:
+            self.upstream += time.perf_counter() - self._upstream_since
+
+    def header(self):
+        total = time.perf_counter() - self.started
+        assembly = max(0.0, total - self.upstream - self.serialize)
+        parts = [("upstream", self.upstream), ("serialize", self.serialize), ("assembly", assembly), ("total", total)]
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in parts)
+
+
+current_timing = ContextVar("request_timing", default=None)
+
+
+class upstream_span:
+    """Count wall time with upstream calls in flight against the current request"""
+
+    def __enter__(self):
+        self.timing = current_timing.get()
+        if self.timing is not None:
+            self.timing.upstream_started()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timing is not None:
+            self.timing.upstream_finished()
+
+
+class serialize_span:
+    """Count rendering/compression time against the current request"""
+
+    def __enter__(self):
+        self.timing = current_timing.get()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timing is not None:
+            self.timing.serialize += time.perf_counter() - self.started
+
+
+class LoopMonitor:
+    """Samples event-loop lag and thread-pool queueing in the background"""
+
+    def __init__(self, interval=LOOP_MONITOR_INTERVAL):
+        self.interval = interval
+        self.task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            loop_lag.observe(value=max(0.0, time.perf_counter() - expected))
+            started = time.perf_counter()
+            await asyncio.to_thread(lambda: None)
+            threadpool_lag.observe(value=time.perf_counter() - started)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+
+loop_monitor = LoopMonitor()
+
+
+def collect_services():
+    """Cache, single-flight and snapshot refresher state, read at scrape time"""
+    # Imported here: these modules import upstream, which imports this module
+    from app.services import snapshots
+    from app.services.cache import response_cache
+    from app.services.get_mitre_stats import day_cache
+    from app.services.singleflight import layer_flight, upstream_flight
+
+    caches = {"response": response_cache.stats(), "mitre_days": day_cache.stats()}
+    flights = {"upstream": upstream_flight.stats(), "nodeplot": layer_flight.stats()}
+    sources = snapshots.refresher.status()["sources"]
+    reads = {}
+    for (name, result), count in snapshot_reads._values.items():
+        reads.setdefault(name, {"hit": 0, "miss": 0})[result] += count
+    return [
+        ("cache_lookups_total", "counter", "Cache lookups by result",
+         [({"cache": cache, "result": result}, stats[result])
+          for cache, stats in caches.items() for result in ("hits", "stale_hits", "misses")]),
+        ("cache_hit_ratio", "gauge", "Fresh plus stale hits over lookups",
+         [({"cache": cache}, stats["hit_ratio"]) for cache, stats in caches.items()]),
+        ("cache_entries", "gauge", "Entries held",
+         [({"cache": cache}, stats["size"]) for cache, stats in caches.items()]),
+        ("singleflight_calls_total", "counter", "Calls through a single-flight group by outcome",
+         [({"group": group, "result": result}, stats[result])
+          for group, stats in flights.items() for result in ("executions", "coalesced")]),
+        ("snapshot_hit_ratio", "gauge", "Route reads served from the snapshot",
+         [({"name": name}, round(counts["hit"] / (counts["hit"] + counts["miss"]), 4))
+          for name, counts in reads.items()]),
+        ("snapshot_version", "gauge", "Current snapshot version per source",
+         [({"name": name}, source["version"]) for name, source in sources.items()]),
+        ("snapshot_refresh_errors_total", "counter", "Failed snapshot refreshes",
+         [({"name": name}, source["error_count"]) for name, source in sources.items()]),
+        ("snapshot_refresh_duration_ms", "gauge", "Duration of the last snapshot refresh",
+         [({"name": name}, source["last_duration_ms"]) for name, source in sources.items()
+          if source["last_duration_ms"] is not None]),
+    ]
+
+
+registry.add_collector(collect_services)
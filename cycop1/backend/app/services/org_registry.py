@@ -0,0 +1,149 @@
+"""
+In-memory org threat registry behind /api/bkkthreat.
+
+Each org keeps its active threats by incidentID together with per-severity
+counters. Adding, updating or resolving a threat moves one counter, so the
+stats and the derived status always agree with the threat list. The top
+threats list (worst first, newest first within a severity) is rebuilt only
+for orgs that changed, and every ingest batch publishes the result as the
+"bkkthreat" snapshot, so polling reads are a single dict lookup.
+"""
+import heapq
+
+from app.services import snapshots
+from app.services.get_bkk_org import get_all_org_status
+from app.services.settings import settings
+from app.services.severity import SEVERITY_LEVELS, normalize_severity
+
+SNAPSHOT_NAME = "bkkthreat"
+TOP_THREATS = settings.bkk_top_threats
+
+# Higher is worse
+SEVERITY_RANK = {level: rank for rank, level in enumerate(reversed(SEVERITY_LEVELS))}
+
+
+def derive_status(stats):
+    """critical with 2+ critical threats, warning with one, otherwise normal"""
+    if stats["critical"] >= 2:
+        return "critical"
+    if stats["critical"] >= 1:
+        return "warning"
+    return "normal"
+
+
+class UnknownOrgError(KeyError):
+    pass
+
+
+class OrgThreats:
+    def __init__(self, org_id, name, short_name):
+        self.id = org_id
+        self.name = name
+        self.short_name = short_name
+        # incidentID -> (severity, sequence, threat)
+        self.threats = {}
+        self.stats = {level: 0 for level in SEVERITY_LEVELS}
+        self._top = None
+
+    def upsert(self, threat, sequence):
+        """Add or replace a threat; returns its severity"""
+        incident_id = str(threat["incidentID"])
+        level = normalize_severity(threat.get("serverity"))
+        previous = self.threats.get(incident_id)
+        if previous is not None:
+            self.stats[previous[0]] -= 1
+        self.threats[incident_id] = (level, sequence, threat)
+        self.stats[level] += 1
+        self._top = None
+        return level
+
+    def resolve(self, incident_id):
+        """Remove a threat; False when it was not active"""
+        previous = self.threats.pop(str(incident_id), None)
+        if previous is None:
+            return False
+        self.stats[previous[0]] -= 1
+        self._top = None
+        return True
+
+    def top(self):
+        if self._top is None:
+            entries = heapq.nlargest(TOP_THREATS, self.threats.values(),
+                                     key=lambda entry: (SEVERITY_RANK[entry[0]], entry[1]))
+            self._top = [entry[2] for entry in entries]
+        return self._top
+
+    def status(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "short_name": self.short_name,
+            "status": derive_status(self.stats),
+            "stats": dict(self.stats),
+            "total_threats": len(self.threats),
+            "threat_list": self.top(),
+        }
+
+
+class OrgThreatRegistry:
+    def __init__(self):
+        self.orgs = {}
+        self._sequence = 0
+
+    def register_org(self, org_id, name, short_name=None):
+        if org_id not in self.orgs:
+            self.orgs[org_id] = OrgThreats(org_id, name, short_name or name)
+        return self.orgs[org_id]
+
+    def _org(self, org_id):
+        org = self.orgs.get(org_id)
+        if org is None:
+            raise UnknownOrgError(org_id)
+        return org
+
+    def upsert(self, org_id, threat):
+        self._sequence += 1
+        return self._org(org_id).upsert(threat, self._sequence)
+
+    def resolve(self, org_id, incident_id):
+        return self._org(org_id).resolve(incident_id)
+
+    def apply(self, events):
+        """Apply {"action": "upsert"|"resolve", "org", "threat"|"incidentID"} events, then publish once
+
+        Unknown orgs are rejected before anything is applied.
+        """
+        unknown = sorted({event["org"] for event in events if event["org"] not in self.orgs})
+        if unknown:
+            raise UnknownOrgError(", ".join(unknown))
+        applied = resolved = 0
+        for event in events:
+            if event["action"] == "resolve":
+                incident_id = event.get("incidentID") or (event.get("threat") or {}).get("incidentID")
+                resolved += self.resolve(event["org"], incident_id)
+            else:
+                self.upsert(event["org"], event["threat"])
+                applied += 1
+        snapshot = self.publish()
+        return {"upserted": applied, "resolved": resolved, "version": snapshot.version}
+
+    def status(self):
+        return [org.status() for org in self.orgs.values()]
+
+    def publish(self):
+        """Publish the current state as the bkkthreat snapshot (a new version only on change)"""
+        snapshot, _ = snapshots.store.publish(SNAPSHOT_NAME, self.status())
+        return snapshot
+
+    def seed(self, orgs):
+        """Load orgs and their threats in the get_all_org_status shape"""
+        for org in orgs:
+            self.register_org(org["id"], org["name"], org.get("short_name"))
+            # Lists are newest first; ingest oldest first so they keep that order
+            for threat in reversed(org.get("threat_list", [])):
+                self.upsert(org["id"], threat)
+
+
+registry = OrgThreatRegistry()
+# Until a feed ingests real threats, start from the hand-written org list
+registry.seed(get_all_org_status())
@@ -0,0 +1,283 @@
+"""
+Deadlines, hedged GETs and per-endpoint circuit breakers for upstream calls.
+
+A deadline is set once per API request (and per snapshot refresh) and lives
+in a context variable, so every upstream call made while handling it,
+including each call of the nodeplot GetNodeLinks fan-out, waits only for the
+time that is left. Nested deadlines can only shorten it. A coalesced
+upstream call is shared by callers with different deadlines, so it runs
+under the endpoint timeout alone and each caller stops waiting at its own.
+
+A GET still running after the endpoint's recent p95 latency is sent a second
+time and the first response wins. Hedges draw from a token bucket that each
+request refills by UPSTREAM_HEDGE_BUDGET_RATIO, so a slow upstream sees at
+most ~10% extra load.
+
+Each endpoint (analytic action) has a circuit breaker. After
+UPSTREAM_BREAKER_FAILURES consecutive timeouts, transport errors or 5xx
+responses it opens and calls fail fast for UPSTREAM_BREAKER_RESET_SECONDS;
+then one probe is let through and its result closes or reopens it. While an
+endpoint is failing, upstream.request() serves the last good response for the
+same call when it has one.
+"""
+import contextlib
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+
+import httpx
+
+from app.services import metrics
+from app.services.settings import settings
+
+HEDGE_ENABLED = settings.upstream_hedge_enabled
+HEDGE_QUANTILE = settings.upstream_hedge_quantile
+HEDGE_MIN_DELAY = settings.upstream_hedge_min_delay
+HEDGE_MIN_SAMPLES = settings.upstream_hedge_min_samples
+HEDGE_BUDGET_RATIO = settings.upstream_hedge_budget_ratio
+# Latency samples kept per endpoint
+HEDGE_WINDOW = 200
+# Recompute the quantile after this many new samples
+HEDGE_RECOMPUTE_EVERY = 20
+HEDGE_MAX_TOKENS = 10.0
+
+BREAKER_FAILURES = settings.upstream_breaker_failures
+BREAKER_RESET_SECONDS = settings.upstream_breaker_reset_seconds
+
+LAST_GOOD_ENTRIES = settings.upstream_last_good_entries
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """The request's deadline passed before or during an upstream call"""
+
+
+class CircuitOpenError(httpx.TransportError):
+    """The endpoint's circuit is open; the upstream was not called"""
+
+
+_deadline = ContextVar("upstream_deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Bound upstream calls made in this context (and tasks started from it) to `seconds` from now"""
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        expires = min(expires, current)
+    token = _deadline.set(expires)
+    try:
+        yield expires
+    finally:
+        _deadline.reset(token)
+
+
+@contextlib.contextmanager
+def no_deadline():
+    """Lift the deadline for work shared by several callers, each of which bounds its own wait"""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None without one"""
+    expires = _deadline.get()
+    if expires is None:
+        return None
+    return expires - time.monotonic()
+
+
+def check_deadline(what="upstream call"):
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"deadline exceeded before {what}")
+    return left
+
+
+class LatencyTracker:
+    """Recent successful latencies per endpoint and their hedge quantile"""
+
+    def __init__(self, window=HEDGE_WINDOW, quantile=HEDGE_QUANTILE):
+        self.window = window
+        self.quantile = quantile
+        # endpoint -> [samples deque, cached quantile, samples since recompute]
+        self._endpoints = {}
+
+    def observe(self, endpoint, seconds):
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            state = self._endpoints[endpoint] = [deque(maxlen=self.window), None, 0]
+        state[0].append(seconds)
+        state[2] += 1
+
+    def value(self, endpoint):
+        """The quantile of recent latencies, or None with fewer than HEDGE_MIN_SAMPLES"""
+        state = self._endpoints.get(endpoint)
+        if state is None or len(state[0]) < HEDGE_MIN_SAMPLES:
+            return None
+        if state[1] is None or state[2] >= HEDGE_RECOMPUTE_EVERY:
+            ordered = sorted(state[0])
+            state[1] = ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+            state[2] = 0
+        return state[1]
+
+
+class HedgeBudget:
+    """Token bucket per endpoint: each request adds `ratio` tokens, each hedge spends one"""
+
+    def __init__(self, ratio=HEDGE_BUDGET_RATIO, max_tokens=HEDGE_MAX_TOKENS):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = {}
+
+    def on_request(self, endpoint):
+        self._tokens[endpoint] = min(self.max_tokens, self._tokens.get(endpoint, 0.0) + self.ratio)
+
+    def try_spend(self, endpoint):
+        tokens = self._tokens.get(endpoint, 0.0)
+        if tokens < 1.0:
+            return False
+        self._tokens[endpoint] = tokens - 1.0
+        return True
+
+
+latencies = LatencyTracker()
+hedge_budget = HedgeBudget()
+
+
+def hedge_delay(endpoint):
+    """How long to wait before hedging a GET to `endpoint`, or None to not hedge"""
+    if not HEDGE_ENABLED:
+        return None
+    hedge_budget.on_request(endpoint)
+    quantile = latencies.value(endpoint)
+    if quantile is None:
+        return None
+    return max(HEDGE_MIN_DELAY, quantile)
+
+
+class CircuitBreaker:
+    def __init__(self, endpoint, failure_threshold=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+        self.open_count = 0
+        self.rejected = 0
+
+    def allow(self):
+        """True when a call may go to the upstream; half-open lets one probe through"""
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+            self.probe_started = now
+            return True
+        # A probe that never reported back (cancelled) must not block forever
+        if self.state == "half_open" and now - self.probe_started >= self.reset_seconds:
+            self.probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.open_count += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+
+    def status(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "open_count": self.open_count,
+            "rejected": self.rejected,
+        }
+
+
+breakers = {}
+
+
+def breaker_for(endpoint):
+    breaker = breakers.get(endpoint)
+    if breaker is None:
+        breaker = breakers[endpoint] = CircuitBreaker(endpoint)
+    return breaker
+
+
+class LastGood:
+    """The last successful response per upstream call, in one bounded LRU per endpoint
+
+    Per endpoint so a GetNodeLinks fan-out over thousands of nodes cannot
+    evict the handful of dashboard responses.
+    """
+
+    def __init__(self, maxsize=LAST_GOOD_ENTRIES):
+        self.maxsize = maxsize
+        self._endpoints = {}
+        self.served = 0
+
+    def put(self, endpoint, key, response):
+        entries = self._endpoints.setdefault(endpoint, OrderedDict())
+        entries[key] = response
+        entries.move_to_end(key)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def get(self, endpoint, key):
+        entries = self._endpoints.get(endpoint)
+        response = entries.get(key) if entries is not None else None
+        if response is not None:
+            entries.move_to_end(key)
+            self.served += 1
+        return response
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._endpoints.values())
+
+
+last_good = LastGood()
+
+
+def status():
+    return {
+        "breakers": {endpoint: breaker.status() for endpoint, breaker in breakers.items()},
+        "hedge_delays": {endpoint: latencies.value(endpoint) for endpoint in latencies._endpoints},
+        "last_good_entries": len(last_good),
+        "last_good_served": last_good.served,
+    }
+
+
+_BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _collect():
+    return [
+        ("upstream_circuit_state", "gauge", "Circuit breaker state per action (0 closed, 1 half-open, 2 open)",
+         [({"endpoint": endpoint}, _BREAKER_STATES[breaker.state]) for endpoint, breaker in breakers.items()]),
+        ("upstream_circuit_rejected_total", "counter", "Calls failed fast by an open circuit",
+         [({"endpoint": endpoint}, breaker.rejected) for endpoint, breaker in breakers.items()]),
+        ("upstream_stale_served_total", "counter", "Last good responses served while the upstream was failing",
+         [({}, last_good.served)]),
+    ]
+
+
+hedges = metrics.registry.counter(
+    "upstream_hedges_total", "Hedged GETs sent, and how many the hedge won", ("endpoint", "result"))
+metrics.registry.add_collector(_collect)
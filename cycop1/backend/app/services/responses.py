@@ -0,0 +1,170 @@
+"""
+Conditional JSON responses.
+
+Every payload gets a stable content hash sent as an ETag; a client that sends
+the same value back in If-None-Match gets `304 Not Modified` with no body.
+
+Bodies are rendered straight to bytes (with orjson when it is installed),
+skipping FastAPI's jsonable_encoder; callers that already hold the bytes
+(a snapshot's rendered body, an upstream body) pass them through untouched.
+
+Bodies of at least COMPRESSION_MIN_BYTES are sent brotli (when installed) or
+gzip encoded, as negotiated from Accept-Encoding. Callers serving a cached
+value pass its `variants` dict so each encoding is compressed once per
+version rather than on every poll. The ETag names the negotiated coding
+("<digest>-br"), so the identity and compressed bodies of one payload never
+share a strong validator.
+"""
+import gzip
+import hashlib
+import json
+
+from fastapi import Response
+
+from app.services.metrics import serialize_span
+from app.services.settings import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_CACHE_CONTROL = "no-cache"
+JSON_MEDIA_TYPE = "application/json"
+
+COMPRESSION_MIN_BYTES = settings.compression_min_bytes
+GZIP_LEVEL = settings.gzip_level
+BROTLI_QUALITY = settings.brotli_quality
+
+
+def render_json(payload):
+    """Serialize to compact UTF-8 JSON bytes"""
+    with serialize_span():
+        if orjson is not None:
+            return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def render_with_digest(payload):
+    body = render_json(payload)
+    return body, hashlib.sha1(body).hexdigest()
+
+
+class FastJSONResponse(Response):
+    """JSONResponse without the generic encoder, for routes that build plain dict/list payloads"""
+    media_type = JSON_MEDIA_TYPE
+
+    def render(self, content):
+        return render_json(content)
+
+
+def supported_encodings():
+    """Preferred first"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(request):
+    """Pick br or gzip from Accept-Encoding, or None for an uncompressed body"""
+    header = request.headers.get("accept-encoding")
+    if not header:
+        return None
+    weights = {}
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for name in supported_encodings():
+        quality = weights.get(name, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compress(body, encoding):
+    with serialize_span():
+        if encoding == "br":
+            return brotli.compress(body, quality=BROTLI_QUALITY)
+        # mtime=0 keeps the gzip bytes identical across processes
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encoded_body(body, digest, encoding, variants=None):
+    """Compress body, reusing (and filling) the caller's per-version variants"""
+    if variants is None:
+        return compress(body, encoding)
+    key = ("encoded", digest, encoding)
+    if key not in variants:
+        variants[key] = compress(body, encoding)
+    return variants[key]
+
+
+def make_etag(digest, weak=False, encoding=None):
+    tag = f"{digest}-{encoding}" if encoding else digest
+    return f'W/"{tag}"' if weak else f'"{tag}"'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [value.strip() for value in header.split(",")]
+    # Weak comparison: W/"x" matches "x"
+    return any(candidate.removeprefix("W/") == etag.removeprefix("W/") for candidate in candidates)
+
+
+def negotiated_response(request, body, headers, digest=None, media_type=JSON_MEDIA_TYPE, variants=None):
+    """Send body brotli/gzip encoded as negotiated from Accept-Encoding once it reaches COMPRESSION_MIN_BYTES"""
+    headers["Vary"] = "Accept-Encoding"
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        encoding = negotiate_encoding(request)
+        if encoding:
+            body = encoded_body(body, digest, encoding, variants)
+            headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def compressed_json(request, payload, cache_control="no-store"):
+    """Return payload as compressed JSON without validators, for POST responses"""
+    return negotiated_response(request, render_json(payload), {"Cache-Control": cache_control})
+
+
+def conditional_json(request, payload, digest=None, cache_control=DEFAULT_CACHE_CONTROL, body=None,
+                     media_type=JSON_MEDIA_TYPE, variants=None, weak=False):
+    """Return payload as JSON with ETag/Cache-Control, or 304 if the client has it
+
+    `digest` lets callers pass a precomputed content hash (e.g. a snapshot's)
+    so an unchanged payload is answered without serializing it at all, and
+    `body` the already rendered bytes so a changed one is not serialized either.
+    `variants` is a dict owned by the cached value where compressed bodies are kept.
+    `weak` marks the ETag as weak, for payloads whose digest leaves out
+    fields that change on every response (timestamps).
+    """
+    if digest is None and body is not None:
+        digest = hashlib.sha1(body).hexdigest()
+    if digest is None:
+        body, digest = render_with_digest(payload)
+    # Tagged with the coding whenever one is negotiated, even if a small body then goes out as is
+    etag = make_etag(digest, weak, negotiate_encoding(request))
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if body is None:
+        body = render_json(payload)
+    return negotiated_response(request, body, headers, digest, media_type, variants)
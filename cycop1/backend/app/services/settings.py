@@ -0,0 +1,115 @@
+"""
+Application settings, read once from the environment and `.env`.
+
+Every tunable the backend reads lives here, so configuration is parsed in one
+place and modules import values instead of calling os.getenv. Field names
+match the environment variables (case-insensitive). Map-like settings keep
+the "name=value,name=value" string form and are parsed by their module.
+"""
+from functools import lru_cache
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
+
+    # Upstream analytic API
+    api_path: str = ""
+    api_authen_user: str = "api"
+    api_authen_password: str = ""
+    org_id: str = "default"
+    upstream_timeout: float = 10.0
+    upstream_connect_timeout: float = 5.0
+    upstream_max_connections: int = 100
+    upstream_max_keepalive: int = 20
+    upstream_keepalive_expiry: float = 30.0
+    upstream_fanout_concurrency: int = 16
+    upstream_endpoint_timeouts: str = ""
+    # Deadlines, hedging and circuit breaking (services/resilience.py)
+    request_deadline_seconds: float = 15.0
+    snapshot_deadline_seconds: float = 60.0
+    upstream_hedge_enabled: bool = True
+    upstream_hedge_quantile: float = 0.95
+    upstream_hedge_min_delay: float = 0.05
+    upstream_hedge_min_samples: int = 20
+    upstream_hedge_budget_ratio: float = 0.1
+    upstream_breaker_failures: int = 5
+    upstream_breaker_reset_seconds: float = 30.0
+    upstream_last_good_entries: int = 256
+
+    # Response cache and snapshots
+    cache_max_entries: int = 256
+    cache_ttls: str = ""
+    snapshot_refresh_enabled: bool = True
+    snapshot_intervals: str = ""
+
+    # Startup warm-up: refresh every snapshot source before serving, for at most the budget
+    warmup_enabled: bool = False
+    warmup_budget_seconds: float = 5.0
+
+    # Responses
+    compression_min_bytes: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 5
+
+    # Nodeplot, map and geometry
+    # Every Nth refresh of a layer re-fetches all its links; 1 makes every refresh full
+    nodeplot_full_refresh_every: int = Field(10, ge=1)
+    nodeplot_max_layer_states: int = Field(64, ge=1)
+    nodeplot_cluster_below_zoom: int = 10
+    nodeplot_cluster_cell_pixels: int = 64
+    nodeplot_index_cell_degrees: float = 0.25
+    geometry_tolerance_pixels: float = 1.0
+    # Most points one /api/geo/districts/lookup request may send
+    geometry_max_lookup_points: int = Field(10000, ge=1)
+    bangkok_geojson_path: str = ""
+
+    # MITRE stats day buckets
+    mitre_today_ttl: float = 60.0
+    mitre_settle_seconds: float = 3600.0
+    mitre_max_days: int = 366
+    mitre_day_cache_entries: int = 1024
+
+    # Kill chain engine (fed by the event sync)
+    kill_chain_retention_days: int = Field(90, ge=1)
+    kill_chain_prune_interval_seconds: float = Field(3600.0, gt=0)
+
+    # BKK org threat registry
+    bkk_top_threats: int = 10
+
+    # Bearer token for the write routes (threat ingest, manual sync); empty disables them
+    ingest_token: str = ""
+
+    # Elasticsearch event sync
+    rtarf_sync_enabled: bool = False
+    rtarf_sync_interval_seconds: float = 300.0
+    es_url: str = ""
+    es_index: str = "rtarf-events-*"
+    es_username: str = ""
+    es_password: str = ""
+    es_verify_certs: bool = True
+    es_timestamp_field: str = "@timestamp"
+    event_sync_database_url: str = "sqlite:///./events.db"
+    event_sync_page_size: int = 1000
+    event_sync_batch_size: int = 500
+    event_sync_queue_pages: int = 4
+    event_sync_pit_keep_alive: str = "1m"
+    event_sync_start_from: str = ""
+
+    # Logging and metrics
+    log_format: str = "json"
+    log_level: str = "INFO"
+    log_levels: str = ""
+    log_debug_rate: float = 5.0
+    log_queue_size: int = 10000
+    metrics_loop_interval: float = 0.5
+
+
+@lru_cache
+def get_settings():
+    return Settings()
+
+
+settings = get_settings()
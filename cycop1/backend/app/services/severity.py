@@ -0,0 +1,30 @@
+"""
+Severity helpers shared by the aggregation services.
+
+Scores follow the frontend's mapScoreToSeverity (mitreData.tsx):
+88+ critical, 60+ high, 40+ medium, otherwise low.
+"""
+
+SEVERITY_LEVELS = ("critical", "high", "medium", "low")
+
+
+def severity_from_score(score):
+    """Map a numeric score (int or numeric string) to a severity label"""
+    try:
+        value = float(score)
+    except (TypeError, ValueError):
+        return "low"
+    if value >= 88:
+        return "critical"
+    if value >= 60:
+        return "high"
+    if value >= 40:
+        return "medium"
+    return "low"
+
+
+def normalize_severity(value):
+    """Accept a label ("High") or a score ("75") and return a severity label"""
+    if isinstance(value, str) and value.strip().lower() in SEVERITY_LEVELS:
+        return value.strip().lower()
+    return severity_from_score(value)
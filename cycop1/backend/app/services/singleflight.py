@@ -0,0 +1,47 @@
+"""
+Single-flight coalescing for identical concurrent upstream calls.
+
+When many screens refresh at once, the first caller for a key starts the call
+and everyone else arriving before it finishes awaits the same result.
+"""
+import asyncio
+import json
+
+
+def make_key(*parts):
+    """Build a stable key from a path plus any params/payload dicts"""
+    return json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Run `fn()` once for all concurrent callers sharing `key`"""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shield so one caller disconnecting does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+
+upstream_flight = SingleFlight()
+layer_flight = SingleFlight()
@@ -0,0 +1,286 @@
+"""
+Background snapshot refresher for dashboard data.
+
+Each source (defcon status, severities, alerts, layers, nodeplot graphs, ...)
+is pulled on its own interval into a versioned in-memory snapshot. Route
+handlers read the latest snapshot instead of calling the upstream API.
+
+Intervals adapt: a source whose content changed is polled faster (down to a
+quarter of its base interval); unchanged sources drift back to the base.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from app.services import resilience, upstream
+from app.services.get_layers import get_layer_options
+from app.services.get_nodeplot import layer_graph, refresh_layers
+from app.services.responses import render_json
+from app.services.settings import settings
+from app.services.upstream import parse_float_map
+
+logger = logging.getLogger("app.snapshots")
+
+# Upper bound on one refresh of a source, shared by all its upstream calls
+SNAPSHOT_DEADLINE = settings.snapshot_deadline_seconds
+
+# Base refresh interval per source, in seconds
+DEFAULT_INTERVALS = {
+    "defstatus": 15.0,
+    "severities": 15.0,
+    "threatdistributions": 15.0,
+    "threatalerts": 10.0,
+    "layers": 60.0,
+    "nodeplot": 30.0,
+}
+
+
+def content_hash(data):
+    """Stable hash of a JSON-serializable payload"""
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Snapshot:
+    name: str
+    version: int
+    data: object
+    content_hash: str
+    published_at: str
+    # Bodies derived from this version (rendered JSON, compressed variants)
+    variants: dict = field(default_factory=dict, repr=False, compare=False)
+
+    def rendered(self, key, build):
+        """Build a derived body once per version and keep it with the snapshot"""
+        if key not in self.variants:
+            self.variants[key] = build()
+        return self.variants[key]
+
+    @property
+    def body(self):
+        """The rendered JSON body, serialized on first use"""
+        return self.rendered("body", lambda: render_json(self.data))
+
+
+class SnapshotStore:
+    """Latest published value per source; a new version only when content changes"""
+
+    def __init__(self):
+        self._snapshots = {}
+        self._changed = asyncio.Event()
+        # Bumped on every new version; lets waiters tell whether they missed one
+        self.generation = 0
+
+    def get(self, name):
+        return self._snapshots.get(name)
+
+    async def wait_for_change(self, timeout, since=None):
+        """Wait until any snapshot gets a new version; False on timeout
+
+        `since` is the generation the caller read before it last looked at the
+        snapshots; if a publish has happened since then, return at once.
+        """
+        if since is not None and self.generation != since:
+            return True
+        event = self._changed
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def publish(self, name, data):
+        """Store data under name and return (snapshot, changed)"""
+        digest = content_hash(data)
+        current = self._snapshots.get(name)
+        if current is not None and current.content_hash == digest:
+            return current, False
+        version = current.version + 1 if current is not None else 1
+        # Replace, never mutate, so readers holding the old snapshot stay consistent
+        snapshot = Snapshot(name, version, data, digest, datetime.now(timezone.utc).isoformat())
+        self._snapshots[name] = snapshot
+        self.generation += 1
+        # Wake current waiters, then arm a fresh event for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+        return snapshot, True
+
+    def names(self):
+        return list(self._snapshots)
+
+
+@dataclass
+class Source:
+    name: str
+    loader: object
+    interval: float
+    jitter: float = 0.1
+    min_interval: float = 0.0
+    current_interval: float = 0.0
+    last_refresh_at: str = None
+    last_changed_at: str = None
+    last_duration_ms: float = None
+    last_error: str = None
+    refresh_count: int = 0
+    error_count: int = 0
+    change_count: int = 0
+    task: object = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self.min_interval = self.min_interval or self.interval / 4
+        self.current_interval = self.interval
+
+    def next_delay(self):
+        spread = self.current_interval * self.jitter
+        return max(0.0, self.current_interval + random.uniform(-spread, spread))
+
+    def status(self, store):
+        snapshot = store.get(self.name)
+        return {
+            "interval_seconds": self.interval,
+            "current_interval_seconds": round(self.current_interval, 3),
+            "version": snapshot.version if snapshot else 0,
+            "last_refresh_at": self.last_refresh_at,
+            "last_changed_at": self.last_changed_at,
+            "last_duration_ms": self.last_duration_ms,
+            "last_error": self.last_error,
+            "refresh_count": self.refresh_count,
+            "change_count": self.change_count,
+            "error_count": self.error_count,
+        }
+
+
+class SnapshotRefresher:
+    def __init__(self, store):
+        self.store = store
+        self.sources = {}
+        self.is_running = False
+
+    def add_source(self, name, loader, interval, jitter=0.1):
+        self.sources[name] = Source(name, loader, interval, jitter=jitter)
+
+    async def refresh(self, name):
+        """Run one refresh of a source now and publish its snapshot"""
+        source = self.sources[name]
+        started = time.perf_counter()
+        try:
+            with resilience.deadline(SNAPSHOT_DEADLINE):
+                data = await source.loader()
+            snapshot, changed = self.store.publish(name, data)
+            source.last_error = None
+            if changed:
+                source.change_count += 1
+                source.last_changed_at = datetime.now(timezone.utc).isoformat()
+                # The first publish is not a change worth speeding up for
+                if snapshot.version > 1:
+                    source.current_interval = max(source.min_interval, source.current_interval / 2)
+            else:
+                source.current_interval = min(source.interval, source.current_interval * 1.5)
+        except Exception as e:
+            # Keep the last good snapshot; readers are unaffected
+            source.error_count += 1
+            source.last_error = str(e) or type(e).__name__
+            logger.warning("Snapshot refresh failed for %s: %s", name, source.last_error,
+                           extra={"source": name, "errors": source.error_count})
+        finally:
+            source.refresh_count += 1
+            source.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            source.last_refresh_at = datetime.now(timezone.utc).isoformat()
+
+    async def _run(self, name):
+        source = self.sources[name]
+        # Spread the first round so sources do not all hit the upstream together
+        await asyncio.sleep(random.uniform(0, source.jitter * source.interval))
+        while self.is_running:
+            await self.refresh(name)
+            await asyncio.sleep(source.next_delay())
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        for name, source in self.sources.items():
+            source.task = asyncio.create_task(self._run(name))
+        logger.info("Snapshot refresher started (%s sources)", len(self.sources), extra={"sources": sorted(self.sources)})
+
+    async def stop(self):
+        self.is_running = False
+        tasks = [source.task for source in self.sources.values() if source.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for source in self.sources.values():
+            source.task = None
+        logger.info("Snapshot refresher stopped")
+
+    def status(self):
+        return {
+            "is_running": self.is_running,
+            "sources": {name: source.status(self.store) for name, source in self.sources.items()},
+        }
+
+
+store = SnapshotStore()
+refresher = SnapshotRefresher(store)
+
+
+def refresh_enabled():
+    return settings.snapshot_refresh_enabled
+
+
+def source_intervals():
+    intervals = dict(DEFAULT_INTERVALS)
+    intervals.update(parse_float_map(settings.snapshot_intervals))
+    return intervals
+
+
+# Upstream analytic actions served from snapshots, by source name
+ANALYTIC_SOURCES = {
+    "defstatus": "GetDefConStatus",
+    "severities": "GetThreatSeverities",
+    "threatdistributions": "GetThreatDistributions",
+    "threatalerts": "GetThreatAlerts",
+}
+
+
+def analytic_loader(action):
+    async def load():
+        return await upstream.get_json(upstream.analytic_path(action))
+    return load
+
+
+async def load_all_layer_graphs():
+    """Incrementally refresh every layer's graph in one shared fetch, keyed by layer value"""
+    layers_snapshot = store.get("layers")
+    layers = layers_snapshot.data if layers_snapshot else await get_layer_options()
+    names = [layer["value"] for layer in layers]
+    fetched = await refresh_layers(names)
+
+    previous = store.get("nodeplot")
+    graphs = {}
+    failed = []
+    for name, data in fetched.items():
+        if data["errors"].get("GetNodesByLayer"):
+            failed.append(name)
+            # Keep the last good graph for a layer that failed this round
+            if previous is not None and name in previous.data:
+                graphs[name] = previous.data[name]
+        else:
+            graphs[name] = layer_graph(data)
+    if names and len(failed) == len(names):
+        raise RuntimeError(f"All layer fetches failed: {', '.join(failed)}")
+    return graphs
+
+
+def register_default_sources():
+    intervals = source_intervals()
+    for name, action in ANALYTIC_SOURCES.items():
+        refresher.add_source(name, analytic_loader(action), intervals[name])
+    refresher.add_source("layers", get_layer_options, intervals["layers"])
+    refresher.add_source("nodeplot", load_all_layer_graphs, intervals["nodeplot"])
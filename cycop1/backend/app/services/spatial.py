@@ -0,0 +1,204 @@
+"""
+Grid spatial index over a layer's nodes for viewport (bbox) queries.
+
+Nodes are bucketed into fixed lat/lon cells. A bbox query only visits the
+cells it overlaps, and for low zoom levels nodes are grouped into clusters
+(one per grid cell of roughly CLUSTER_CELL_PIXELS on screen) carrying a
+count and the worst node status. Clusters are built once per zoom level and
+kept on the index, which itself is built once per nodeplot snapshot version.
+"""
+import math
+from collections import Counter, defaultdict
+
+from app.services.settings import settings
+from app.services.severity import severity_from_score
+
+# Below this zoom the response is clustered
+CLUSTER_BELOW_ZOOM = settings.nodeplot_cluster_below_zoom
+# Approximate on-screen size of a cluster cell (256px tiles)
+CLUSTER_CELL_PIXELS = settings.nodeplot_cluster_cell_pixels
+INDEX_CELL_DEGREES = settings.nodeplot_index_cell_degrees
+
+# Worst last
+STATUS_LEVELS = ("unknown", "ok", "low", "medium", "high", "critical")
+STATUS_ALIASES = {
+    "up": "ok", "online": "ok", "normal": "ok", "healthy": "ok", "active": "ok", "green": "ok",
+    "info": "low", "minor": "low",
+    "warning": "medium", "warn": "medium", "degraded": "medium", "yellow": "medium",
+    "error": "high", "major": "high", "orange": "high",
+    "down": "critical", "offline": "critical", "fail": "critical", "failed": "critical", "red": "critical",
+}
+STATUS_KEYS = ("severity", "serverity", "status", "state", "level")
+
+
+def status_level(status):
+    """Reduce a node's decoded status object to one of STATUS_LEVELS"""
+    if isinstance(status, dict):
+        for key in STATUS_KEYS:
+            if key in status and status[key] not in (None, ""):
+                return status_level(status[key])
+        return "unknown"
+    if isinstance(status, (int, float)) and not isinstance(status, bool):
+        return severity_from_score(status)
+    if isinstance(status, str):
+        text = status.strip().lower()
+        if text in STATUS_LEVELS:
+            return text
+        if text in STATUS_ALIASES:
+            return STATUS_ALIASES[text]
+        try:
+            return severity_from_score(float(text))
+        except ValueError:
+            return "unknown"
+    return "unknown"
+
+
+def worst_level(levels):
+    return max(levels, key=STATUS_LEVELS.index, default="unknown")
+
+
+def parse_bbox(value):
+    """Parse "west,south,east,north" (Leaflet's toBBoxString); raises ValueError"""
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != 4 or not all(math.isfinite(part) for part in parts):
+        raise ValueError("bbox must be west,south,east,north")
+    west, south, east, north = parts
+    if south > north:
+        raise ValueError("bbox south must not exceed north")
+    return west, south, east, north
+
+
+def cluster_cell_degrees(zoom):
+    """Degrees of longitude covered by CLUSTER_CELL_PIXELS at a zoom level"""
+    return 360.0 / (2 ** zoom) * CLUSTER_CELL_PIXELS / 256
+
+
+def point_coordinates(node):
+    try:
+        lat = float(node.get("latitude"))
+        lon = float(node.get("longitude"))
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class SpatialIndex:
+    def __init__(self, nodes, cell_degrees=INDEX_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._cells = defaultdict(list)
+        self._clusters = {}
+        # (lat, lon, level, node) per placeable node
+        self._points = []
+        self.unplaced = 0
+        for node in nodes:
+            coordinates = point_coordinates(node)
+            if coordinates is None:
+                self.unplaced += 1
+                continue
+            point = (*coordinates, status_level(node.get("status")), node)
+            self._points.append(point)
+            self._cells[self._cell(point[0], point[1], cell_degrees)].append(point)
+
+    def __len__(self):
+        return len(self._points)
+
+    @staticmethod
+    def _cell(lat, lon, size):
+        return math.floor(lat / size), math.floor(lon / size)
+
+    def _ranges(self, bbox):
+        """Split a bbox crossing the antimeridian into two lon ranges"""
+        west, south, east, north = bbox
+        if west <= east:
+            return [(west, south, east, north)]
+        return [(west, south, 180.0, north), (-180.0, south, east, north)]
+
+    def _points_in(self, bbox):
+        for west, south, east, north in self._ranges(bbox):
+            size = self.cell_degrees
+            min_row, min_col = self._cell(south, west, size)
+            max_row, max_col = self._cell(north, east, size)
+            span = (max_row - min_row + 1) * (max_col - min_col + 1)
+            if span > len(self._cells):
+                # Huge viewport: walking occupied cells is cheaper than walking the grid
+                cells = [points for (row, col), points in self._cells.items()
+                         if min_row <= row <= max_row and min_col <= col <= max_col]
+            else:
+                cells = [self._cells[key] for key in
+                         ((row, col) for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1))
+                         if key in self._cells]
+            for points in cells:
+                for point in points:
+                    if south <= point[0] <= north and west <= point[1] <= east:
+                        yield point
+
+    def query(self, bbox):
+        """Nodes inside bbox"""
+        return [point[3] for point in self._points_in(bbox)]
+
+    def clusters(self, zoom):
+        """All clusters at a zoom level, built on first use"""
+        if zoom not in self._clusters:
+            size = cluster_cell_degrees(zoom)
+            groups = defaultdict(list)
+            for point in self._points:
+                groups[self._cell(point[0], point[1], size)].append(point)
+            self._clusters[zoom] = [self._summarize(zoom, key, points) for key, points in groups.items()]
+        return self._clusters[zoom]
+
+    @staticmethod
+    def _summarize(zoom, key, points):
+        lats = [point[0] for point in points]
+        lons = [point[1] for point in points]
+        levels = Counter(point[2] for point in points)
+        return {
+            "id": f"{zoom}:{key[0]}:{key[1]}",
+            "latitude": sum(lats) / len(points),
+            "longitude": sum(lons) / len(points),
+            "count": len(points),
+            "worst_status": worst_level(levels),
+            "status_counts": dict(levels),
+            "bounds": [min(lons), min(lats), max(lons), max(lats)],
+            # Single-node clusters are returned as the node itself
+            "node": points[0][3] if len(points) == 1 else None,
+        }
+
+    def clusters_in(self, bbox, zoom):
+        ranges = self._ranges(bbox)
+        return [
+            cluster for cluster in self.clusters(zoom)
+            if any(south <= cluster["latitude"] <= north and west <= cluster["longitude"] <= east
+                   for west, south, east, north in ranges)
+        ]
+
+
+def viewport(index, graph, bbox=None, zoom=None, edges=False):
+    """Shape a viewport response: visible nodes, plus clusters below CLUSTER_BELOW_ZOOM"""
+    bbox = bbox or (-180.0, -90.0, 180.0, 90.0)
+    clustered = zoom is not None and zoom < CLUSTER_BELOW_ZOOM
+    clusters = []
+    if clustered:
+        nodes = []
+        for cluster in index.clusters_in(bbox, zoom):
+            if cluster["node"] is not None:
+                nodes.append(cluster["node"])
+            else:
+                clusters.append({key: value for key, value in cluster.items() if key != "node"})
+    else:
+        nodes = index.query(bbox)
+
+    result = {
+        "bbox": list(bbox),
+        "zoom": zoom,
+        "clustered": clustered,
+        "total_nodes": len(index),
+        "unplaced_nodes": index.unplaced,
+        "nodes": nodes,
+        "clusters": clusters,
+    }
+    if edges:
+        visible = {node["id"] for node in nodes}
+        result["edges"] = [edge for edge in graph.get("edges", []) if edge[0] in visible or edge[1] in visible]
+    return result
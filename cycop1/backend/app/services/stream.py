@@ -0,0 +1,111 @@
+"""
+Server-sent event stream of dashboard snapshots.
+
+A client subscribes to topics (defstatus, severities, alerts, bkkthreat,
+nodeplot:{layer}, ...). It first receives a full `snapshot` event per topic,
+then `patch` events carrying RFC 6902 style operations, sent only when that
+topic's data actually changes.
+"""
+import json
+
+from app.services.snapshots import store
+
+# Topic name -> snapshot source name
+TOPICS = {
+    "defstatus": "defstatus",
+    "severities": "severities",
+    "distributions": "threatdistributions",
+    "threatdistributions": "threatdistributions",
+    "alerts": "threatalerts",
+    "threatalerts": "threatalerts",
+    "layers": "layers",
+    "bkkthreat": "bkkthreat",
+}
+
+KEEPALIVE_SECONDS = 15.0
+
+
+def is_valid_topic(topic):
+    return topic in TOPICS or (topic.startswith("nodeplot:") and len(topic) > len("nodeplot:"))
+
+
+def topic_value(topic):
+    """Return (version, data) for a topic, or (None, None) when nothing is published yet"""
+    if topic.startswith("nodeplot:"):
+        snapshot = store.get("nodeplot")
+        layer = topic.split(":", 1)[1]
+        if snapshot is None or layer not in snapshot.data:
+            return None, None
+        return snapshot.version, snapshot.data[layer]
+    snapshot = store.get(TOPICS[topic])
+    if snapshot is None:
+        return None, None
+    return snapshot.version, snapshot.data
+
+
+def _pointer(path, key):
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def json_diff(old, new, path=""):
+    """Return JSON-patch operations turning `old` into `new`
+
+    Dicts are diffed per key and equal-length lists per index; anything else
+    that differs is replaced whole.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": _pointer(path, key)})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": _pointer(path, key), "value": value})
+            else:
+                ops.extend(json_diff(old[key], value, _pointer(path, key)))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            ops.extend(json_diff(old_item, new_item, _pointer(path, index)))
+        return ops
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def format_event(event, payload):
+    data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def event_stream(topics, is_disconnected, keepalive=KEEPALIVE_SECONDS):
+    """Yield SSE messages for `topics` until the client disconnects"""
+    sent = {}
+
+    def changes():
+        for topic in topics:
+            version, value = topic_value(topic)
+            if version is None:
+                continue
+            if topic not in sent:
+                yield format_event("snapshot", {"topic": topic, "version": version, "data": value})
+            else:
+                patch = json_diff(sent[topic], value)
+                if patch:
+                    yield format_event("patch", {"topic": topic, "version": version, "patch": patch})
+            sent[topic] = value
+
+    # Read before each pass over the snapshots: a publish while we are
+    # suspended at a yield bumps it, and the next wait returns at once
+    generation = store.generation
+    for message in changes():
+        yield message
+
+    while not await is_disconnected():
+        if not await store.wait_for_change(keepalive, since=generation):
+            yield ": keepalive\n\n"
+            continue
+        generation = store.generation
+        for message in changes():
+            yield message
@@ -0,0 +1,377 @@
+"""
+Shared async client for the upstream analytic API.
+
+All service modules go through this one client so connections are pooled
+and kept alive between polls instead of opening a new TCP/TLS session per call.
+Calls are bounded by the current deadline, GETs are hedged and each action
+has a circuit breaker (see resilience.py).
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass, field
+
+import httpx
+
+from app.services import metrics, resilience
+from app.services.settings import settings
+from app.services.singleflight import make_key, upstream_flight
+
+logger = logging.getLogger("app.analytic")
+
+# Per-endpoint timeouts (seconds), matched on the last action name in the path
+DEFAULT_ENDPOINT_TIMEOUTS = {
+    "GetNodeLinks": 5.0,
+    "GetNodesStatus": 10.0,
+    "GetNodesByLayer": 10.0,
+    "GetMitreStats": 30.0,
+}
+
+
+def parse_float_map(raw):
+    """Parse "GetMitreStats=30,GetNodeLinks=5" into {name: float}"""
+    values = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        try:
+            values[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return values
+
+
+@dataclass
+class UpstreamConfig:
+    """Connection and auth settings for the analytic API"""
+    base_url: str = ""
+    username: str = "api"
+    password: str = ""
+    org_id: str = "default"
+    default_timeout: float = 10.0
+    connect_timeout: float = 5.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    fanout_concurrency: int = 16
+    endpoint_timeouts: dict = field(default_factory=lambda: dict(DEFAULT_ENDPOINT_TIMEOUTS))
+
+    @classmethod
+    def from_settings(cls, settings):
+        timeouts = dict(DEFAULT_ENDPOINT_TIMEOUTS)
+        timeouts.update(parse_float_map(settings.upstream_endpoint_timeouts))
+        return cls(
+            base_url=settings.api_path.rstrip("/"),
+            username=settings.api_authen_user,
+            password=settings.api_authen_password,
+            org_id=settings.org_id,
+            default_timeout=settings.upstream_timeout,
+            connect_timeout=settings.upstream_connect_timeout,
+            max_connections=settings.upstream_max_connections,
+            max_keepalive_connections=settings.upstream_max_keepalive,
+            keepalive_expiry=settings.upstream_keepalive_expiry,
+            fanout_concurrency=settings.upstream_fanout_concurrency,
+            endpoint_timeouts=timeouts,
+        )
+
+    def timeout_for(self, path):
+        """Return the timeout for an upstream path like api/Node/org/x/action/GetNodeLinks/123"""
+        for name, seconds in self.endpoint_timeouts.items():
+            if f"/{name}" in f"/{path}":
+                return seconds
+        return self.default_timeout
+
+
+config = UpstreamConfig.from_settings(settings)
+ORG_ID = config.org_id
+
+
+def analytic_path(action):
+    """Path of an analytic action (GetDefConStatus, ...) for the configured org"""
+    return f"api/Analytic/org/{ORG_ID}/action/{action}"
+
+_client = None
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_client():
+    """Return the shared AsyncClient, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=config.base_url,
+            auth=httpx.BasicAuth(config.username, config.password),
+            headers={"Content-Type": "application/json"},
+            timeout=httpx.Timeout(config.default_timeout, connect=config.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+            http2=_http2_available(),
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared client (called on app shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _observe(endpoint, method, started, outcome):
+    metrics.upstream_duration.observe(endpoint, method, outcome, value=time.perf_counter() - started)
+    if outcome == "timeout":
+        metrics.upstream_timeouts.inc(endpoint)
+    elif outcome != "ok":
+        metrics.upstream_errors.inc(endpoint, outcome)
+
+
+def _outcome(status_code):
+    if status_code >= 500:
+        return "http_5xx"
+    if status_code >= 400:
+        return "http_4xx"
+    return "ok"
+
+
+def _timeout(path):
+    """The endpoint timeout, cut to what is left of the deadline; (timeout, cut by deadline)"""
+    seconds = config.timeout_for(path)
+    left = resilience.check_deadline(metrics.endpoint_name(path))
+    if left is not None and left < seconds:
+        return httpx.Timeout(left, connect=min(left, config.connect_timeout)), True
+    return httpx.Timeout(seconds, connect=config.connect_timeout), False
+
+
+async def _send(method, path, payload=None, params=None):
+    client = get_client()
+    timeout, by_deadline = _timeout(path)
+    method = method.lower()
+    endpoint = metrics.endpoint_name(path)
+    metrics.upstream_in_flight.inc(endpoint)
+    started = time.perf_counter()
+    try:
+        if method == "get":
+            response = await client.get(f"/{path}", params=params, timeout=timeout)
+        else:
+            response = await client.post(f"/{path}", json=payload, params=params, timeout=timeout)
+    except httpx.TimeoutException as e:
+        if by_deadline:
+            _observe(endpoint, method, started, "deadline")
+            raise resilience.DeadlineExceeded(f"deadline exceeded during {endpoint}") from e
+        _observe(endpoint, method, started, "timeout")
+        raise
+    except Exception:
+        _observe(endpoint, method, started, "transport")
+        raise
+    finally:
+        metrics.upstream_in_flight.dec(endpoint)
+    outcome = _outcome(response.status_code)
+    _observe(endpoint, method, started, outcome)
+    if outcome == "ok":
+        resilience.latencies.observe(endpoint, time.perf_counter() - started)
+    return response
+
+
+async def _hedged_get(path, params=None):
+    """GET, sending a second copy if the first is slower than the endpoint's recent p95"""
+    endpoint = metrics.endpoint_name(path)
+    delay = resilience.hedge_delay(endpoint)
+    left = resilience.remaining()
+    if delay is None or (left is not None and left <= delay):
+        return await _send("get", path, params=params)
+
+    primary = asyncio.ensure_future(_send("get", path, params=params))
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done or not resilience.hedge_budget.try_spend(endpoint):
+        return await primary
+
+    resilience.hedges.inc(endpoint, "sent")
+    backup = asyncio.ensure_future(_send("get", path, params=params))
+    pending = {primary, backup}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is backup:
+                        resilience.hedges.inc(endpoint, "won")
+                    return task.result()
+        # Both failed: report the original call's error
+        return primary.result()
+    finally:
+        for task in (primary, backup):
+            if not task.done():
+                task.cancel()
+
+
+async def _call(key, method, path, payload=None, params=None):
+    """One upstream call behind the endpoint's circuit breaker"""
+    endpoint = metrics.endpoint_name(path)
+    breaker = resilience.breaker_for(endpoint)
+    if not breaker.allow():
+        raise resilience.CircuitOpenError(f"{endpoint} circuit open")
+    try:
+        if method.lower() == "get":
+            response = await _hedged_get(path, params=params)
+        else:
+            response = await _send(method, path, payload=payload, params=params)
+    except resilience.DeadlineExceeded:
+        # Our budget ran out; says nothing about the upstream's health
+        raise
+    except (httpx.TimeoutException, httpx.TransportError):
+        breaker.record_failure()
+        raise
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+        if response.status_code < 300:
+            resilience.last_good.put(endpoint, key, response)
+    return response
+
+
+async def _shared_call(key, method, path, payload=None, params=None):
+    """_call for every coalesced caller, bounded by the endpoint timeout rather than the first caller's deadline"""
+    with resilience.no_deadline():
+        return await _call(key, method, path, payload=payload, params=params)
+
+
+async def request(method, path, payload=None, params=None):
+    """Send a request to the analytic API and return the raw httpx.Response
+
+    Identical concurrent calls (same method, path, params and payload) share
+    one in-flight upstream request; every analytic API action we call is a read.
+    The shared call is not cut by any caller's deadline; each caller waits
+    at most until its own. When the call fails
+    (timeout, open circuit, 5xx) the last good response for it is returned
+    instead, if there is one.
+    """
+    key = make_key(method.lower(), path, params, payload)
+    endpoint = metrics.endpoint_name(path)
+    # Coalesced callers wait too, so time the wait rather than only the call
+    with metrics.upstream_span():
+        try:
+            left = resilience.check_deadline(endpoint)
+            started = time.perf_counter()
+            call = upstream_flight.do(key, lambda: _shared_call(key, method, path, payload=payload, params=params))
+            if left is None:
+                response = await call
+            else:
+                try:
+                    response = await asyncio.wait_for(call, left)
+                except asyncio.TimeoutError:
+                    # The shared call goes on for the other callers; only this wait is recorded
+                    _observe(endpoint, method.lower(), started, "deadline")
+                    raise resilience.DeadlineExceeded(f"deadline exceeded waiting for {endpoint}")
+        except (httpx.TimeoutException, httpx.TransportError):
+            stale = resilience.last_good.get(endpoint, key)
+            if stale is None:
+                raise
+            return stale
+        if response.status_code >= 500:
+            return resilience.last_good.get(endpoint, key) or response
+        return response
+
+
+async def iter_text(path, params=None):
+    """Stream a GET response body as text chunks (raises on HTTP errors)
+
+    Goes through the endpoint's circuit breaker and the current deadline like
+    request(). Streams are not coalesced and have no last good fallback: each
+    caller gets its own upstream request.
+    """
+    client = get_client()
+    endpoint = metrics.endpoint_name(path)
+    breaker = resilience.breaker_for(endpoint)
+    timeout, by_deadline = _timeout(path)
+    if not breaker.allow():
+        raise resilience.CircuitOpenError(f"{endpoint} circuit open")
+    metrics.upstream_in_flight.inc(endpoint)
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        async with client.stream("GET", f"/{path}", params=params, timeout=timeout) as response:
+            outcome = _outcome(response.status_code)
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            response.raise_for_status()
+            async for chunk in response.aiter_text():
+                yield chunk
+    except httpx.TimeoutException as e:
+        if by_deadline:
+            outcome = "deadline"
+            raise resilience.DeadlineExceeded(f"deadline exceeded during {endpoint}") from e
+        outcome = "timeout"
+        breaker.record_failure()
+        raise
+    except httpx.TransportError:
+        outcome = "transport"
+        breaker.record_failure()
+        raise
+    except Exception:
+        # An HTTP status error keeps the outcome set from its status code
+        outcome = "transport" if outcome == "ok" else outcome
+        raise
+    finally:
+        metrics.upstream_in_flight.dec(endpoint)
+        _observe(endpoint, "get", started, outcome)
+
+
+@dataclass(frozen=True)
+class RawBody:
+    """An upstream response body kept as bytes, for routes that pass it through unchanged"""
+    content: bytes
+    media_type: str
+    digest: str
+    # Compressed variants, filled on first use
+    variants: dict = field(default_factory=dict, repr=False, compare=False, hash=False)
+
+
+async def get_raw(path, params=None):
+    """GET an upstream path without decoding it (raises on HTTP errors)"""
+    response = await request("get", path, params=params)
+    response.raise_for_status()
+    content = response.content
+    return RawBody(
+        content=content,
+        media_type=response.headers.get("content-type", "application/json"),
+        digest=hashlib.sha1(content).hexdigest(),
+    )
+
+
+async def get_json(path, params=None):
+    """GET an upstream path and return the decoded JSON (raises on HTTP errors)"""
+    response = await request("get", path, params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+async def get_json_or_error(path, params=None):
+    """get_json for the dashboard loaders: a failure is returned as {"error": ...} instead of raised"""
+    logger.debug("Request → %s", path)
+    try:
+        return await get_json(path, params=params)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+async def post_json(path, payload=None):
+    """POST to an upstream path and return the decoded JSON (raises on HTTP errors)"""
+    response = await request("post", path, payload=payload)
+    response.raise_for_status()
+    return response.json()
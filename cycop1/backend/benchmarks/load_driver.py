@@ -0,0 +1,171 @@
+"""
+Replays the frontend's polling mix against a running backend and reports
+throughput and latency percentiles per endpoint.
+
+Each simulated screen runs the same timers as the browser:
+
+    every 30s   /api/dashboard (Defcon widgets), /api/threatalerts (map, alert list)
+    every 30s   /api/nodeplot for a viewport of the selected layer (pan/zoom)
+    every 60s   POST /api/mitrestats for the last 7 days
+    every 3s    /api/bkkthreat (Bangkok view when the stream is not connected)
+    once        /api/layers, /api/geo/districts
+
+Screens start at random offsets, like browsers opened at different times.
+Like setInterval, a timer fires whether or not its previous request has
+finished, so a slow backend shows up as latency rather than as fewer
+requests. --speedup divides every interval to compress a long session.
+
+    python benchmarks/load_driver.py --base-url http://127.0.0.1:8000 --screens 20 --duration 60 --speedup 10
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+DASHBOARD_RESOURCES = "defstatus,severities,threatdistributions,threatalerts"
+
+
+def viewport(rng):
+    """A random Leaflet viewport over greater Bangkok: (bbox, zoom)"""
+    zoom = rng.choice([8, 10, 11, 12, 13, 14])
+    span = 360 / 2 ** zoom * 4
+    lon = rng.uniform(100.35, 100.9)
+    lat = rng.uniform(13.55, 14.05)
+    return f"{lon - span:.5f},{lat - span / 2:.5f},{lon + span:.5f},{lat + span / 2:.5f}", zoom
+
+
+def mitre_range():
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=6)
+    end = today + timedelta(days=1) - timedelta(seconds=1)
+    return {"FromDate": start.strftime("%Y-%m-%dT%H:%M:%SZ"), "ToDate": end.strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+
+def polling_mix(layers):
+    """(name, interval seconds or None for once, request builder) per frontend timer"""
+    return [
+        ("dashboard", 30.0, lambda rng: ("GET", "/api/dashboard", {"resources": DASHBOARD_RESOURCES}, None)),
+        ("threatalerts", 30.0, lambda rng: ("GET", "/api/threatalerts", None, None)),
+        ("nodeplot", 30.0, lambda rng: ("GET", "/api/nodeplot", dict(zip(("bbox", "zoom"), viewport(rng)), layer=rng.choice(layers)), None)),
+        ("mitrestats", 60.0, lambda rng: ("POST", "/api/mitrestats", None, mitre_range())),
+        ("bkkthreat", 3.0, lambda rng: ("GET", "/api/bkkthreat", None, None)),
+        ("layers", None, lambda rng: ("GET", "/api/layers", None, None)),
+        ("geo_districts", None, lambda rng: ("GET", "/api/geo/districts", {"zoom": 12}, None)),
+    ]
+
+
+class Recorder:
+    def __init__(self):
+        # name -> [(latency seconds, status or None, bytes)]
+        self.samples = {}
+
+    def add(self, name, seconds, status, size):
+        self.samples.setdefault(name, []).append((seconds, status, size))
+
+
+async def send(client, recorder, name, request):
+    method, path, params, body = request
+    started = time.perf_counter()
+    status = None
+    size = 0
+    try:
+        response = await client.request(method, path, params=params, json=body)
+        size = len(response.content)
+        status = response.status_code
+    except httpx.HTTPError:
+        pass
+    recorder.add(name, time.perf_counter() - started, status, size)
+
+
+async def screen(client, recorder, rng, mix, duration, speedup, tasks):
+    """One browser tab: start every timer at a random phase and run until `duration`"""
+    ends_at = time.monotonic() + duration
+
+    async def timer(name, interval, build):
+        # First load happens on mount, spread over the first few seconds
+        await asyncio.sleep(rng.uniform(0, 3.0 / speedup))
+        while time.monotonic() < ends_at:
+            tasks.add(asyncio.ensure_future(send(client, recorder, name, build(rng))))
+            if interval is None:
+                return
+            await asyncio.sleep(interval / speedup)
+
+    await asyncio.gather(*(timer(name, interval, build) for name, interval, build in mix))
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def summarize(recorder, elapsed):
+    """Per-endpoint and overall count, errors, throughput and p50/p95/p99/max in ms"""
+    def stats(samples):
+        ordered = sorted(seconds for seconds, _, _ in samples)
+        errors = sum(1 for _, status, _ in samples if status is None or status >= 500)
+        ms = lambda value: round(value * 1000, 2) if value is not None else None
+        return {
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+            "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": ms(percentile(ordered, 0.50)),
+            "p95_ms": ms(percentile(ordered, 0.95)),
+            "p99_ms": ms(percentile(ordered, 0.99)),
+            "max_ms": ms(ordered[-1] if ordered else None),
+            "mean_bytes": round(sum(size for _, _, size in samples) / len(samples)) if samples else 0,
+        }
+
+    endpoints = {name: stats(samples) for name, samples in sorted(recorder.samples.items())}
+    everything = [sample for samples in recorder.samples.values() for sample in samples]
+    return {"elapsed_seconds": round(elapsed, 2), "overall": stats(everything), "endpoints": endpoints}
+
+
+async def run_load(base_url, screens=10, duration=60.0, speedup=1.0, seed=1, layers=None, timeout=60.0):
+    """Run the polling mix from `screens` screens for `duration` seconds and summarize it"""
+    rng = random.Random(seed)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=screens * 6, max_keepalive_connections=screens * 6)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        if not layers:
+            response = await client.get("/api/layers")
+            layers = [layer["value"] for layer in response.json()] or ["default"]
+        mix = polling_mix(layers)
+        tasks = set()
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            screen(client, recorder, random.Random(rng.random()), mix, duration, speedup, tasks)
+            for _ in range(screens)
+        ))
+        # Requests fired before the end still count
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return summarize(recorder, elapsed)
+
+
+def add_arguments(parser):
+    parser.add_argument("--screens", type=int, default=10, help="concurrent screens (browser tabs)")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of load")
+    parser.add_argument("--speedup", type=float, default=1.0, help="divide every polling interval by this")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--layers", default="", help="comma separated layer values; read from /api/layers when empty")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    add_arguments(parser)
+    args = parser.parse_args()
+    layers = [layer for layer in args.layers.split(",") if layer]
+    report = asyncio.run(run_load(args.base_url, args.screens, args.duration, args.speedup, args.seed, layers))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
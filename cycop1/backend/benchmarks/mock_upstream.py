@@ -0,0 +1,238 @@
+"""
+Local stand-in for the upstream analytic API, for benchmarks.
+
+Serves every path the backend calls (GetLayers, GetNodes, GetNodesByLayer,
+GetNodesStatus, GetNodeLinks, GetDefConStatus, GetThreatSeverities,
+GetThreatDistributions, GetThreatAlerts, GetMitreStats) from a dataset
+generated from --seed, so two runs with the same options see the same data.
+Latency, a slow tail and error rates are configurable.
+
+    python benchmarks/mock_upstream.py --port 9100 --layers 4 --nodes-per-layer 500 \\
+        --latency-ms 40 --jitter-ms 20 --slow-rate 0.02 --slow-ms 1500 --error-rate 0.01
+
+Point the backend at it with API_PATH=http://127.0.0.1:9100.
+"""
+import argparse
+import asyncio
+import json
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+SEVERITIES = ["critical", "high", "medium", "low"]
+TACTICS = [
+    ("TA0001", "Initial Access"), ("TA0002", "Execution"), ("TA0003", "Persistence"),
+    ("TA0004", "Privilege Escalation"), ("TA0005", "Defense Evasion"), ("TA0006", "Credential Access"),
+    ("TA0007", "Discovery"), ("TA0008", "Lateral Movement"), ("TA0010", "Exfiltration"), ("TA0011", "Command and Control"),
+]
+# Bangkok and surroundings, where most plotted nodes sit
+LAT_RANGE = (13.5, 14.1)
+LON_RANGE = (100.3, 100.95)
+
+
+@dataclass
+class MockConfig:
+    seed: int = 42
+    layers: int = 4
+    nodes_per_layer: int = 500
+    links_per_node: int = 3
+    alerts: int = 500
+    techniques: int = 60
+    latency_ms: float = 40.0
+    jitter_ms: float = 20.0
+    # Fraction of calls that take slow_ms instead (the tail hedging and deadlines deal with)
+    slow_rate: float = 0.0
+    slow_ms: float = 1500.0
+    # Fraction of calls answered with 503
+    error_rate: float = 0.0
+
+
+class Dataset:
+    """Everything the mock serves, generated once from the seed"""
+
+    def __init__(self, config):
+        rng = random.Random(config.seed)
+        self.layers = [{"name": f"Layer {index}", "value": f"layer-{index}"} for index in range(config.layers)]
+
+        self.nodes_by_layer = {}
+        self.status_by_layer = {}
+        self.links = {}
+        for layer in self.layers:
+            nodes = []
+            for index in range(config.nodes_per_layer):
+                nodes.append({
+                    "id": f"{layer['value']}-n{index}",
+                    "name": f"{layer['name']} node {index}",
+                    "latitude": round(rng.uniform(*LAT_RANGE), 6),
+                    "longitude": round(rng.uniform(*LON_RANGE), 6),
+                    "layer": layer["value"],
+                })
+            self.nodes_by_layer[layer["value"]] = nodes
+            self.status_by_layer[layer["value"]] = [
+                {"nodeId": node["id"], "status": json.dumps({"level": rng.choice(SEVERITIES), "up": rng.random() > 0.05})}
+                for node in nodes
+            ]
+            for node in nodes:
+                peers = rng.sample(nodes, min(config.links_per_node, len(nodes)))
+                self.links[node["id"]] = [
+                    {"sourceNode": node["id"], "destinationNode": peer["id"]} for peer in peers if peer is not node
+                ]
+        self.all_nodes = [node for nodes in self.nodes_by_layer.values() for node in nodes]
+
+        now = datetime.now(timezone.utc)
+        self.alerts = []
+        for index in range(config.alerts):
+            created = now - timedelta(seconds=rng.randint(0, 7 * 86400))
+            self.alerts.append({
+                "incidentID": f"INC-{100000 + index}",
+                "name": f"Alert {index}",
+                "serverity": str(rng.randint(0, 100)),
+                "createdDate": created.isoformat(),
+                "latitude": round(rng.uniform(*LAT_RANGE), 6),
+                "longitude": round(rng.uniform(*LON_RANGE), 6),
+            })
+        self.alerts.sort(key=lambda alert: alert["createdDate"], reverse=True)
+
+        counts = {name: rng.randint(5, 500) for name in SEVERITIES}
+        self.defcon = {"level": rng.randint(1, 4), "updatedAt": now.isoformat()}
+        self.severities = [{"name": name.capitalize(), "count": count} for name, count in counts.items()]
+        self.distributions = [{"name": f"Threat type {index}", "count": rng.randint(1, 300)} for index in range(12)]
+
+        self.techniques = []
+        for index in range(config.techniques):
+            tactic_id, tactic_name = TACTICS[index % len(TACTICS)]
+            self.techniques.append((tactic_id, tactic_name, f"T{1000 + index}", f"Technique {index}"))
+        self._rng_seed = config.seed
+
+    def mitre_stats(self, from_date, to_date):
+        """Stable per-range stats: the same FromDate/ToDate always gives the same numbers"""
+        rng = random.Random(f"{self._rng_seed}:{from_date}:{to_date}")
+        rows = []
+        for tactic_id, tactic_name, technique_id, technique_name in self.techniques:
+            quantity = rng.randint(0, 50)
+            if quantity:
+                rows.append({
+                    "tacticId": tactic_id, "tacticName": tactic_name,
+                    "techniqueId": technique_id, "techniqueName": technique_name,
+                    "quantity": quantity, "severityName": rng.choice(SEVERITIES), "lastSeen": to_date,
+                })
+        severity = [{"severityName": name, "quantity": rng.randint(0, 200)} for name in SEVERITIES]
+        return {
+            "totalEvent": sum(row["quantity"] for row in rows),
+            "totalTechnique": len(rows),
+            "tacticSummary": [
+                {"tacticId": tactic_id, "tacticName": tactic_name, "quantity": rng.randint(0, 100)}
+                for tactic_id, tactic_name in TACTICS
+            ],
+            "severitySummary": severity,
+            "calculatedSeveritySummary": severity,
+            "tacticTechniqueSummary": rows,
+        }
+
+
+def create_app(config):
+    app = FastAPI(title="Mock analytic API")
+    data = Dataset(config)
+    rng = random.Random(config.seed + 1)
+    app.state.calls = {}
+
+    @app.middleware("http")
+    async def shape(request, call_next):
+        if "/action/" not in request.url.path:
+            return await call_next(request)
+        action = request.url.path.split("/action/")[1].split("/")[0]
+        app.state.calls[action] = app.state.calls.get(action, 0) + 1
+        if rng.random() < config.slow_rate:
+            delay = config.slow_ms
+        else:
+            delay = max(0.0, rng.gauss(config.latency_ms, config.jitter_ms / 2)) if config.jitter_ms else config.latency_ms
+        await asyncio.sleep(delay / 1000)
+        if rng.random() < config.error_rate:
+            return JSONResponse({"error": "mock upstream error"}, status_code=503)
+        return await call_next(request)
+
+    @app.get("/api/Node/org/{org}/action/GetLayers")
+    async def get_layers(org: str):
+        return data.layers
+
+    @app.post("/api/Node/org/{org}/action/GetNodes")
+    async def get_nodes(org: str, request: Request):
+        body = await request.json() if await request.body() else {}
+        search = (body.get("FullTextSearch") or "").lower()
+        if not search:
+            return data.all_nodes
+        return [node for node in data.all_nodes if search in node["name"].lower()]
+
+    @app.get("/api/Node/org/{org}/action/GetNodesByLayer/{layer}")
+    async def get_nodes_by_layer(org: str, layer: str):
+        return data.nodes_by_layer.get(layer, [])
+
+    @app.get("/api/Node/org/{org}/action/GetNodesStatus/{layer}")
+    async def get_nodes_status(org: str, layer: str):
+        return data.status_by_layer.get(layer, [])
+
+    @app.get("/api/Node/org/{org}/action/GetNodeLinks/{node_id}")
+    async def get_node_links(org: str, node_id: str):
+        return data.links.get(node_id, [])
+
+    @app.get("/api/Analytic/org/{org}/action/GetDefConStatus")
+    async def get_defcon_status(org: str):
+        return data.defcon
+
+    @app.get("/api/Analytic/org/{org}/action/GetThreatSeverities")
+    async def get_threat_severities(org: str):
+        return data.severities
+
+    @app.get("/api/Analytic/org/{org}/action/GetThreatDistributions")
+    async def get_threat_distributions(org: str):
+        return data.distributions
+
+    @app.get("/api/Analytic/org/{org}/action/GetThreatAlerts")
+    async def get_threat_alerts(org: str):
+        return data.alerts
+
+    @app.post("/api/Analytic/org/{org}/action/GetMitreStats")
+    async def get_mitre_stats(org: str, request: Request):
+        body = await request.json()
+        return data.mitre_stats(body.get("FromDate"), body.get("ToDate"))
+
+    @app.get("/mock/stats")
+    async def stats():
+        """Calls received per action, so a benchmark can report upstream amplification"""
+        return {"config": asdict(config), "calls": app.state.calls}
+
+    @app.post("/mock/reset")
+    async def reset():
+        app.state.calls = {}
+        return Response(status_code=204)
+
+    return app
+
+
+def add_arguments(parser, prefix=""):
+    """One option per MockConfig field; `prefix` ("mock-") keeps them apart from other tools' options"""
+    for name, value in asdict(MockConfig()).items():
+        parser.add_argument(f"--{prefix}{name.replace('_', '-')}", dest=f"{prefix.replace('-', '_')}{name}",
+                            type=type(value), default=value)
+
+
+def config_from_args(args, prefix=""):
+    return MockConfig(**{name: getattr(args, f"{prefix.replace('-', '_')}{name}") for name in asdict(MockConfig())})
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+End-to-end benchmark: mock upstream + backend + polling load, with a report
+compared against a stored baseline.
+
+Starts benchmarks/mock_upstream.py and the backend (uvicorn app.main:app,
+pointed at the mock) on free local ports, waits until the backend reports
+ready, replays the frontend polling mix with benchmarks/load_driver.py and
+writes a JSON report to benchmarks/results/. The report has throughput,
+error rate and p50/p95/p99 per endpoint, plus how many upstream calls the
+mock received per backend request.
+
+    python benchmarks/run_benchmark.py --screens 20 --duration 60 --speedup 10
+    python benchmarks/run_benchmark.py --mock-latency-ms 80 --mock-slow-rate 0.02 --mock-error-rate 0.01
+    python benchmarks/run_benchmark.py --save-baseline          # replace benchmarks/baseline.json
+    python benchmarks/run_benchmark.py --max-regression 20      # exit 1 if a p95 got >20% worse
+
+Backend settings can be varied per run through the environment, e.g.
+UPSTREAM_HEDGE_ENABLED=false or SNAPSHOT_REFRESH_ENABLED=false.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import load_driver  # noqa: E402
+import mock_upstream  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+COMPARED = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(url, ready=lambda response: response.status_code == 200, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = httpx.get(url, timeout=2.0)
+            if ready(response):
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_processes(mock_config):
+    mock_port, backend_port = free_port(), free_port()
+    mock_args = [f"--{name.replace('_', '-')}={value}" for name, value in asdict(mock_config).items()]
+    mock = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "mock_upstream.py"), "--port", str(mock_port), *mock_args])
+    env = {
+        **os.environ,
+        "API_PATH": f"http://127.0.0.1:{mock_port}",
+        "ORG_ID": "bench",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "PYTHONPATH": BACKEND_DIR,
+    }
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(backend_port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    return mock, backend, f"http://127.0.0.1:{mock_port}", f"http://127.0.0.1:{backend_port}"
+
+
+def loop_lag(metrics_text):
+    """Mean and worst bucket of the backend's event_loop_lag_seconds, in ms"""
+    buckets, total, count = [], 0.0, 0
+    for line in metrics_text.splitlines():
+        if line.startswith("event_loop_lag_seconds_bucket"):
+            bound = line.split('le="')[1].split('"')[0]
+            buckets.append((float(bound), int(float(line.rsplit(" ", 1)[1]))))
+        elif line.startswith("event_loop_lag_seconds_sum"):
+            total = float(line.rsplit(" ", 1)[1])
+        elif line.startswith("event_loop_lag_seconds_count"):
+            count = int(float(line.rsplit(" ", 1)[1]))
+    # Smallest bucket holding every sample
+    worst = next((bound for bound, cumulative in buckets if cumulative == count), None) if count else None
+    return {
+        "samples": count,
+        "mean_ms": round(total / count * 1000, 2) if count else None,
+        "max_bucket_ms": worst * 1000 if worst is not None and worst != float("inf") else worst,
+    }
+
+
+def compare(report, baseline, max_regression=None):
+    """Print current vs baseline percentiles; returns the endpoints whose p95 regressed past max_regression %"""
+    regressions = []
+    rows = [("endpoint", *(f"{key} base→now" for key in COMPARED), "rps base→now")]
+    current = {"overall": report["load"]["overall"], **report["load"]["endpoints"]}
+    previous = {"overall": baseline["load"]["overall"], **baseline["load"]["endpoints"]}
+    for name, stats in current.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        cells = [name]
+        for key in COMPARED:
+            old, new = before.get(key), stats.get(key)
+            if not old or new is None:
+                cells.append(f"{old} → {new}")
+                continue
+            change = (new - old) / old * 100
+            cells.append(f"{old:.1f} → {new:.1f} ({change:+.0f}%)")
+            if key == "p95_ms" and max_regression is not None and change > max_regression:
+                regressions.append(name)
+        cells.append(f"{before['rps']} → {stats['rps']}")
+        rows.append(tuple(cells))
+    widths = [max(len(str(row[column])) for row in rows) for column in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load_driver.add_arguments(parser)
+    mock_upstream.add_arguments(parser, prefix="mock-")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of load before measuring")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--max-regression", type=float, default=None, help="fail when a p95 is this many %% worse")
+    args = parser.parse_args()
+
+    mock_config = mock_upstream.config_from_args(args, prefix="mock-")
+    layers = [layer for layer in args.layers.split(",") if layer]
+    mock, backend, mock_url, backend_url = start_processes(mock_config)
+    try:
+        wait_until(f"{mock_url}/mock/stats")
+        wait_until(f"{backend_url}/api/health", ready=lambda response: response.json().get("ready"))
+        if args.warmup > 0:
+            asyncio.run(load_driver.run_load(backend_url, args.screens, args.warmup, args.speedup, args.seed, layers))
+        httpx.post(f"{mock_url}/mock/reset")
+        load = asyncio.run(load_driver.run_load(backend_url, args.screens, args.duration, args.speedup, args.seed, layers))
+        upstream_calls = httpx.get(f"{mock_url}/mock/stats").json()["calls"]
+        lag = loop_lag(httpx.get(f"{backend_url}/metrics").text)
+    finally:
+        for process in (backend, mock):
+            process.terminate()
+        for process in (backend, mock):
+            process.wait(timeout=10)
+
+    total_upstream = sum(upstream_calls.values())
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "screens": args.screens,
+            "duration_seconds": args.duration,
+            "speedup": args.speedup,
+            "seed": args.seed,
+            "mock": asdict(mock_config),
+        },
+        "load": load,
+        "upstream": {
+            "calls": dict(sorted(upstream_calls.items())),
+            "calls_per_request": round(total_upstream / load["overall"]["requests"], 3) if load["overall"]["requests"] else None,
+        },
+        # High lag means the backend itself (or a busy machine) delayed requests
+        "event_loop_lag": lag,
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(path, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Report: {path}")
+    print(json.dumps(load["overall"]))
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        if baseline.get("config") != report["config"]:
+            print("Note: baseline was recorded with a different configuration")
+        regressions = compare(report, baseline, args.max_regression)
+    if args.save_baseline:
+        with open(args.baseline, "w") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Baseline saved: {args.baseline}")
+    if regressions:
+        print(f"p95 regressed by more than {args.max_regression}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Startup benchmark: cold import time, lifespan startup time and first-request
+latency, with warm-up off and on.
+
+The upstream analytic API is replaced by an in-process mock that answers
+every call after --latency seconds, so results do not depend on the network.
+
+    cd cycop1/backend
+    python benchmarks/startup_benchmark.py --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DASHBOARD_PATHS = [
+    "/api/defstatus",
+    "/api/severities",
+    "/api/threatdistributions",
+    "/api/threatalerts",
+    "/api/layers",
+    "/api/bkkthreat",
+]
+
+
+def measure_import(repeat):
+    """Seconds to `import app.main` in a fresh interpreter, best of `repeat`"""
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    env = {**os.environ, "PYTHONPATH": BACKEND_DIR, "LOG_LEVEL": "WARNING"}
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                             capture_output=True, text=True, check=True)
+        runs.append(float(out.stdout.strip().splitlines()[-1]))
+    return round(min(runs), 4)
+
+
+def mock_transport(latency):
+    import httpx
+
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json=[])
+
+    return httpx.MockTransport(handler)
+
+
+async def measure_startup(latency):
+    """Run the lifespan against the mock upstream and time the first two reads of each dashboard endpoint"""
+    import httpx
+    from app.main import app
+    from app.services import upstream
+    from app.services.lifecycle import services
+
+    upstream._client = httpx.AsyncClient(transport=mock_transport(latency), base_url="http://upstream")
+
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        startup = time.perf_counter() - started
+        requests = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            for path in DASHBOARD_PATHS:
+                timings = []
+                for _ in range(2):
+                    t = time.perf_counter()
+                    response = await client.get(path)
+                    timings.append(round((time.perf_counter() - t) * 1000, 2))
+                requests[path] = {"status": response.status_code, "first_ms": timings[0], "second_ms": timings[1]}
+        warmup_report = services.status()["warmup"]
+    return {"startup_seconds": round(startup, 4), "warmup": warmup_report, "requests": requests}
+
+
+def run_mode(warmup, args):
+    """Each mode runs in its own interpreter so caches and snapshots start empty"""
+    env = {
+        **os.environ,
+        "PYTHONPATH": BACKEND_DIR,
+        "LOG_LEVEL": "WARNING",
+        "SNAPSHOT_REFRESH_ENABLED": "false",
+        "WARMUP_ENABLED": "true" if warmup else "false",
+        "WARMUP_BUDGET_SECONDS": str(args.budget),
+    }
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--latency", str(args.latency)],
+                         cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="mock upstream latency in seconds")
+    parser.add_argument("--budget", type=float, default=5.0, help="WARMUP_BUDGET_SECONDS")
+    parser.add_argument("--import-repeat", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure_startup(args.latency))))
+        return
+    result = {
+        "upstream_latency_seconds": args.latency,
+        "import_seconds": measure_import(args.import_repeat),
+        "warmup_off": run_mode(False, args),
+        "warmup_on": run_mode(True, args),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+In-process Elasticsearch stand-in for the event sync.
+
+Implements the part of the API ElasticSource uses: opening a point-in-time
+(POST /{index}/_pit), searching it with a range query on the timestamp
+field, sort and search_after (POST /_search), and closing it
+(DELETE /_pit). Plug it into an httpx client with `fake.client()`.
+
+Set `fail_on_search` to the 1-based number of a search request to answer it
+with a 500, to interrupt a sync part way.
+"""
+import json
+from datetime import datetime, timezone
+
+import httpx
+
+
+def epoch_millis(iso):
+    return int(datetime.fromisoformat(iso.replace("Z", "+00:00")).astimezone(timezone.utc).timestamp() * 1000)
+
+
+class FakeElasticsearch:
+    def __init__(self, documents=(), timestamp_field="@timestamp"):
+        # _id -> _source
+        self.documents = {}
+        self.timestamp_field = timestamp_field
+        self.open_pits = set()
+        self.searches = 0
+        self.fail_on_search = None
+        self._pit_counter = 0
+        for document_id, source in documents:
+            self.index(document_id, source)
+
+    def index(self, document_id, source):
+        self.documents[document_id] = source
+
+    def client(self):
+        return httpx.AsyncClient(base_url="http://es.test", transport=httpx.MockTransport(self.handle))
+
+    def handle(self, request):
+        path = request.url.path
+        if request.method == "POST" and path.endswith("/_pit"):
+            self._pit_counter += 1
+            pit_id = f"pit-{self._pit_counter}"
+            self.open_pits.add(pit_id)
+            return httpx.Response(200, json={"id": pit_id})
+        if request.method == "DELETE" and path == "/_pit":
+            self.open_pits.discard(json.loads(request.content)["id"])
+            return httpx.Response(200, json={"succeeded": True, "num_freed": 1})
+        if request.method == "POST" and path == "/_search":
+            self.searches += 1
+            if self.fail_on_search == self.searches:
+                return httpx.Response(500, json={"error": "search_phase_execution_exception"})
+            return httpx.Response(200, json=self.search(json.loads(request.content)))
+        return httpx.Response(404, json={"error": f"no handler for {request.method} {path}"})
+
+    def search(self, body):
+        pit_id = body["pit"]["id"]
+        if pit_id not in self.open_pits:
+            return {"error": "search_context_missing_exception"}
+
+        lower = body["query"].get("range", {}).get(self.timestamp_field, {}).get("gte")
+        # (timestamp millis, _shard_doc tiebreaker) like a single-shard index
+        hits = []
+        for shard_doc, (document_id, source) in enumerate(sorted(self.documents.items())):
+            millis = epoch_millis(source[self.timestamp_field])
+            if lower is not None and millis < lower:
+                continue
+            hits.append({"_id": document_id, "_source": source, "sort": [millis, shard_doc]})
+        hits.sort(key=lambda hit: hit["sort"])
+        if "search_after" in body:
+            hits = [hit for hit in hits if hit["sort"] > list(body["search_after"])]
+        return {"pit_id": pit_id, "hits": {"hits": hits[:body["size"]]}}
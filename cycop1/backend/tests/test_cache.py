@@ -0,0 +1,129 @@
+import asyncio
+
+from app.services import cache
+from app.services.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def counting_loader(values):
+    """Loader returning values in turn, counting its calls"""
+    calls = []
+
+    async def load():
+        calls.append(len(calls))
+        return values[min(len(calls) - 1, len(values) - 1)]
+
+    return load, calls
+
+
+def test_fresh_entry_is_served_without_loading(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    ttl_cache = TTLCache()
+    load, calls = counting_loader(["a"])
+
+    async def run():
+        first = await ttl_cache.get_or_load("k", load, ttl=10)
+        clock.now += 5
+        second = await ttl_cache.get_or_load("k", load, ttl=10)
+        return first, second
+
+    assert asyncio.run(run()) == ("a", "a")
+    assert len(calls) == 1
+    assert ttl_cache.stats()["hits"] == 1
+    assert ttl_cache.stats()["misses"] == 1
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    ttl_cache = TTLCache()
+    load, calls = counting_loader(["old", "new"])
+
+    async def run():
+        await ttl_cache.get_or_load("k", load, ttl=10, stale_ttl=60)
+        clock.now += 20
+        # Both readers get the stale value; only one refresh is started
+        stale = [await ttl_cache.get_or_load("k", load, ttl=10, stale_ttl=60) for _ in range(2)]
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        fresh = await ttl_cache.get_or_load("k", load, ttl=10, stale_ttl=60)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+    assert stale == ["old", "old"]
+    assert fresh == "new"
+    assert len(calls) == 2
+    assert ttl_cache.stats()["stale_hits"] == 2
+    assert ttl_cache.stats()["refreshes"] == 1
+
+
+def test_failed_refresh_keeps_the_stale_value(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    ttl_cache = TTLCache()
+    load, _ = counting_loader(["good", {"error": "upstream down"}])
+
+    async def run():
+        await ttl_cache.get_or_load("k", load, ttl=10, stale_ttl=60)
+        clock.now += 20
+        await ttl_cache.get_or_load("k", load, ttl=10, stale_ttl=60)
+        await asyncio.sleep(0)
+        assert ttl_cache.stats()["refresh_errors"] == 1
+        return await ttl_cache.get_or_load("k", load, ttl=10, stale_ttl=60)
+
+    assert asyncio.run(run()) == "good"
+
+
+def test_expired_entry_is_reloaded_inline(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    ttl_cache = TTLCache()
+    load, calls = counting_loader(["old", "new"])
+
+    async def run():
+        await ttl_cache.get_or_load("k", load, ttl=10, stale_ttl=60)
+        clock.now += 71
+        return await ttl_cache.get_or_load("k", load, ttl=10, stale_ttl=60)
+
+    assert asyncio.run(run()) == "new"
+    assert len(calls) == 2
+
+
+def test_error_payloads_are_not_cached():
+    ttl_cache = TTLCache()
+    load, calls = counting_loader([{"error": "boom"}])
+
+    async def run():
+        await ttl_cache.get_or_load("k", load, ttl=10)
+        await ttl_cache.get_or_load("k", load, ttl=10)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert ttl_cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    ttl_cache = TTLCache(maxsize=2)
+
+    async def value(v):
+        return v
+
+    async def run():
+        await ttl_cache.get_or_load("a", lambda: value(1), ttl=10)
+        await ttl_cache.get_or_load("b", lambda: value(2), ttl=10)
+        # Touch a so b is the oldest
+        await ttl_cache.get_or_load("a", lambda: value(1), ttl=10)
+        await ttl_cache.get_or_load("c", lambda: value(3), ttl=10)
+
+    asyncio.run(run())
+    assert ttl_cache.fetched_at("a") is not None
+    assert ttl_cache.fetched_at("b") is None
+    assert ttl_cache.stats()["evictions"] == 1
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.event_sync import ElasticSource, EventStore, EventSync, SyncConfig, event_row
+from tests.fake_elasticsearch import FakeElasticsearch
+
+START = datetime(2025, 11, 1, tzinfo=timezone.utc)
+
+
+def document(index, minutes=None, severity="high"):
+    moment = START + timedelta(minutes=index if minutes is None else minutes)
+    return f"evt-{index:03d}", {
+        "@timestamp": moment.isoformat().replace("+00:00", "Z"),
+        "event_id": f"evt-{index:03d}",
+        "severity": severity,
+        "mitre_tactics_ids_and_names": ["TA0001 - Initial Access"],
+    }
+
+
+@pytest.fixture
+def sync_setup(tmp_path):
+    # evt-010 shares evt-009's timestamp, right at the first page boundary
+    documents = [document(index, minutes=9 if index == 10 else None) for index in range(25)]
+    fake = FakeElasticsearch(documents)
+    config = SyncConfig(es_url="http://es.test", database_url=f"sqlite:///{tmp_path / 'events.db'}",
+                        page_size=10, batch_size=4, queue_pages=1)
+    store = EventStore(config.database_url)
+    syncer = EventSync(config, store=store, source=ElasticSource(config, client=fake.client()))
+    yield fake, store, syncer
+    store.close()
+
+
+def test_full_sync_pages_through_everything(sync_setup):
+    fake, store, syncer = sync_setup
+    run = asyncio.run(syncer.run_once())
+
+    assert run["status"] == "success"
+    assert (run["pages"], run["fetched"], run["inserted"]) == (3, 25, 25)
+    assert store.count() == 25
+    watermark, total = store.get_watermark()
+    assert watermark == int((START + timedelta(minutes=24)).timestamp() * 1000)
+    assert total == 25
+    assert fake.open_pits == set()
+
+
+def test_failed_run_resumes_from_the_watermark(sync_setup):
+    fake, store, syncer = sync_setup
+    fake.fail_on_search = 2
+
+    async def run():
+        failed = await syncer.run_once()
+        after_failure = store.count(), store.get_watermark()
+        fake.fail_on_search = None
+        resumed = await syncer.run_once()
+        return failed, after_failure, resumed
+
+    failed, (count, (watermark, total)), resumed = asyncio.run(run())
+
+    # The first page was written and committed with its watermark before the failure
+    assert failed["status"] == "error"
+    assert count == 10
+    assert watermark == int((START + timedelta(minutes=9)).timestamp() * 1000)
+    assert total == 10
+    assert fake.open_pits == set()
+
+    # The resumed run starts at the watermark: evt-009 is read again but not counted again
+    assert resumed["status"] == "success"
+    assert resumed["fetched"] == 16
+    assert (resumed["inserted"], resumed["updated"], resumed["unchanged"]) == (15, 0, 1)
+    assert store.count() == 25
+    assert store.get_watermark()[1] == 25
+
+
+def test_changed_events_are_updated_and_counted(sync_setup):
+    _, store, _ = sync_setup
+    document_id, source = document(1)
+    hit = {"_id": document_id, "_source": source, "sort": [int(START.timestamp() * 1000), 0]}
+
+    first = store.upsert([event_row(hit, "t1")], 1)
+    same = store.upsert([event_row(hit, "t2")], 1)
+    hit["_source"] = {**source, "severity": "critical"}
+    changed = store.upsert([event_row(hit, "t3")], 1)
+
+    assert (len(first.inserted), len(first.updated), first.unchanged) == (1, 0, 0)
+    assert (len(same.inserted), len(same.updated), same.unchanged) == (0, 0, 1)
+    assert len(changed.updated) == 1
+    stored, new = changed.updated[0]
+    assert (stored[2], new[2]) == ("high", "critical")
+    assert store.get_watermark()[1] == 2
+
+
+def test_store_is_safe_to_share_between_worker_threads(sync_setup):
+    _, store, _ = sync_setup
+
+    def write(batch):
+        for index in range(batch * 20, batch * 20 + 20):
+            document_id, source = document(index)
+            hit = {"_id": document_id, "_source": source, "sort": [index, 0]}
+            store.upsert([event_row(hit, "t")], index)
+
+    def read():
+        for _ in range(40):
+            store.read_since("", "", 50)
+            store.count()
+
+    async def run():
+        await asyncio.gather(*(asyncio.to_thread(write, batch) for batch in range(4)),
+                             *(asyncio.to_thread(read) for _ in range(4)))
+
+    asyncio.run(run())
+    assert store.count() == 80
+    assert store.get_watermark()[1] == 80
@@ -0,0 +1,154 @@
+import json
+import math
+import random
+
+import pytest
+
+from app.services import geometry
+from app.services.geometry import DistrictGeometry, douglas_peucker, threat_points
+
+
+def square(west, south, size):
+    return [[west, south], [west + size, south], [west + size, south + size], [west, south + size], [west, south]]
+
+
+def feature(code, geometry_type, coordinates):
+    return {
+        "type": "Feature",
+        "properties": {"dcode": code, "dname": f"เขต {code}", "dname_e": f"District {code}"},
+        "geometry": {"type": geometry_type, "coordinates": coordinates},
+    }
+
+
+# 10 is a square with a hole (filled by 13), 11 sits next to it and 12 is
+# two separate squares
+COLLECTION = {
+    "type": "FeatureCollection",
+    "features": [
+        feature("10", "Polygon", [square(100.0, 13.0, 1.0), square(100.4, 13.4, 0.2)]),
+        feature("11", "Polygon", [square(101.0, 13.0, 1.0)]),
+        feature("12", "MultiPolygon", [[square(100.0, 14.5, 0.5)], [square(101.5, 14.5, 0.5)]]),
+        feature("13", "Polygon", [square(100.4, 13.4, 0.2)]),
+    ],
+}
+
+
+@pytest.fixture(scope="module")
+def geo():
+    return DistrictGeometry(COLLECTION)
+
+
+def test_douglas_peucker_keeps_the_ends_and_the_corners():
+    line = [[0, 0], [1, 0.01], [2, -0.01], [3, 0], [3, 1], [3.01, 2], [3, 3]]
+    assert douglas_peucker(line, 0.1) == [[0, 0], [3, 0], [3, 3]]
+    assert douglas_peucker(line, 0) == line
+    assert douglas_peucker(line[:2], 1) == line[:2]
+
+
+def test_douglas_peucker_stays_within_tolerance():
+    rng = random.Random(2)
+    line = [[x / 10, math.sin(x / 7) + rng.uniform(-0.05, 0.05)] for x in range(500)]
+    tolerance = 0.1
+    kept = douglas_peucker(line, tolerance)
+    assert len(kept) < len(line) / 4
+    # Every dropped point is within the tolerance of the simplified segment around it
+    for point in line:
+        segment = next(i for i in range(len(kept) - 1) if kept[i][0] <= point[0] <= kept[i + 1][0])
+        assert geometry._segment_distance(point, kept[segment], kept[segment + 1]) <= tolerance + 1e-9
+
+
+@pytest.mark.parametrize("latitude, longitude, code", [
+    (13.2, 100.2, "10"),
+    (13.5, 100.5, "13"),
+    (13.5, 101.5, "11"),
+    (14.7, 100.2, "12"),
+    (14.7, 101.7, "12"),
+    # Between the two parts of 12
+    (14.7, 101.0, None),
+    (12.0, 100.5, None),
+])
+def test_locate_respects_holes_and_multipolygons(geo, latitude, longitude, code):
+    district = geo.locate(latitude, longitude)
+    assert (district.code if district else None) == code
+
+
+def test_assign_counts_points_per_district(geo):
+    points = [
+        {"id": "a", "latitude": 13.2, "longitude": 100.2, "severity": "high"},
+        {"id": "b", "latitude": 13.3, "longitude": 100.1, "severity": "high"},
+        {"id": "c", "latitude": 13.5, "longitude": 101.5, "severity": None},
+        {"id": "d", "latitude": 0.0, "longitude": 0.0, "severity": "low"},
+    ]
+    assignments, districts, unmatched = geo.assign(points)
+    assert [entry["dcode"] for entry in assignments] == ["10", "10", "11", None]
+    assert districts["10"]["count"] == 2
+    assert districts["10"]["severity_counts"] == {"high": 2}
+    assert districts["11"] == {"dname": "เขต 11", "dname_e": "District 11", "count": 1, "severity_counts": {}}
+    assert unmatched == 1
+
+
+def test_threat_points_read_nodes_and_alerts():
+    nodes = [{"id": "n1", "latitude": 13.2, "longitude": 100.2, "status": "down"}, {"id": "n2"}]
+    alerts = [{"incidentID": "INC-1", "latitude": "13.5", "longitude": "101.5", "serverity": "65"}]
+    assert threat_points(nodes, alerts) == [
+        {"id": "n1", "latitude": 13.2, "longitude": 100.2, "severity": "critical"},
+        {"id": "INC-1", "latitude": 13.5, "longitude": 101.5, "severity": "high"},
+    ]
+
+
+def test_levels_are_picked_by_zoom_and_rendered_once(geo):
+    assert geo.level_for_zoom(None) == geometry.FULL_RESOLUTION_ZOOM
+    assert geo.level_for_zoom(3) == geometry.SIMPLIFY_ZOOMS[0]
+    assert geo.level_for_zoom(13) == 12
+    level = geo.level(13)
+    assert geo.level(12) is level
+    body = json.loads(level.body)
+    assert [feature["properties"]["dcode"] for feature in body["features"]] == ["10", "11", "12", "13"]
+
+
+@pytest.fixture(scope="module")
+def bangkok():
+    if not geometry.DEFAULT_GEOJSON_PATH.exists():
+        pytest.skip("bangkok-districts.geojson is not in this checkout")
+    return DistrictGeometry.load(geometry.DEFAULT_GEOJSON_PATH)
+
+
+def test_grid_lookup_matches_testing_every_district(bangkok):
+    rng = random.Random(11)
+    west, south, east, north = bangkok.bbox
+    located = 0
+    for _ in range(150):
+        x, y = rng.uniform(west, east), rng.uniform(south, north)
+        expected = [district.code for district in bangkok.districts if district.contains(x, y)]
+        found = bangkok.locate(y, x)
+        assert (found.code if found else None) == (expected[0] if expected else None)
+        located += found is not None
+    assert located > 30
+
+
+def test_simplified_levels_are_smaller_and_keep_closed_rings(bangkok):
+    sizes = [len(bangkok.level(zoom).body) for zoom in (*geometry.SIMPLIFY_ZOOMS, None)]
+    assert sizes == sorted(sizes)
+    for feature in json.loads(bangkok.level(10).body)["features"]:
+        for polygon in geometry._polygons(feature["geometry"]):
+            for ring in polygon:
+                assert len(ring) >= 4 and ring[0] == ring[-1]
+
+
+def test_lookup_route_caps_the_batch(geo, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    async def load_geometry():
+        return geo
+
+    monkeypatch.setattr(main, "load_geometry", load_geometry)
+    monkeypatch.setattr(geometry, "MAX_LOOKUP_POINTS", 2)
+    client = TestClient(main.app)
+    point = {"id": "a", "latitude": 13.2, "longitude": 100.2, "severity": "high"}
+
+    body = client.post("/api/geo/districts/lookup", json={"points": [point, {**point, "id": "b"}]}).json()
+    assert body["districts"]["10"]["count"] == 2
+    too_many = client.post("/api/geo/districts/lookup", json={"points": [point] * 3})
+    assert too_many.status_code == 413
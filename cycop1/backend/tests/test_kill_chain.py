@@ -0,0 +1,219 @@
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import kill_chain
+from app.services.event_sync import EventStore, UpsertResult, event_row
+from app.services.get_kill_chain_mock import get_kill_chain_mock_data
+from app.services.kill_chain import PHASE_IDS, TACTIC_TO_PHASE, KillChainEngine, KillChainFeed, generate_events
+
+NOW = datetime(2025, 11, 14, 10, 30, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope="module")
+def events():
+    return list(generate_events(4000, days=40, seed=7, now=NOW))
+
+
+@pytest.fixture(scope="module")
+def engine(events):
+    engine = KillChainEngine(retention_days=90)
+    engine.ingest_many(events)
+    return engine
+
+
+@pytest.fixture(scope="module")
+def multi_tactic_events(events):
+    """The same events, each with one to three tactics, often in one phase"""
+    rng = random.Random(9)
+    tactics = list(TACTIC_TO_PHASE)
+    return [{**event, "tactic": rng.sample(tactics, rng.randint(1, 3))} for event in events]
+
+
+def brute_force(events, day_range, tactic=None, severity=None):
+    """Per-phase counts straight from the raw events, each event once per phase"""
+    end = NOW.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    start = end - timedelta(days=day_range)
+    totals = {phase_id: Counter() for phase_id in PHASE_IDS}
+    sources = {phase_id: Counter() for phase_id in PHASE_IDS}
+    detections = {phase_id: Counter() for phase_id in PHASE_IDS}
+    for event in events:
+        if not start <= event["timestamp"] < end:
+            continue
+        if severity and severity != event["severity"]:
+            continue
+        event_tactics = event["tactic"] if isinstance(event["tactic"], list) else [event["tactic"]]
+        for phase_id in {TACTIC_TO_PHASE[name] for name in event_tactics}:
+            in_phase = [name for name in event_tactics if TACTIC_TO_PHASE[name] == phase_id]
+            if tactic and tactic != phase_id and tactic not in in_phase:
+                continue
+            totals[phase_id]["count"] += 1
+            sources[phase_id][event["source"]] += 1
+            detections[phase_id][(event["source_text"], event["source_type"])] += 1
+    return totals, sources, detections
+
+
+@pytest.mark.parametrize("day_range, tactic, severity", [
+    (1, "all", "all"),
+    (7, "all", "all"),
+    (30, "all", "high"),
+    (14, "initial_access", "all"),
+    (14, "TA0002", "critical"),
+    (40, "actions_objectives", "low"),
+    (365, "all", "all"),
+])
+@pytest.mark.parametrize("multi_tactic", [False, True])
+def test_query_matches_a_brute_force_count(events, engine, multi_tactic_events, day_range, tactic, severity, multi_tactic):
+    if multi_tactic:
+        events = multi_tactic_events
+        engine = KillChainEngine(retention_days=90)
+        engine.ingest_many(events)
+    result = engine.query(day_range=day_range, tactic=tactic, severity=severity, now=NOW)
+    tactic_filter = None if tactic == "all" else kill_chain.normalize_tactic(tactic)
+    totals, sources, detections = brute_force(
+        events, day_range, tactic_filter, None if severity == "all" else severity)
+
+    assert [phase["phase_id"] for phase in result["phases"]] == PHASE_IDS
+    for phase in result["phases"]:
+        phase_id = phase["phase_id"]
+        assert phase["total_detections"] == totals[phase_id]["count"]
+        assert phase["sources"] == dict(sources[phase_id])
+        # Ties may come in any order; the counts must be the top ones
+        top_counts = [entry["count"] for entry in phase["top_detection_sources"]]
+        assert top_counts == [count for _, count in detections[phase_id].most_common(kill_chain.TOP_SOURCES)]
+        for entry in phase["top_detection_sources"]:
+            assert detections[phase_id][(entry["source_text"], entry["source_type"])] == entry["count"]
+    assert result["total_detections"] == sum(total["count"] for total in totals.values())
+
+
+def test_an_event_counts_once_per_phase():
+    engine = KillChainEngine()
+    # Execution and privilege escalation are both exploitation
+    engine.ingest({"timestamp": NOW, "tactic": ["Execution", "Privilege Escalation", "Persistence"], "severity": "high"})
+    phases = {phase["phase_id"]: phase["total_detections"] for phase in engine.query(day_range=1, now=NOW)["phases"]}
+    assert (phases["exploitation"], phases["installation"]) == (1, 1)
+    assert engine.query(day_range=1, now=NOW)["total_detections"] == 2
+    for tactic in ("execution", "TA0004", "exploitation"):
+        assert engine.query(day_range=1, tactic=tactic, now=NOW)["total_detections"] == 1
+
+
+@pytest.mark.parametrize("timestamp", [None, "", "yesterday", "2025-13-01T00:00:00Z"])
+def test_events_without_a_usable_timestamp_are_skipped(timestamp):
+    engine = KillChainEngine()
+    assert not engine.ingest({"timestamp": timestamp, "tactic": "execution", "severity": "high"})
+    assert not engine.retract({"timestamp": timestamp, "tactic": "execution", "severity": "high"})
+    assert engine.stats()["events_skipped"] == 1
+    assert engine.query(day_range=1, now=NOW)["total_detections"] == 0
+
+
+def test_prune_drops_buckets_past_retention(events):
+    engine = KillChainEngine(retention_days=10)
+    engine.ingest_many(events)
+    engine.prune(now=NOW)
+    cutoff = NOW.replace(minute=0, second=0, microsecond=0) - timedelta(days=10)
+    kept = sum(1 for event in events if event["timestamp"] >= cutoff)
+    assert engine.query(day_range=40, now=NOW)["total_detections"] == kept
+    assert kept < len(events)
+
+
+def test_tactic_names_from_synced_documents_are_normalized():
+    assert kill_chain.normalize_tactic("TA0001 - Initial Access") == "initial_access"
+    assert kill_chain.normalize_tactic({"id": "TA0011", "name": "Command and Control"}) == "command_and_control"
+    assert kill_chain.normalize_tactic("Lateral Movement") == "lateral_movement"
+
+
+def synced_row(event_id, minutes_ago, severity, tactics, synced_at="t"):
+    moment = NOW - timedelta(minutes=minutes_ago)
+    hit = {
+        "_id": event_id,
+        "sort": [int(moment.timestamp() * 1000), 0],
+        "_source": {
+            "event_id": event_id,
+            "severity": severity,
+            "crowdstrike_tactics": tactics,
+            "crowdstrike_techniques": ["Phishing"],
+            "crowdstrike_event_name": "Blocked Malicious Attachment",
+        },
+    }
+    return event_row(hit, synced_at)
+
+
+def test_event_from_row_reads_the_synced_document():
+    event = kill_chain.event_from_row(synced_row("e1", 5, "High", ["Initial Access"]))
+    assert event["tactic"] == ["Initial Access"]
+    assert event["severity"] == "High"
+    assert event["source"] == "crowdstrike"
+    assert event["detection_method"] == "Phishing"
+    assert (event["source_text"], event["source_type"]) == ("Blocked Malicious Attachment", "event_name")
+
+
+def test_updated_rows_replace_their_old_counts():
+    engine = KillChainEngine()
+    first = synced_row("e1", 5, "High", ["Initial Access"])
+    engine.apply_upsert(UpsertResult(inserted=[first, synced_row("e2", 5, "Low", ["Execution"])]))
+    changed = synced_row("e1", 5, "Critical", ["Persistence"], synced_at="t2")
+    engine.apply_upsert(UpsertResult(updated=[(first, changed)]))
+
+    result = {phase["phase_id"]: phase for phase in engine.query(day_range=1, now=NOW)["phases"]}
+    assert result["delivery"]["total_detections"] == 0
+    assert result["delivery"]["sources"] == {}
+    assert result["installation"]["total_detections"] == 1
+    assert result["exploitation"]["total_detections"] == 1
+    assert engine.query(day_range=1, severity="critical", now=NOW)["total_detections"] == 1
+
+
+def test_feed_loads_stored_events_inside_the_retention_window(tmp_path):
+    store = EventStore(f"sqlite:///{tmp_path / 'events.db'}")
+    rows = [synced_row(f"e{index}", index * 60, "medium", ["Discovery"]) for index in range(30)]
+    # Older than the 1 day retention below
+    rows.append(synced_row("old", 60 * 24 * 3, "medium", ["Discovery"]))
+    store.upsert(rows, 0)
+
+    engine = KillChainEngine(retention_days=1)
+    feed = KillChainFeed(engine)
+    asyncio.run(feed.load(store, now=NOW))
+    store.close()
+
+    assert feed.loaded_rows == 25
+    assert engine.query(day_range=1, now=NOW)["total_detections"] == 24
+
+
+def test_feed_load_skips_rows_with_bad_timestamps(tmp_path):
+    store = EventStore(f"sqlite:///{tmp_path / 'events.db'}")
+    rows = [synced_row(f"e{index}", index * 60, "medium", ["Discovery"]) for index in range(5)]
+    store.upsert(rows, 0)
+    # Rows written before timestamps were validated, or by another writer
+    connection = store.connect()
+    connection.execute("UPDATE synced_events SET timestamp = 'not a time' WHERE event_id = 'e1'")
+    connection.commit()
+
+    engine = KillChainEngine(retention_days=1)
+    asyncio.run(KillChainFeed(engine).load(store, now=NOW))
+    store.close()
+
+    assert engine.query(day_range=1, now=NOW)["total_detections"] == 4
+    assert engine.stats()["events_skipped"] == 1
+
+
+def test_killchain_route_validates_severity_and_serves_the_fed_engine(monkeypatch):
+    from app import main
+
+    client = TestClient(main.app)
+    response = client.get("/api/killchain", params={"severity": "bogus"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown severity: bogus"
+
+    # Not fed yet: the mock
+    assert client.get("/api/killchain").json()["total_detections"] == get_kill_chain_mock_data()["total_detections"]
+
+    fed = KillChainEngine()
+    fed.ingest_many(generate_events(200, days=3, seed=1))
+    fed.fed_by = "test"
+    monkeypatch.setattr(main, "kill_chain_engine", fed)
+    body = client.get("/api/killchain", params={"dayRange": 7, "severity": "High"}).json()
+    assert body["total_detections"] == fed.query(day_range=7, severity="high")["total_detections"]
+    assert body["methodology"].startswith("Cyber Kill Chain")
@@ -0,0 +1,151 @@
+import asyncio
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import get_mitre_stats as mitre
+from app.services.cache import TTLCache
+
+
+def test_split_days_cuts_a_range_at_utc_midnight():
+    days = mitre.split_days(mitre.parse_date("2025-11-01T08:00:00Z"), mitre.parse_date("2025-11-03T12:00:00Z"))
+    assert [(mitre.format_date(start), mitre.format_date(end)) for start, end in days] == [
+        ("2025-11-01T08:00:00Z", "2025-11-01T23:59:59Z"),
+        ("2025-11-02T00:00:00Z", "2025-11-02T23:59:59Z"),
+        ("2025-11-03T00:00:00Z", "2025-11-03T12:00:00Z"),
+    ]
+
+
+def test_finished_days_never_expire_and_today_is_short_lived():
+    now = datetime(2025, 11, 14, 12, tzinfo=timezone.utc)
+    assert mitre.day_ttl(now - timedelta(days=2), now) == math.inf
+    assert mitre.day_ttl(now, now) == mitre.TODAY_TTL
+
+
+def test_merge_sums_days_and_keeps_worst_severity_and_latest_sighting():
+    day1 = {
+        "totalEvent": 10,
+        "tacticSummary": [{"tacticId": "TA0001", "tacticName": "Initial Access", "quantity": 4, "severityName": "Medium"}],
+        "severitySummary": [{"severityName": "Medium", "quantity": 4}],
+        "calculatedSeveritySummary": [{"severityName": "Medium", "quantity": 4}],
+        "tacticTechniqueSummary": [
+            {"tacticId": "TA0001", "tacticName": "Initial Access", "techniqueId": "T1566", "techniqueName": "Phishing",
+             "quantity": 4, "severityName": "Medium", "lastSeen": "2025-11-01T10:00:00Z"},
+        ],
+    }
+    day2 = {
+        "totalEvent": 5,
+        "tacticSummary": [{"tacticId": "TA0001", "tacticName": "Initial Access", "quantity": 1, "severityName": "Critical"}],
+        "severitySummary": [{"severityName": "Critical", "quantity": 1}],
+        "calculatedSeveritySummary": [],
+        "tacticTechniqueSummary": [
+            {"tacticId": "TA0001", "tacticName": "Initial Access", "techniqueId": "T1566", "techniqueName": "Phishing",
+             "quantity": 1, "severityName": "Critical", "lastSeen": "2025-11-02T09:00:00Z"},
+            {"tacticId": "TA0002", "tacticName": "Execution", "techniqueId": "T1059", "techniqueName": "Scripting",
+             "quantity": 2, "severityName": "Low", "lastSeen": "2025-11-02T08:00:00Z"},
+        ],
+    }
+
+    whole_range = {"calculatedSeveritySummary": [{"severityName": "High", "quantity": 3}]}
+    merged = mitre.merge_mitre_stats([day1, day2], whole_range)
+
+    assert merged["totalEvent"] == 15
+    # Phishing was seen on both days but is one technique
+    assert merged["totalTechnique"] == 2
+    assert merged["tacticSummary"] == [
+        {"tacticId": "TA0001", "tacticName": "Initial Access", "quantity": 5, "severityName": "Critical"},
+    ]
+    assert merged["severitySummary"] == [{"severityName": "Medium", "quantity": 4}, {"severityName": "Critical", "quantity": 1}]
+    # Not summed per day: taken from the whole range
+    assert merged["calculatedSeveritySummary"] == [{"severityName": "High", "quantity": 3}]
+    phishing = merged["tacticTechniqueSummary"][0]
+    assert (phishing["quantity"], phishing["severityName"], phishing["lastSeen"]) == (5, "Critical", "2025-11-02T09:00:00Z")
+    # The day responses are not modified
+    assert day1["tacticTechniqueSummary"][0]["quantity"] == 4
+
+
+@pytest.fixture
+def upstream_days(monkeypatch):
+    """Fake GetMitreStats answering one event per requested day, recording each call"""
+    calls = []
+
+    async def call_api(path, payload):
+        calls.append((payload["FromDate"], payload["ToDate"]))
+        if payload["FromDate"].startswith("2025-11-03"):
+            return {"error": 500, "message": "upstream down"}
+        return {"totalEvent": 1, "tacticSummary": [], "severitySummary": [],
+                "calculatedSeveritySummary": [], "tacticTechniqueSummary": []}
+
+    monkeypatch.setattr(mitre, "call_api", call_api)
+    monkeypatch.setattr(mitre, "day_cache", TTLCache())
+    return calls
+
+
+def test_ranges_share_cached_finished_days(upstream_days):
+    async def run():
+        first = await mitre.get_mitre_stats("2025-11-01T00:00:00Z", "2025-11-02T23:59:59Z")
+        second = await mitre.get_mitre_stats("2025-10-31T00:00:00Z", "2025-11-02T23:59:59Z")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert (first["totalEvent"], second["totalEvent"]) == (2, 3)
+    # Only the added day (and the whole range, for the calculated severities) is fetched for the wider range
+    assert sorted(upstream_days) == [
+        ("2025-10-31T00:00:00Z", "2025-10-31T23:59:59Z"),
+        ("2025-10-31T00:00:00Z", "2025-11-02T23:59:59Z"),
+        ("2025-11-01T00:00:00Z", "2025-11-01T23:59:59Z"),
+        ("2025-11-01T00:00:00Z", "2025-11-02T23:59:59Z"),
+        ("2025-11-02T00:00:00Z", "2025-11-02T23:59:59Z"),
+    ]
+
+
+def test_a_one_day_range_is_fetched_once(upstream_days):
+    asyncio.run(mitre.get_mitre_stats("2025-11-01T00:00:00Z", "2025-11-01T23:59:59Z"))
+    assert upstream_days == [("2025-11-01T00:00:00Z", "2025-11-01T23:59:59Z")]
+
+
+def test_split_and_forwarded_ranges_have_the_same_shape(monkeypatch):
+    """Rows shaped like the mock upstream's: tactic rows carry no severityName or lastSeen"""
+    async def call_api(path, payload):
+        return {
+            "totalEvent": 3,
+            "totalTechnique": 1,
+            "tacticSummary": [{"tacticId": "TA0001", "tacticName": "Initial Access", "quantity": 3}],
+            "severitySummary": [{"severityName": "high", "quantity": 3}],
+            "calculatedSeveritySummary": [{"severityName": "high", "quantity": 3}],
+            "tacticTechniqueSummary": [
+                {"tacticId": "TA0001", "tacticName": "Initial Access", "techniqueId": "T1566", "techniqueName": "Phishing",
+                 "quantity": 3, "severityName": "high", "lastSeen": payload["ToDate"]},
+            ],
+        }
+
+    monkeypatch.setattr(mitre, "call_api", call_api)
+    monkeypatch.setattr(mitre, "day_cache", TTLCache())
+
+    async def run():
+        split = await mitre.get_mitre_stats("2025-11-01T00:00:00Z", "2025-11-03T23:59:59Z")
+        forwarded = await mitre.get_mitre_stats("not a date", "2025-11-03T23:59:59Z")
+        return split, forwarded
+
+    split, forwarded = asyncio.run(run())
+    assert split.keys() == forwarded.keys()
+    for name in ("tacticSummary", "tacticTechniqueSummary", "severitySummary", "calculatedSeveritySummary"):
+        assert [row.keys() for row in split[name]] == [row.keys() for row in forwarded[name]], name
+    assert split["tacticSummary"] == [{"tacticId": "TA0001", "tacticName": "Initial Access", "quantity": 9}]
+
+
+def test_a_failed_day_fails_the_range_and_is_retried(upstream_days):
+    async def run():
+        return [await mitre.get_mitre_stats("2025-11-02T00:00:00Z", "2025-11-03T23:59:59Z") for _ in range(2)]
+
+    results = asyncio.run(run())
+    assert all(result == {"error": 500, "message": "upstream down"} for result in results)
+    # The good day is cached, the failed one is asked for again
+    assert upstream_days.count(("2025-11-02T00:00:00Z", "2025-11-02T23:59:59Z")) == 1
+    assert upstream_days.count(("2025-11-03T00:00:00Z", "2025-11-03T23:59:59Z")) == 2
+
+
+def test_unsplittable_ranges_are_forwarded_as_is(upstream_days):
+    asyncio.run(mitre.get_mitre_stats("not a date", "2025-11-02T00:00:00Z"))
+    assert upstream_days == [("not a date", "2025-11-02T00:00:00Z")]
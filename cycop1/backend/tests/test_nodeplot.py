@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from app.services import get_nodeplot
+from app.services.settings import Settings
+
+
+def link(src, dst):
+    return {"sourceNode": src, "destinationNode": dst}
+
+
+class FakeUpstream:
+    """Stands in for the GetNodesByLayer/GetNodesStatus and GetNodeLinks fetches"""
+
+    def __init__(self, nodes, links):
+        self.nodes = nodes
+        self.links = links
+        self.link_calls = []
+
+    async def fetch_layer_nodes(self, layer):
+        return self.nodes.get(layer, []), [], {}
+
+    async def fetch_node_links(self, node_ids, concurrency=None):
+        self.link_calls.append(sorted(node_ids))
+        return {node_id: self.links.get(node_id, []) for node_id in node_ids}, {}
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    nodes = {"L1": [{"id": "a", "name": "A"}, {"id": "b", "name": "B"}, {"id": "c", "name": "C"}]}
+    links = {"a": [link("a", "b")], "b": [link("b", "a"), link("b", "c")], "c": []}
+    upstream = FakeUpstream(nodes, links)
+    monkeypatch.setattr(get_nodeplot, "fetch_layer_nodes", upstream.fetch_layer_nodes)
+    monkeypatch.setattr(get_nodeplot, "fetch_node_links", upstream.fetch_node_links)
+    monkeypatch.setattr(get_nodeplot, "_layer_states", get_nodeplot.OrderedDict())
+    monkeypatch.setattr(get_nodeplot, "FULL_REFRESH_EVERY", 10)
+    return upstream
+
+
+def test_build_graph_keeps_each_undirected_link_once():
+    adjacency, edges = get_nodeplot.build_graph(
+        {"a": {}, "b": {}, "c": {}},
+        [link("a", "b"), link("b", "a"), link("b", "c"), {"sourceNode": "a"}],
+    )
+    assert edges == [["a", "b"], ["b", "c"]]
+    assert adjacency == {"a": ["b"], "b": ["a", "c"], "c": ["b"]}
+
+
+def test_refresh_fetches_links_only_for_changed_nodes(fake):
+    first = asyncio.run(get_nodeplot.refresh_layer("L1"))
+    assert first["refresh"]["full"] is True
+    assert first["edges"] == [["a", "b"], ["b", "c"]]
+
+    fake.nodes["L1"] = [{"id": "a", "name": "A"}, {"id": "b", "name": "B2"}, {"id": "d", "name": "D"}]
+    fake.links["b"] = [link("b", "a")]
+    fake.links["d"] = [link("d", "a")]
+    second = asyncio.run(get_nodeplot.refresh_layer("L1"))
+
+    assert fake.link_calls[-1] == ["b", "d"]
+    assert second["refresh"] == {"full": False, "added": 1, "modified": 1, "removed": 1, "link_fetches": 2}
+    # a's links are reused, b and d come from the new fetch
+    assert second["edges"] == [["a", "b"], ["a", "d"]]
+
+
+def test_every_nth_refresh_is_full(fake, monkeypatch):
+    monkeypatch.setattr(get_nodeplot, "FULL_REFRESH_EVERY", 2)
+    asyncio.run(get_nodeplot.refresh_layer("L1"))
+    assert asyncio.run(get_nodeplot.refresh_layer("L1"))["refresh"]["full"] is False
+    assert asyncio.run(get_nodeplot.refresh_layer("L1"))["refresh"]["full"] is True
+
+
+def test_layer_states_are_bounded(fake, monkeypatch):
+    monkeypatch.setattr(get_nodeplot, "MAX_LAYER_STATES", 2)
+    for layer in ("L1", "typo-1", "typo-2"):
+        asyncio.run(get_nodeplot.refresh_layer(layer))
+    assert list(get_nodeplot._layer_states) == ["typo-1", "typo-2"]
+
+
+def test_full_refresh_every_must_be_positive():
+    with pytest.raises(ValidationError):
+        Settings(nodeplot_full_refresh_every=0)
+    assert Settings(nodeplot_full_refresh_every=1).nodeplot_full_refresh_every == 1
+
+
+def test_nodeplots_shares_one_cached_body_for_every_layer_order(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+    from app.services.snapshots import SnapshotStore
+
+    store = SnapshotStore()
+    graph = {"nodes": [{"id": "a"}], "edges": []}
+    store.publish("nodeplot", {"A": graph, "B": graph, "C": graph})
+    monkeypatch.setattr(main.snapshots, "store", store)
+    client = TestClient(main.app)
+
+    etags = {client.get("/api/nodeplots", params={"layers": layers}).headers["etag"]
+             for layers in ("A,B", "B,A", "B, A,B", "A,,B")}
+    assert len(etags) == 1
+    assert [key for key in store.get("nodeplot").variants if key[0] == "nodeplots"] == [("nodeplots", ("A", "B"), False)]
@@ -0,0 +1,127 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import org_registry, snapshots
+from app.services.get_bkk_org import get_all_org_status
+from app.services.org_registry import OrgThreatRegistry, UnknownOrgError, derive_status
+from app.services.snapshots import SnapshotStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = SnapshotStore()
+    monkeypatch.setattr(snapshots, "store", store)
+    return store
+
+
+@pytest.fixture
+def registry(store):
+    registry = OrgThreatRegistry()
+    registry.seed(get_all_org_status())
+    return registry
+
+
+def threat(incident_id, score, name="Test threat"):
+    return {"threatName": name, "threatDetail": "281200OCT24", "serverity": str(score),
+            "incidentID": incident_id, "quantity": 1, "percentage": 0}
+
+
+def test_seeded_registry_reproduces_the_hand_written_payload(registry):
+    hand_written = get_all_org_status()
+    status = registry.status()
+    assert [org["id"] for org in status] == [org["id"] for org in hand_written]
+    for org, expected in zip(status, hand_written):
+        # The old payload plus the derived total
+        assert {key: value for key, value in org.items() if key != "total_threats"} == expected
+        assert org["total_threats"] == len(expected["threat_list"])
+
+
+def test_upsert_and_resolve_move_the_counters(registry):
+    before = registry.orgs["rtaf"].status()
+    assert before["status"] == "normal"
+
+    registry.upsert("rtaf", threat("RTAF-100", 91))
+    after = registry.orgs["rtaf"].status()
+    assert after["stats"]["critical"] == before["stats"]["critical"] + 1
+    assert after["status"] == "warning"
+    assert after["threat_list"][0]["incidentID"] == "RTAF-100"
+
+    # Updating a threat moves it between severities, it is not counted twice
+    registry.upsert("rtaf", threat("RTAF-100", 30))
+    updated = registry.orgs["rtaf"].status()
+    assert updated["stats"]["critical"] == before["stats"]["critical"]
+    assert updated["stats"]["low"] == before["stats"]["low"] + 1
+    assert updated["total_threats"] == before["total_threats"] + 1
+
+    assert registry.resolve("rtaf", "RTAF-100")
+    assert not registry.resolve("rtaf", "RTAF-100")
+    assert registry.orgs["rtaf"].status() == before
+
+
+def test_top_threats_are_worst_first_then_newest(registry, monkeypatch):
+    monkeypatch.setattr(org_registry, "TOP_THREATS", 3)
+    registry.register_org("test", "Test org")
+    for incident_id, score in [("a", 95), ("b", 20), ("c", 95), ("d", 70), ("e", 50)]:
+        registry.upsert("test", threat(incident_id, score))
+    assert [entry["incidentID"] for entry in registry.orgs["test"].top()] == ["c", "a", "d"]
+
+
+def test_derive_status():
+    assert derive_status({"critical": 2}) == "critical"
+    assert derive_status({"critical": 1}) == "warning"
+    assert derive_status({"critical": 0}) == "normal"
+
+
+def test_apply_publishes_once_and_rejects_unknown_orgs_up_front(registry, store):
+    first = registry.publish()
+    result = registry.apply([
+        {"action": "upsert", "org": "rta", "threat": threat("RTA-100", 99)},
+        {"action": "resolve", "org": "rta", "incidentID": "RTA-001"},
+    ])
+    assert (result["upserted"], result["resolved"]) == (1, 1)
+    assert result["version"] == first.version + 1
+
+    with pytest.raises(UnknownOrgError):
+        registry.apply([
+            {"action": "upsert", "org": "rta", "threat": threat("RTA-101", 99)},
+            {"action": "upsert", "org": "nope", "threat": threat("X-1", 99)},
+        ])
+    assert "RTA-101" not in registry.orgs["rta"].threats
+    assert store.get("bkkthreat").version == result["version"]
+
+
+def test_ingest_route(registry, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main.org_registry, "registry", registry)
+    monkeypatch.setattr(main.settings, "ingest_token", "s3cret")
+    client = TestClient(main.app, headers={"Authorization": "Bearer s3cret"})
+
+    missing = client.post("/api/bkkthreat/threats", json={"events": [{"org": "nope", "threat": threat("X-1", 99)}]})
+    assert missing.status_code == 404
+    assert missing.json()["detail"] == "Unknown org: nope"
+
+    assert client.post("/api/bkkthreat/threats", json={"events": [{"org": "rta", "threat": {}}]}).status_code == 400
+
+    applied = client.post("/api/bkkthreat/threats", json={"events": [{"org": "rtn", "threat": threat("RTN-100", 95)}]})
+    assert applied.status_code == 200
+    orgs = {org["id"]: org for org in client.get("/api/bkkthreat").json()}
+    assert orgs["rtn"]["threat_list"][0]["incidentID"] == "RTN-100"
+
+
+@pytest.mark.parametrize("path", ["/api/bkkthreat/threats", "/api/scheduler/trigger-sync"])
+def test_write_routes_need_the_ingest_token(registry, monkeypatch, path):
+    from app import main
+
+    monkeypatch.setattr(main.org_registry, "registry", registry)
+    client = TestClient(main.app)
+    body = {"events": [{"org": "rtn", "threat": threat("RTN-100", 95)}]}
+
+    monkeypatch.setattr(main.settings, "ingest_token", "")
+    assert client.post(path, json=body, headers={"Authorization": "Bearer "}).status_code == 503
+
+    monkeypatch.setattr(main.settings, "ingest_token", "s3cret")
+    assert client.post(path, json=body).status_code == 401
+    wrong = client.post(path, json=body, headers={"Authorization": "Bearer nope"})
+    assert wrong.status_code == 401 and wrong.headers["www-authenticate"] == "Bearer"
+    assert "RTN-100" not in registry.orgs["rtn"].threats
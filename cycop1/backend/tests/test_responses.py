@@ -0,0 +1,164 @@
+import gzip
+import hashlib
+
+import pytest
+from starlette.requests import Request
+
+from app.services import responses
+from app.services.responses import compressed_json, conditional_json, etag_matches, make_etag, negotiate_encoding, render_json
+
+# Big enough to be compressed
+LARGE = {"alerts": [{"incidentID": f"INC-{index}", "threatName": "Phishing"} for index in range(200)]}
+
+
+def make_request(**headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_etag_is_the_hash_of_the_rendered_body():
+    response = conditional_json(make_request(), {"level": 3})
+    assert response.status_code == 200
+    assert response.body == b'{"level":3}'
+    assert response.headers["etag"] == make_etag(hashlib.sha1(b'{"level":3}').hexdigest())
+    assert response.headers["cache-control"] == "no-cache"
+
+
+def test_matching_if_none_match_gets_304_without_a_body():
+    etag = conditional_json(make_request(), {"level": 3}).headers["etag"]
+    response = conditional_json(make_request(if_none_match=etag), {"level": 3})
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == etag
+
+    changed = conditional_json(make_request(if_none_match=etag), {"level": 2})
+    assert changed.status_code == 200
+
+
+def test_if_none_match_lists_weak_tags_and_star():
+    etag = make_etag("abc")
+    assert etag_matches(make_request(if_none_match=f'"zzz", W/{etag}'), etag)
+    assert etag_matches(make_request(if_none_match="*"), etag)
+    assert not etag_matches(make_request(if_none_match='"zzz"'), etag)
+    assert not etag_matches(make_request(), etag)
+
+
+def test_precomputed_digest_skips_rendering():
+    # With a digest and a matching tag the payload is never serialized
+    response = conditional_json(make_request(if_none_match='"v7"'), object(), digest="v7")
+    assert response.status_code == 304
+
+
+def test_prerendered_body_is_sent_untouched():
+    body = b'{"raw": true}'
+    response = conditional_json(make_request(), None, body=body, media_type="application/json; charset=utf-8")
+    assert response.body == body
+    assert response.headers["etag"] == make_etag(hashlib.sha1(body).hexdigest())
+    assert response.headers["content-type"] == "application/json; charset=utf-8"
+
+
+def test_render_json_is_compact_utf8():
+    assert render_json({"name": "กองทัพบก", "n": [1, 2]}) == '{"name":"กองทัพบก","n":[1,2]}'.encode("utf-8")
+
+
+def test_api_route_answers_a_revalidation_with_304():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    client = TestClient(app)
+    first = client.get("/api/arrmock")
+    assert first.status_code == 200
+    again = client.get("/api/arrmock", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("gzip, deflate", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("identity", None),
+    ("*", "br"),
+    ("*;q=0.2, gzip;q=0", "br"),
+    ("gzip;q=bogus", None),
+])
+def test_accept_encoding_negotiation(header, expected):
+    request = make_request(accept_encoding=header) if header else make_request()
+    assert negotiate_encoding(request) == expected
+
+
+def test_large_bodies_are_compressed_and_small_ones_are_not():
+    response = conditional_json(make_request(accept_encoding="gzip"), LARGE)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.body) == render_json(LARGE)
+
+    small = conditional_json(make_request(accept_encoding="gzip"), {"level": 3})
+    assert "content-encoding" not in small.headers
+    assert small.body == b'{"level":3}'
+
+
+def test_each_coding_gets_its_own_etag():
+    digest = hashlib.sha1(render_json(LARGE)).hexdigest()
+    etags = {header: conditional_json(make_request(accept_encoding=header), LARGE).headers["etag"]
+             for header in ("identity", "gzip", "br")}
+    assert etags == {"identity": make_etag(digest), "gzip": f'"{digest}-gzip"', "br": f'"{digest}-br"'}
+
+    # A tag only revalidates the body it was sent with
+    assert conditional_json(make_request(accept_encoding="br", if_none_match=etags["br"]), LARGE).status_code == 304
+    stale = conditional_json(make_request(accept_encoding="br", if_none_match=etags["gzip"]), LARGE)
+    assert stale.status_code == 200 and stale.headers["vary"] == "Accept-Encoding"
+
+
+def test_variants_keep_one_compressed_body_per_version(monkeypatch):
+    calls = []
+    compress = responses.compress
+    monkeypatch.setattr(responses, "compress", lambda body, encoding: calls.append(encoding) or compress(body, encoding))
+    variants = {}
+    bodies = [conditional_json(make_request(accept_encoding="br"), LARGE, variants=variants).body for _ in range(3)]
+    conditional_json(make_request(accept_encoding="gzip"), LARGE, variants=variants)
+    assert calls == ["br", "gzip"]
+    assert bodies[0] == bodies[1] == bodies[2]
+
+
+def test_compressed_json_has_no_validators():
+    response = compressed_json(make_request(accept_encoding="gzip"), LARGE)
+    assert "etag" not in response.headers
+    assert response.headers["cache-control"] == "no-store"
+    assert gzip.decompress(response.body) == render_json(LARGE)
+
+
+def test_weak_etag_matches_either_form():
+    response = conditional_json(make_request(), {"level": 3}, digest="v1", weak=True)
+    assert response.headers["etag"] == 'W/"v1"'
+    assert conditional_json(make_request(if_none_match='W/"v1"'), {"level": 3}, digest="v1", weak=True).status_code == 304
+    assert conditional_json(make_request(if_none_match='"v1"'), {"level": 3}, digest="v1", weak=True).status_code == 304
+
+
+def test_dashboard_and_mitrestats_are_compressed(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    async def load_mitre_stats(from_date, to_date):
+        return LARGE
+
+    monkeypatch.setattr(main, "load_mitre_stats", load_mitre_stats)
+    client = TestClient(main.app)
+
+    mitre = client.post("/api/mitrestats", json={"FromDate": "2025-11-01T00:00:00Z", "ToDate": "2025-11-02T00:00:00Z"},
+                        headers={"Accept-Encoding": "gzip"})
+    assert mitre.headers["content-encoding"] == "gzip"
+    assert mitre.json() == LARGE
+
+    dashboard = client.get("/api/dashboard", params={"resources": "arrmock,bkkthreat"}, headers={"Accept-Encoding": "gzip"})
+    assert dashboard.headers["content-encoding"] == "gzip"
+    assert set(dashboard.json()["sections"]) == {"arrmock", "bkkthreat"}
+    # generated_at changes every time, the weak ETag only when a section does
+    again = client.get("/api/dashboard", params={"resources": "arrmock,bkkthreat"},
+                       headers={"Accept-Encoding": "gzip", "If-None-Match": dashboard.headers["etag"]})
+    assert dashboard.headers["etag"].startswith("W/")
+    assert again.status_code == 304
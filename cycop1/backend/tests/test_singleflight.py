@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight, make_key
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("k", load) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 5, "executions": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_different_keys_and_later_calls_run_separately():
+    flight = SingleFlight()
+    calls = []
+
+    async def load(value):
+        calls.append(value)
+        await asyncio.sleep(0)
+        return value
+
+    async def run():
+        first = await asyncio.gather(flight.do("a", lambda: load("a")), flight.do("b", lambda: load("b")))
+        # The first call has finished, so this one is not coalesced
+        second = await flight.do("a", lambda: load("a"))
+        return first, second
+
+    assert asyncio.run(run()) == (["a", "b"], "a")
+    assert calls == ["a", "b", "a"]
+
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats()["executions"] == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("k", load))
+        second = asyncio.ensure_future(flight.do("k", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_make_key_ignores_dict_order():
+    assert make_key("get", "path", {"a": 1, "b": 2}) == make_key("get", "path", {"b": 2, "a": 1})
+    assert make_key("get", "path", {"a": 1}) != make_key("post", "path", {"a": 1})
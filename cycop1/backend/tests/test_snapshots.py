@@ -0,0 +1,82 @@
+import asyncio
+
+from app.services.snapshots import SnapshotRefresher, SnapshotStore
+
+
+def test_publish_makes_a_new_version_only_on_change():
+    store = SnapshotStore()
+    first, changed = store.publish("defstatus", {"level": 3})
+    assert (first.version, changed) == (1, True)
+
+    same, changed = store.publish("defstatus", {"level": 3})
+    assert same is first
+    assert changed is False
+
+    second, changed = store.publish("defstatus", {"level": 2})
+    assert (second.version, changed) == (2, True)
+    assert second.content_hash != first.content_hash
+    assert store.get("defstatus") is second
+    # Readers holding the old snapshot keep their data
+    assert first.data == {"level": 3}
+
+
+def test_body_and_derived_bodies_are_built_once_per_version():
+    store = SnapshotStore()
+    snapshot, _ = store.publish("layers", [{"name": "A", "value": "a"}])
+    builds = []
+
+    def build():
+        builds.append(1)
+        return b"derived"
+
+    assert snapshot.body == b'[{"name":"A","value":"a"}]'
+    assert snapshot.rendered("key", build) == snapshot.rendered("key", build)
+    assert len(builds) == 1
+
+
+def test_refresher_publishes_and_adapts_its_interval():
+    store = SnapshotStore()
+    refresher = SnapshotRefresher(store)
+    values = iter([1, 2, 2])
+
+    async def load():
+        return {"value": next(values)}
+
+    refresher.add_source("s", load, interval=8.0)
+    source = refresher.sources["s"]
+
+    async def run():
+        await refresher.refresh("s")
+        # The first publish does not speed polling up
+        assert source.current_interval == 8.0
+        await refresher.refresh("s")
+        assert source.current_interval == 4.0
+        await refresher.refresh("s")
+        assert source.current_interval == 6.0
+
+    asyncio.run(run())
+    assert store.get("s").version == 2
+    assert source.change_count == 2
+
+
+def test_failed_refresh_keeps_the_last_snapshot():
+    store = SnapshotStore()
+    refresher = SnapshotRefresher(store)
+    results = iter([{"ok": True}, RuntimeError("upstream down")])
+
+    async def load():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    refresher.add_source("s", load, interval=10.0)
+
+    async def run():
+        await refresher.refresh("s")
+        await refresher.refresh("s")
+
+    asyncio.run(run())
+    assert store.get("s").data == {"ok": True}
+    assert refresher.sources["s"].last_error == "upstream down"
+    assert refresher.sources["s"].error_count == 1
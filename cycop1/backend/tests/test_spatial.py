@@ -0,0 +1,147 @@
+import random
+
+import pytest
+
+from app.services import spatial
+from app.services.spatial import SpatialIndex, parse_bbox, status_level, viewport
+
+
+def make_nodes(count, seed=5):
+    rng = random.Random(seed)
+    statuses = ["ok", "down", {"severity": "75"}, {"state": "warning"}, 95, None]
+    return [
+        {
+            "id": f"n{index}",
+            "latitude": rng.uniform(-89, 89),
+            "longitude": rng.uniform(-179.9, 179.9),
+            "status": statuses[index % len(statuses)],
+        }
+        for index in range(count)
+    ]
+
+
+def inside(node, bbox):
+    west, south, east, north = bbox
+    in_lon = west <= node["longitude"] <= east if west <= east else (node["longitude"] >= west or node["longitude"] <= east)
+    return in_lon and south <= node["latitude"] <= north
+
+
+@pytest.fixture(scope="module")
+def nodes():
+    return make_nodes(3000)
+
+
+@pytest.fixture(scope="module")
+def index(nodes):
+    return SpatialIndex(nodes, cell_degrees=2.0)
+
+
+@pytest.mark.parametrize("bbox", [
+    (100.3, 13.5, 100.9, 14.0),
+    (-10, -10, 10, 10),
+    (-180, -90, 180, 90),
+    # Crossing the antimeridian
+    (170, -30, -170, 30),
+    (0, 5, 0.0001, 5),
+])
+def test_query_matches_a_linear_scan(nodes, index, bbox):
+    expected = sorted(node["id"] for node in nodes if inside(node, bbox))
+    assert sorted(node["id"] for node in index.query(bbox)) == expected
+
+
+def test_nodes_without_usable_coordinates_are_counted_as_unplaced():
+    index = SpatialIndex([
+        {"id": "a", "latitude": "13.75", "longitude": "100.5"},
+        {"id": "b", "latitude": None, "longitude": 100},
+        {"id": "c", "latitude": 95, "longitude": 100},
+        {"id": "d"},
+    ])
+    assert (len(index), index.unplaced) == (1, 3)
+    assert [node["id"] for node in index.query((100, 13, 101, 14))] == ["a"]
+
+
+@pytest.mark.parametrize("value", ["1,2,3", "a,b,c,d", "0,10,1,5", "0,nan,1,5"])
+def test_bad_bboxes_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_bbox(value)
+
+
+def test_parse_bbox_reads_leaflet_order():
+    assert parse_bbox("100.3,13.5,100.9,14") == (100.3, 13.5, 100.9, 14.0)
+
+
+@pytest.mark.parametrize("status, level", [
+    ("Critical", "critical"),
+    ("offline", "critical"),
+    ("degraded", "medium"),
+    ({"status": "up"}, "ok"),
+    ({"serverity": "90"}, "critical"),
+    ({"state": ""}, "unknown"),
+    (45, "medium"),
+    ("12", "low"),
+    (True, "unknown"),
+    ("mystery", "unknown"),
+    (None, "unknown"),
+])
+def test_status_level(status, level):
+    assert status_level(status) == level
+
+
+def test_clusters_account_for_every_node_with_the_worst_status(nodes, index):
+    clusters = index.clusters(3)
+    assert sum(cluster["count"] for cluster in clusters) == len(nodes)
+    for cluster in clusters:
+        counts = cluster["status_counts"]
+        assert sum(counts.values()) == cluster["count"]
+        assert cluster["worst_status"] == max(counts, key=spatial.STATUS_LEVELS.index)
+        west, south, east, north = cluster["bounds"]
+        assert west <= cluster["longitude"] <= east and south <= cluster["latitude"] <= north
+    # Built once per zoom level
+    assert index.clusters(3) is clusters
+
+
+def test_viewport_clusters_below_the_cluster_zoom(nodes, index):
+    bbox = (-60, -40, 60, 40)
+    low = viewport(index, {}, bbox, zoom=2)
+    assert low["clustered"]
+    # Single-node clusters come back as plain nodes
+    placed = len(low["nodes"]) + sum(cluster["count"] for cluster in low["clusters"])
+    assert placed == sum(cluster["count"] for cluster in index.clusters_in(bbox, 2))
+
+    high = viewport(index, {}, bbox, zoom=spatial.CLUSTER_BELOW_ZOOM)
+    assert not high["clustered"] and high["clusters"] == []
+    assert len(high["nodes"]) == sum(1 for node in nodes if inside(node, bbox))
+    assert high["total_nodes"] == len(nodes)
+
+
+def test_viewport_edges_touch_a_visible_node():
+    nodes = [
+        {"id": "a", "latitude": 13.7, "longitude": 100.5},
+        {"id": "b", "latitude": 13.8, "longitude": 100.6},
+        {"id": "c", "latitude": 18.8, "longitude": 98.9},
+        {"id": "d", "latitude": 7.9, "longitude": 98.3},
+    ]
+    graph = {"nodes": nodes, "edges": [["a", "b"], ["b", "c"], ["c", "d"]]}
+    result = viewport(SpatialIndex(nodes), graph, (100, 13, 101, 14), edges=True)
+    assert [node["id"] for node in result["nodes"]] == ["a", "b"]
+    assert result["edges"] == [["a", "b"], ["b", "c"]]
+
+
+def test_nodeplot_route_serves_the_viewport_from_the_snapshot(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+    from app.services.snapshots import SnapshotStore
+
+    store = SnapshotStore()
+    nodes = make_nodes(500)
+    store.publish("nodeplot", {"Network": {"nodes": nodes, "edges": []}})
+    monkeypatch.setattr(main.snapshots, "store", store)
+    client = TestClient(main.app)
+
+    assert client.get("/api/nodeplot", params={"layer": "Network", "bbox": "1,2,3"}).status_code == 400
+    bbox = (90, 0, 110, 25)
+    body = client.get("/api/nodeplot", params={"layer": "Network", "bbox": ",".join(map(str, bbox)), "zoom": 12}).json()
+    assert sorted(node["id"] for node in body["nodes"]) == sorted(node["id"] for node in nodes if inside(node, bbox))
+    # The index is kept on the snapshot
+    assert ("spatial", "Network") in store.get("nodeplot").variants
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+from app.services import stream
+from app.services.snapshots import SnapshotStore
+
+
+def parse(message):
+    event, data = message.strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+async def connected():
+    return False
+
+
+def test_json_diff_patches_keys_and_list_items():
+    old = {"level": 3, "gone": True, "items": [{"id": 1, "v": "a"}, {"id": 2, "v": "b"}]}
+    new = {"level": 2, "added": "x", "items": [{"id": 1, "v": "a"}, {"id": 2, "v": "c"}]}
+    assert stream.json_diff(old, new) == [
+        {"op": "remove", "path": "/gone"},
+        {"op": "replace", "path": "/level", "value": 2},
+        {"op": "add", "path": "/added", "value": "x"},
+        {"op": "replace", "path": "/items/1/v", "value": "c"},
+    ]
+    # Lists that change length are replaced whole; keys are escaped as JSON pointers
+    assert stream.json_diff({"a/b": [1]}, {"a/b": [1, 2]}) == [{"op": "replace", "path": "/a~1b", "value": [1, 2]}]
+
+
+def test_snapshot_then_patches(monkeypatch):
+    store = SnapshotStore()
+    monkeypatch.setattr(stream, "store", store)
+    store.publish("defstatus", {"level": 3})
+    store.publish("nodeplot", {"L1": {"nodes": [], "edges": []}})
+
+    async def run():
+        messages = stream.event_stream(["defstatus", "nodeplot:L1"], connected, keepalive=5)
+        first = [parse(await anext(messages)) for _ in range(2)]
+        waiting = asyncio.ensure_future(anext(messages))
+        await asyncio.sleep(0)
+        store.publish("defstatus", {"level": 2})
+        second = parse(await asyncio.wait_for(waiting, 1))
+        await messages.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == [
+        ("snapshot", {"topic": "defstatus", "version": 1, "data": {"level": 3}}),
+        ("snapshot", {"topic": "nodeplot:L1", "version": 1, "data": {"nodes": [], "edges": []}}),
+    ]
+    assert second == ("patch", {"topic": "defstatus", "version": 2,
+                                "patch": [{"op": "replace", "path": "/level", "value": 2}]})
+
+
+def test_publish_while_suspended_at_yield_is_not_lost(monkeypatch):
+    store = SnapshotStore()
+    monkeypatch.setattr(stream, "store", store)
+    store.publish("defstatus", {"level": 3})
+
+    async def run():
+        messages = stream.event_stream(["defstatus"], connected, keepalive=5)
+        await anext(messages)
+        # The generator is suspended at its yield; nobody is waiting on the store yet
+        store.publish("defstatus", {"level": 1})
+        message = parse(await asyncio.wait_for(anext(messages), 1))
+        await messages.aclose()
+        return message
+
+    event, payload = asyncio.run(run())
+    assert event == "patch"
+    assert payload["version"] == 2
+
+
+def test_keepalive_when_nothing_changes(monkeypatch):
+    store = SnapshotStore()
+    monkeypatch.setattr(stream, "store", store)
+    store.publish("defstatus", {"level": 3})
+
+    async def run():
+        messages = stream.event_stream(["defstatus"], connected, keepalive=0.01)
+        await anext(messages)
+        message = await anext(messages)
+        await messages.aclose()
+        return message
+
+    assert asyncio.run(run()) == ": keepalive\n\n"
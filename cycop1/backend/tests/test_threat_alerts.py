@@ -0,0 +1,124 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from app.services import get_threat_alerts as threat_alerts
+from app.services.get_threat_alerts import AlertFilter, AlertStreamDecoder, paginate, parse_time
+
+
+def make_alerts(count):
+    return [
+        {
+            "incidentID": f"INC-{index:03d}",
+            # 95 critical, 70 high, 45 medium, 10 low
+            "serverity": str((95, 70, 45, 10)[index % 4]),
+            "timestamp": f"2025-11-01T{index % 24:02d}:00:00Z",
+            "threatName": f"Threat {index} \"quoted\" [x] {{y}}",
+        }
+        for index in range(count)
+    ]
+
+
+def read_all_pages(alerts, limit, alert_filter=None):
+    pages = []
+    cursor = None
+    while True:
+        page, cursor = paginate(alerts, limit, cursor, alert_filter)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_every_alert_once():
+    alerts = make_alerts(23)
+    pages = read_all_pages(alerts, 5)
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert [alert for page in pages for alert in page] == alerts
+
+
+def test_filtered_pages_only_hold_matching_alerts():
+    alerts = make_alerts(40)
+    alert_filter = AlertFilter(severities=frozenset({"critical", "high"}), since=parse_time("2025-11-01T04:00:00Z"))
+    pages = read_all_pages(alerts, 4, alert_filter)
+    expected = [alert for alert in alerts if alert_filter.matches(alert)]
+    assert [alert for page in pages for alert in page] == expected
+    assert all(threat_alerts.alert_severity(alert) in ("critical", "high") for alert in expected)
+    # No trailing empty page
+    assert pages[-1]
+
+
+def test_cursor_resumes_after_its_alert_when_the_list_moves():
+    alerts = make_alerts(10)
+    page, cursor = paginate(alerts, 3)
+    # Two new alerts arrive at the top before the next page is read
+    moved = make_alerts(12)[10:] + alerts
+    next_page, _ = paginate(moved, 3, cursor)
+    assert next_page == alerts[3:6]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", threat_alerts.encode_cursor(None, -2), threat_alerts.encode_cursor(None, "x")])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        paginate(make_alerts(3), 2, cursor)
+
+
+def chunked(text, sizes):
+    position = 0
+    for size in sizes:
+        yield text[position:position + size]
+        position += size
+    yield text[position:]
+
+
+def decode(chunks):
+    decoder = AlertStreamDecoder()
+    alerts = []
+    for chunk in chunks:
+        alerts.extend(decoder.feed(chunk))
+    decoder.close()
+    return alerts, decoder.done
+
+
+@pytest.mark.parametrize("payload", [
+    make_alerts(6),
+    {"total": 6, "meta": {"page": [1, 2]}, "alerts": make_alerts(6), "after": 1.5},
+    [],
+])
+def test_decoder_handles_every_two_way_split(payload):
+    text = json.dumps(payload, indent=1)
+    expected = threat_alerts.alerts_from_payload(payload)
+    for split in range(len(text) + 1):
+        alerts, done = decode([text[:split], text[split:]])
+        assert alerts == expected, split
+        assert done
+
+
+def test_decoder_handles_random_chunking():
+    rng = random.Random(3)
+    payload = {"alerts": make_alerts(30) + [{"incidentID": 7, "score": 12.5e3, "tags": None}]}
+    text = json.dumps(payload, ensure_ascii=False)
+    for _ in range(50):
+        sizes = [rng.randint(1, 40) for _ in range(len(text) // 10)]
+        alerts, _ = decode(chunked(text, sizes))
+        assert alerts == payload["alerts"]
+
+
+def test_decoder_reports_a_truncated_payload():
+    decoder = AlertStreamDecoder()
+    decoder.feed(json.dumps(make_alerts(3))[:-20])
+    with pytest.raises(ValueError):
+        decoder.close()
+
+
+def test_ndjson_lines_follow_the_filter_and_limit():
+    alerts = make_alerts(20)
+    alert_filter = AlertFilter(severities=frozenset({"critical"}))
+
+    async def run():
+        return [line async for line in threat_alerts.alerts_ndjson(alerts, alert_filter, limit=3)]
+
+    lines = asyncio.run(run())
+    assert [json.loads(line)["incidentID"] for line in lines] == ["INC-000", "INC-004", "INC-008"]
+    assert all(line.endswith("\n") for line in lines)
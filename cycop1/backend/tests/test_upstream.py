@@ -0,0 +1,278 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import resilience, upstream
+from app.services.resilience import CircuitBreaker, HedgeBudget, LastGood, LatencyTracker
+from app.services.singleflight import SingleFlight
+
+PATH = "api/Analytic/org/test/action/GetDefConStatus"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def fresh_state(monkeypatch):
+    """Empty breakers, latency samples, last good responses and flights"""
+    monkeypatch.setattr(resilience, "breakers", {})
+    monkeypatch.setattr(resilience, "latencies", LatencyTracker())
+    monkeypatch.setattr(resilience, "hedge_budget", HedgeBudget())
+    monkeypatch.setattr(resilience, "last_good", LastGood())
+    monkeypatch.setattr(upstream, "upstream_flight", SingleFlight())
+
+
+class SlowUpstream:
+    """Answers after `delay`, or raises ReadTimeout if the request's own timeout is shorter"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.timeouts = []
+
+    async def handle(self, request):
+        timeout = request.extensions["timeout"]["read"]
+        self.timeouts.append(timeout)
+        if timeout is not None and timeout < self.delay:
+            await asyncio.sleep(timeout)
+            raise httpx.ReadTimeout("read timed out", request=request)
+        await asyncio.sleep(self.delay)
+        return httpx.Response(200, json={"level": 3})
+
+
+def use_upstream(monkeypatch, fake):
+    client = httpx.AsyncClient(base_url="http://upstream.test", transport=httpx.MockTransport(fake.handle))
+    monkeypatch.setattr(upstream, "get_client", lambda: client)
+
+
+def test_a_late_joiner_is_not_bound_by_the_first_callers_deadline(fresh_state, monkeypatch):
+    fake = SlowUpstream(delay=0.2)
+    use_upstream(monkeypatch, fake)
+
+    async def caller(budget, start_after):
+        await asyncio.sleep(start_after)
+        with resilience.deadline(budget):
+            return await upstream.request("get", PATH)
+
+    async def run():
+        return await asyncio.gather(caller(0.05, 0), caller(2.0, 0.01), return_exceptions=True)
+
+    first, late = asyncio.run(run())
+    assert isinstance(first, resilience.DeadlineExceeded)
+    assert late.status_code == 200
+    # One upstream request, sent with the endpoint timeout
+    assert fake.timeouts == [upstream.config.timeout_for(PATH)]
+    assert resilience.breaker_for("GetDefConStatus").state == "closed"
+
+
+def test_a_caller_still_waits_only_until_its_own_deadline(fresh_state, monkeypatch):
+    use_upstream(monkeypatch, SlowUpstream(delay=0.3))
+
+    async def run():
+        with resilience.deadline(0.05):
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            with pytest.raises(resilience.DeadlineExceeded):
+                await upstream.request("get", PATH)
+            return loop.time() - started
+
+    assert asyncio.run(run()) < 0.2
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_after_the_reset(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience, "time", clock)
+    breaker = CircuitBreaker("GetDefConStatus", failure_threshold=3, reset_seconds=30)
+
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+    clock.now += 30
+    # One probe goes through, the rest keep failing fast
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()
+
+    # A failed probe reopens at once
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.open_count == 2
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.status() == {"state": "closed", "failures": 0, "open_count": 2, "rejected": 2}
+
+
+def test_a_lost_probe_does_not_keep_the_circuit_half_open(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience, "time", clock)
+    breaker = CircuitBreaker("GetDefConStatus", failure_threshold=1, reset_seconds=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    # The probe was cancelled and never reported back
+    clock.now += 10
+    assert breaker.allow()
+
+
+def test_open_circuit_serves_the_last_good_response(fresh_state, monkeypatch):
+    calls = []
+
+    async def send(method, path, payload=None, params=None):
+        calls.append(path)
+        if len(calls) == 1:
+            return httpx.Response(200, json={"level": 3})
+        raise httpx.ConnectError("refused")
+
+    monkeypatch.setattr(upstream, "_send", send)
+    monkeypatch.setattr(resilience, "HEDGE_ENABLED", False)
+    breaker = resilience.breaker_for("GetDefConStatus")
+    breaker.failure_threshold = 2
+
+    async def run():
+        return [await upstream.request("get", PATH) for _ in range(4)]
+
+    responses = asyncio.run(run())
+    assert all(response.json() == {"level": 3} for response in responses)
+    # The fourth call failed fast without reaching the upstream
+    assert len(calls) == 3
+    assert breaker.state == "open" and breaker.rejected == 1
+
+
+def scripted_send(script):
+    """A fake _send taking (delay, response or exception) per call, in order"""
+    calls = []
+
+    async def send(method, path, payload=None, params=None):
+        delay, outcome = script[len(calls)]
+        calls.append(path)
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(200, json={"from": outcome})
+
+    return send, calls
+
+
+@pytest.fixture
+def hedging(fresh_state, monkeypatch):
+    monkeypatch.setattr(resilience, "hedge_delay", lambda endpoint: 0.02)
+    budget = HedgeBudget(ratio=1.0)
+    budget.on_request("GetDefConStatus")
+    monkeypatch.setattr(resilience, "hedge_budget", budget)
+    return budget
+
+
+def test_fast_primary_is_not_hedged(hedging, monkeypatch):
+    send, calls = scripted_send([(0, "primary")])
+    monkeypatch.setattr(upstream, "_send", send)
+    assert asyncio.run(upstream._hedged_get(PATH)).json() == {"from": "primary"}
+    assert len(calls) == 1
+
+
+def test_slow_primary_is_hedged_and_the_backup_wins(hedging, monkeypatch):
+    send, calls = scripted_send([(0.5, "primary"), (0, "backup")])
+    monkeypatch.setattr(upstream, "_send", send)
+    won = resilience.hedges._values.get(("GetDefConStatus", "won"), 0)
+    assert asyncio.run(upstream._hedged_get(PATH)).json() == {"from": "backup"}
+    assert len(calls) == 2
+    assert resilience.hedges._values.get(("GetDefConStatus", "won"), 0) == won + 1
+
+
+def test_failed_backup_leaves_the_primary_to_answer(hedging, monkeypatch):
+    send, _ = scripted_send([(0.05, "primary"), (0, httpx.ConnectError("refused"))])
+    monkeypatch.setattr(upstream, "_send", send)
+    assert asyncio.run(upstream._hedged_get(PATH)).json() == {"from": "primary"}
+
+
+def test_both_failing_reports_the_primary_error(hedging, monkeypatch):
+    send, _ = scripted_send([(0.05, httpx.ReadTimeout("primary")), (0, httpx.ConnectError("backup"))])
+    monkeypatch.setattr(upstream, "_send", send)
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(upstream._hedged_get(PATH))
+
+
+def test_no_hedge_without_budget(hedging, monkeypatch):
+    hedging.try_spend("GetDefConStatus")
+    send, calls = scripted_send([(0.05, "primary"), (0, "backup")])
+    monkeypatch.setattr(upstream, "_send", send)
+    assert asyncio.run(upstream._hedged_get(PATH)).json() == {"from": "primary"}
+    assert len(calls) == 1
+
+
+def test_hedge_budget_refills_by_ratio():
+    budget = HedgeBudget(ratio=0.25, max_tokens=2)
+    for _ in range(3):
+        budget.on_request("e")
+    assert not budget.try_spend("e")
+    budget.on_request("e")
+    assert budget.try_spend("e")
+    for _ in range(100):
+        budget.on_request("e")
+    assert [budget.try_spend("e") for _ in range(3)] == [True, True, False]
+
+
+def test_latency_quantile_needs_enough_samples(monkeypatch):
+    monkeypatch.setattr(resilience, "HEDGE_MIN_SAMPLES", 10)
+    tracker = LatencyTracker(quantile=0.9)
+    for sample in range(9):
+        tracker.observe("e", sample / 100)
+    assert tracker.value("e") is None
+    tracker.observe("e", 0.09)
+    assert tracker.value("e") == pytest.approx(0.09)
+
+
+def test_get_json_or_error_reports_failures_as_a_payload(fresh_state, monkeypatch):
+    async def send(method, path, payload=None, params=None):
+        if path.endswith("GetDefConStatus"):
+            return httpx.Response(200, json={"level": 3}, request=httpx.Request(method, f"http://upstream.test/{path}"))
+        raise httpx.ConnectError("refused")
+
+    monkeypatch.setattr(upstream, "_send", send)
+    monkeypatch.setattr(resilience, "HEDGE_ENABLED", False)
+
+    async def run():
+        return (await upstream.get_json_or_error(upstream.analytic_path("GetDefConStatus")),
+                await upstream.get_json_or_error(upstream.analytic_path("GetThreatSeverities")))
+
+    good, failed = asyncio.run(run())
+    assert good == {"level": 3}
+    assert failed == {"error": "refused"}
+
+
+def test_streams_go_through_the_breaker_and_the_deadline(fresh_state, monkeypatch):
+    statuses = []
+
+    async def handle(request):
+        statuses.append(503)
+        return httpx.Response(503, text="down")
+
+    client = httpx.AsyncClient(base_url="http://upstream.test", transport=httpx.MockTransport(handle))
+    monkeypatch.setattr(upstream, "get_client", lambda: client)
+    breaker = resilience.breaker_for("GetDefConStatus")
+    breaker.failure_threshold = 2
+
+    async def read():
+        return [chunk async for chunk in upstream.iter_text(PATH)]
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises((httpx.HTTPStatusError, resilience.CircuitOpenError)):
+                await read()
+        with resilience.deadline(0):
+            with pytest.raises(resilience.DeadlineExceeded):
+                await read()
+
+    asyncio.run(run())
+    # The third stream failed fast on the open circuit
+    assert len(statuses) == 2
+    assert breaker.state == "open" and breaker.rejected == 1
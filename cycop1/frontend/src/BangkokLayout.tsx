@@ -1,5 +1,5 @@
 // src/BangkokLayout.tsx
-import { useState, useEffect } from "react";
+import { useState, useEffect, useCallback } from "react";
 import type L from "leaflet";
 
 import DefconBangkok from "./components/bangkoks/DefconBangkok";
@@ -13,6 +13,7 @@ import OverlayListBangkok from "./components/bangkoks/OverLaylistBangkok";
 // Helper และ Types
 import { mapScoreToSeverity } from "./components/mitreCard/mitreData";
 import { type AlertBase } from "./types/defensive";
+import { useDashboardStream } from "./hooks/useDashboardStream";
 
 import "./index.css";
 
@@ -65,6 +66,29 @@ const BangkokLayout = () => {
   // ✅ (ใหม่) Incident ที่ต้องการให้ Map ซูมไปหา
   const [focusIncidentId, setFocusIncidentId] = useState<string | null>(null);
 
+  // ✅ รับข้อมูล 4 เหล่าทัพแบบ push จาก /api/stream (ส่งมาเฉพาะตอนข้อมูลเปลี่ยน)
+  const { data: streamData, connected: streamConnected } = useDashboardStream([
+    "bkkthreat",
+  ]);
+
+  // --- B. (ใหม่) Logic ดึงข้อมูล 4 เหล่าทัพจาก Python ---
+  const fetchOrgData = useCallback(async () => {
+    try {
+      // ยิงไปที่ API Python
+      const response = await fetch("/api/bkkthreat");
+      if (!response.ok) throw new Error("Failed to fetch python api");
+      const data: OrgStatusApi[] = await response.json();
+      setOrgStatuses(data);
+    } catch (error) {
+      console.error("Error fetching Python API:", error);
+    }
+  }, []);
+
+  useEffect(() => {
+    const streamed = streamData["bkkthreat"];
+    if (Array.isArray(streamed)) setOrgStatuses(streamed as OrgStatusApi[]);
+  }, [streamData]);
+
   useEffect(() => {
     const initData = async () => {
       try {
@@ -130,25 +154,16 @@ const BangkokLayout = () => {
       }
     };
 
-    // --- B. (ใหม่) Logic ดึงข้อมูล 4 เหล่าทัพจาก Python ---
-    const fetchOrgData = async () => {
-      try {
-        // ยิงไปที่ API Python
-        const response = await fetch("/api/bkkthreat");
-        if (!response.ok) throw new Error("Failed to fetch python api");
-        const data: OrgStatusApi[] = await response.json();
-        setOrgStatuses(data);
-      } catch (error) {
-        console.error("Error fetching Python API:", error);
-      }
-    };
-
     initData();
     fetchOrgData();
+  }, [fetchOrgData]);
 
+  // Fallback: poll ทุก 3 วินาทีเฉพาะตอนที่ stream ยังเชื่อมต่อไม่ได้
+  useEffect(() => {
+    if (streamConnected) return;
     const interval = setInterval(fetchOrgData, 3000);
     return () => clearInterval(interval);
-  }, []);
+  }, [streamConnected, fetchOrgData]);
 
   // ✅ Helper Function: แปลงข้อมูล API เป็น Props ของการ์ด
   const getOrgDataProps = (targetId: string) => {
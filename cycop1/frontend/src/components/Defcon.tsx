@@ -140,22 +140,20 @@ const DevConDashboard = () => {
     setLoading(true);
     setError(null);
     try {
-      const [defconRes, severitiesRes, distributionsRes, alertsRes] =
-        await Promise.all([
-          fetch(`/api/defstatus`),
-          fetch(`/api/severities`),
-          fetch(`/api/threatdistributions`),
-          fetch(`/api/threatalerts`),
-        ]);
-
-      if (!defconRes.ok || !severitiesRes.ok || !distributionsRes.ok || !alertsRes.ok) {
+      // ดึงทั้ง 4 ส่วนใน request เดียวผ่าน /api/dashboard (backend fetch พร้อมกัน)
+      const dashboardRes = await fetch(
+        `/api/dashboard?resources=defstatus,severities,threatdistributions,threatalerts`
+      );
+
+      if (!dashboardRes.ok) {
         throw new Error("Failed to fetch data from one or more APIs");
       }
 
-      const defconData = await defconRes.json();
-      const severitiesData = await severitiesRes.json();
-      const distributionsData = await distributionsRes.json();
-      const alertsData = await alertsRes.json();
+      const { sections } = await dashboardRes.json();
+      const defconData = sections.defstatus?.data ?? {};
+      const severitiesData = sections.severities?.data ?? [];
+      const distributionsData = sections.threatdistributions?.data ?? [];
+      const alertsData = sections.threatalerts?.data ?? [];
 
       setDefconLevel(defconData.level || defconData.defconLevel || 1);
 
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useRef } from "react";
+import React, { useState, useEffect, useRef, useCallback } from "react";
 import {
   MapContainer,
   TileLayer,
@@ -47,6 +47,29 @@ const MapBoundsTracker = ({
   return null;
 };
 
+// ส่ง bbox + zoom ไปให้ backend คืนเฉพาะ node ที่มองเห็น (หรือ cluster เมื่อซูมออก)
+interface Viewport {
+  bbox: string;
+  zoom: number;
+}
+
+const ViewportTracker = ({
+  onViewportChange,
+}: {
+  onViewportChange: (viewport: Viewport) => void;
+}) => {
+  const map = useMapEvents({
+    moveend: () =>
+      onViewportChange({ bbox: map.getBounds().toBBoxString(), zoom: map.getZoom() }),
+  });
+
+  useEffect(() => {
+    onViewportChange({ bbox: map.getBounds().toBBoxString(), zoom: map.getZoom() });
+  }, [map, onViewportChange]);
+
+  return null;
+};
+
 interface MapViewProps {
   onBoundsChange?: (bounds: L.LatLngBounds) => void;
   selectedLayer: string | null; // layer ที่เลือกจาก OverlayList
@@ -63,6 +86,24 @@ interface NodeData {
   status: Record<string, any>;
 }
 
+interface NodeCluster {
+  id: string;
+  latitude: number;
+  longitude: number;
+  count: number;
+  worst_status: string;
+  status_counts: Record<string, number>;
+}
+
+const clusterColors: Record<string, string> = {
+  critical: "#ef4444",
+  high: "#f97316",
+  medium: "#eab308",
+  low: "#3b82f6",
+  ok: "#10b981",
+  unknown: "#6b7280",
+};
+
 type LatLngTuple = [number, number];
 
 // ===============================
@@ -172,25 +213,41 @@ function createBezierCurve(
 
 const MapView: React.FC<MapViewProps> = ({ onBoundsChange, selectedLayer }) => {
   const [nodeData, setNodeData] = useState<NodeData[]>([]);
+  const [clusters, setClusters] = useState<NodeCluster[]>([]);
+  const [totalNodes, setTotalNodes] = useState(0);
+  const [viewport, setViewport] = useState<Viewport | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
+  const handleViewportChange = useCallback((next: Viewport) => setViewport(next), []);
+
+  // แสดง loading เฉพาะตอนเปลี่ยน layer ไม่ใช่ทุกครั้งที่เลื่อนแผนที่
   useEffect(() => {
-    if (!selectedLayer) return;
+    setLoading(true);
+  }, [selectedLayer]);
+
+  useEffect(() => {
+    if (!selectedLayer || !viewport) return;
+    const controller = new AbortController();
 
     const loadNodes = async () => {
       try {
-        setLoading(true);
-        const response = await fetch(
-          `/api/nodeplot?layer=${encodeURIComponent(selectedLayer)}`
-        );
+        const params = new URLSearchParams({
+          layer: selectedLayer,
+          bbox: viewport.bbox,
+          zoom: String(viewport.zoom),
+        });
+        const response = await fetch(`/api/nodeplot?${params}`, {
+          signal: controller.signal,
+        });
         if (!response.ok)
           throw new Error(`HTTP error! status: ${response.status}`);
 
         const data = await response.json();
-        console.log("Loaded NodePlot:", data);
 
-        const formattedData: NodeData[] = data.map((node: any) => ({
+        setClusters(data.clusters || []);
+        setTotalNodes(data.total_nodes || 0);
+        const formattedData: NodeData[] = data.nodes.map((node: any) => ({
           id: node.id,
           name: node.name,
           latitude: node.latitude,
@@ -204,6 +261,7 @@ const MapView: React.FC<MapViewProps> = ({ onBoundsChange, selectedLayer }) => {
         setNodeData(formattedData);
         setError(null);
       } catch (err) {
+        if (err instanceof Error && err.name === "AbortError") return;
         console.error("Failed to load nodeplot:", err);
         setError(
           err instanceof Error ? err.message : "Failed to load nodeplot"
@@ -214,7 +272,8 @@ const MapView: React.FC<MapViewProps> = ({ onBoundsChange, selectedLayer }) => {
     };
 
     loadNodes();
-  }, [selectedLayer]);
+    return () => controller.abort();
+  }, [selectedLayer, viewport]);
 
   const getNodeIcon = (node: NodeData) => {
     switch (node.type.toLowerCase()) {
@@ -276,6 +335,7 @@ const MapView: React.FC<MapViewProps> = ({ onBoundsChange, selectedLayer }) => {
       <TileLayer url="https://server.arcgisonline.com/ArcGIS/rest/services/Reference/World_Boundaries_and_Places/MapServer/tile/{z}/{y}/{x}" />
 
       {onBoundsChange && <MapBoundsTracker onBoundsChange={onBoundsChange} />}
+      <ViewportTracker onViewportChange={handleViewportChange} />
 
       {loading && (
         <div className="absolute top-4 right-4 bg-slate-800 text-white px-4 py-2 rounded-lg z-[1000] shadow-lg">
@@ -294,7 +354,9 @@ const MapView: React.FC<MapViewProps> = ({ onBoundsChange, selectedLayer }) => {
 
       {!loading && !error && (
         <div className="absolute top-4 left-4 bg-slate-800 text-white px-3 py-1.5 rounded-lg z-[1000] shadow-lg text-sm">
-          <strong>{nodeData.length}</strong> nodes loaded
+          <strong>{nodeData.length}</strong> nodes
+          {clusters.length > 0 && <> + <strong>{clusters.length}</strong> clusters</>}
+          {" "}of {totalNodes}
         </div>
       )}
 
@@ -350,6 +412,36 @@ const MapView: React.FC<MapViewProps> = ({ onBoundsChange, selectedLayer }) => {
         })
       )}
 
+      {/* =========================
+          RENDER CLUSTERS (ซูมออก)
+         ========================= */}
+      {clusters.map((cluster) => (
+        <CircleMarker
+          key={cluster.id}
+          center={[cluster.latitude, cluster.longitude]}
+          radius={Math.min(30, 8 + Math.log2(cluster.count) * 3)}
+          pathOptions={{
+            color: clusterColors[cluster.worst_status] || clusterColors.unknown,
+            fillColor: clusterColors[cluster.worst_status] || clusterColors.unknown,
+            fillOpacity: 0.5,
+            weight: 2,
+          }}
+        >
+          <Popup>
+            <div className="text-sm space-y-1">
+              <div className="font-bold text-base border-b pb-1 mb-1">
+                {cluster.count} nodes
+              </div>
+              {Object.entries(cluster.status_counts).map(([status, count]) => (
+                <div key={status}>
+                  <strong>{status}:</strong> {count}
+                </div>
+              ))}
+            </div>
+          </Popup>
+        </CircleMarker>
+      ))}
+
       {/* =========================
           RENDER NODES
          ========================= */}
@@ -1,22 +1,49 @@
-import { useState, useEffect, useRef } from "react";
-import { fetchAlertSummary, type AlertSummary, fetchLatestAlert, type RtarfAverageSeverityPayload, fetchRtarfAverageSummary, type RtarfSeverityStatistics, fetchRtarfSeverityStatistics } from "../services/defensiveService";
+import { useState, useEffect } from "react";
+import { streamThreatAlerts, type ThreatAlertItem } from "../services/defensiveService";
+import { mapScoreToSeverity } from "./mitreCard/mitreData";
 import type { AlertBase } from "../types/defensive";
 
+const ALERT_LIMIT = 50;
+
+const toAlertBase = (item: ThreatAlertItem): AlertBase => ({
+    incident_id: item.incidentID || "N/A",
+    description: item.threatName || "Unknown Threat",
+    severity: mapScoreToSeverity(item.serverity || "0"),
+    timestamp: new Date().toISOString(),
+    event_id: item.incidentID || "0",
+});
+
 
 const ThreatAlertList: React.FC = () => {
     const [threatData, setThreatData] = useState<AlertBase[]>([]);
 
     useEffect(() => {
+        let controller: AbortController | null = null;
+
+        // Stream แบบ NDJSON: แสดง alert ชุดแรกได้ทันทีโดยไม่ต้องรอทั้ง list
         const loadAllData = async () => {
-            const threat = await fetchLatestAlert();
-            console.log("Show threat:", threat);
-            setThreatData(threat);
+            controller?.abort();
+            controller = new AbortController();
+            const received: AlertBase[] = [];
+            try {
+                await streamThreatAlerts((alerts) => {
+                    received.push(...alerts.map(toAlertBase));
+                    setThreatData([...received]);
+                }, { limit: ALERT_LIMIT, signal: controller.signal });
+            } catch (error) {
+                if ((error as Error).name !== "AbortError") {
+                    console.error("Error streaming threat alerts:", error);
+                }
+            }
         };
 
         loadAllData();
 
         const interval = setInterval(loadAllData, 30000);
-        return () => clearInterval(interval);
+        return () => {
+            clearInterval(interval);
+            controller?.abort();
+        };
     }, []);
 
     function getSeverityColor(severity?: string): string {
@@ -423,6 +423,7 @@ const MapViewBangkok: React.FC<MapViewProps> = ({
     []
   );
   const [bangkokGeoJSON, setBangkokGeoJSON] = useState<any>(null);
+  const [geometryKey, setGeometryKey] = useState(0);
 
   const [flyToTarget, setFlyToTarget] = useState<{
     lat: number;
@@ -441,11 +442,29 @@ const MapViewBangkok: React.FC<MapViewProps> = ({
   // 👇 เก็บ incident ที่ต้องการเปิด popup เมื่อ marker พร้อม
   const pendingPopupIncidentRef = useRef<string | null>(null);
 
+  // ระดับความละเอียดของขอบเขตเขต ตรงกับที่ backend เตรียมไว้ (10, 12, 14, 16 = เต็ม)
+  const geometryZoom =
+    zoomLevel >= 16 ? 16 : zoomLevel >= 14 ? 14 : zoomLevel >= 12 ? 12 : 10;
+
   useEffect(() => {
-    fetch("/data/bangkok-districts.geojson")
-      .then((res) => res.json())
-      .then((data) => setBangkokGeoJSON(data));
-  }, []);
+    const controller = new AbortController();
+    fetch(`/api/geo/districts?zoom=${geometryZoom}`, { signal: controller.signal })
+      .then((res) => {
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        return res.json();
+      })
+      .catch((err) => {
+        if (err.name === "AbortError") throw err;
+        // backend ไม่มีไฟล์ geometry -> ใช้ไฟล์เต็มใน public แทน
+        return fetch("/data/bangkok-districts.geojson").then((res) => res.json());
+      })
+      .then((data) => {
+        setBangkokGeoJSON(data);
+        setGeometryKey((key) => key + 1);
+      })
+      .catch(() => {});
+    return () => controller.abort();
+  }, [geometryZoom]);
 
   useEffect(() => {
     const loadNodeData = async () => {
@@ -658,6 +677,8 @@ const MapViewBangkok: React.FC<MapViewProps> = ({
 
       {bangkokGeoJSON && (
         <GeoJSON
+          // GeoJSON ไม่ re-render เมื่อ data เปลี่ยน จึงใช้ key บังคับ
+          key={geometryKey}
           data={bangkokGeoJSON}
           style={{
             color: "orange",
@@ -0,0 +1,81 @@
+// src/hooks/useDashboardStream.ts
+import { useEffect, useState } from "react";
+
+// Event ที่ backend ส่งมาจาก /api/stream
+interface PatchOperation {
+  op: "add" | "remove" | "replace";
+  path: string;
+  value?: unknown;
+}
+
+type TopicData = Record<string, unknown>;
+
+const decodePointer = (path: string): string[] =>
+  path
+    .split("/")
+    .slice(1)
+    .map((part) => part.replace(/~1/g, "/").replace(/~0/g, "~"));
+
+// Apply JSON-patch operations (add/remove/replace) แบบ immutable
+const applyPatch = (doc: unknown, ops: PatchOperation[]): unknown => {
+  let result = structuredClone(doc);
+  for (const op of ops) {
+    const keys = decodePointer(op.path);
+    if (keys.length === 0) {
+      result = op.value;
+      continue;
+    }
+    // eslint-disable-next-line @typescript-eslint/no-explicit-any
+    let target: any = result;
+    for (const key of keys.slice(0, -1)) target = target[key];
+    const last = keys[keys.length - 1];
+    if (op.op === "remove") {
+      if (Array.isArray(target)) target.splice(Number(last), 1);
+      else delete target[last];
+    } else {
+      target[last] = op.value;
+    }
+  }
+  return result;
+};
+
+/**
+ * Subscribe to dashboard topics over Server-Sent Events
+ * (defstatus, severities, alerts, bkkthreat, nodeplot:{layer}, ...)
+ * `connected` เป็น false เมื่อ stream ใช้ไม่ได้ ให้ component fallback ไป polling
+ */
+export const useDashboardStream = (topics: string[]) => {
+  const [data, setData] = useState<TopicData>({});
+  const [connected, setConnected] = useState(false);
+  const topicKey = topics.join(",");
+
+  useEffect(() => {
+    if (!topicKey) return;
+    const source = new EventSource(
+      `/api/stream?topics=${encodeURIComponent(topicKey)}`
+    );
+
+    source.onopen = () => setConnected(true);
+    source.onerror = () => setConnected(false);
+
+    source.addEventListener("snapshot", (event) => {
+      const message = JSON.parse((event as MessageEvent).data);
+      setData((prev) => ({ ...prev, [message.topic]: message.data }));
+    });
+
+    source.addEventListener("patch", (event) => {
+      const message = JSON.parse((event as MessageEvent).data);
+      setData((prev) => ({
+        ...prev,
+        [message.topic]: applyPatch(prev[message.topic], message.patch),
+      }));
+    });
+
+    return () => {
+      source.close();
+      setConnected(false);
+    };
+  }, [topicKey]);
+
+  return { data, connected };
+};
@@ -80,6 +80,48 @@ export interface AlertSummary {
   alert_summaries: AlertItem[];  // Changed from alert_summarys
 }
 
+export interface ThreatAlertItem {
+  incidentID?: string;
+  threatName?: string;
+  threatDetail?: string;
+  serverity?: string;
+  error?: string;
+}
+
+/**
+ * อ่าน /api/threatalerts แบบ NDJSON ทีละบรรทัด
+ * onAlerts ถูกเรียกทุกครั้งที่ได้ alert ชุดใหม่ เพื่อให้ render หน้าแรกได้ทันที
+ */
+export async function streamThreatAlerts(
+  onAlerts: (alerts: ThreatAlertItem[]) => void,
+  options: { limit?: number; severity?: string; signal?: AbortSignal } = {}
+): Promise<void> {
+  const params = new URLSearchParams({ format: "ndjson" });
+  if (options.limit) params.set("limit", String(options.limit));
+  if (options.severity) params.set("severity", options.severity);
+
+  const response = await fetch(`/api/threatalerts?${params}`, {
+    headers: { Accept: "application/x-ndjson" },
+    signal: options.signal,
+  });
+  if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    const lines = buffer.split("\n");
+    buffer = lines.pop() ?? "";
+    const alerts = lines.filter((line) => line.trim()).map((line) => JSON.parse(line) as ThreatAlertItem);
+    const failed = alerts.find((alert) => alert.error);
+    if (failed) throw new Error(failed.error);
+    if (alerts.length) onAlerts(alerts);
+  }
+  if (buffer.trim()) onAlerts([JSON.parse(buffer) as ThreatAlertItem]);
+}
+
 export async function fetchAlertSummary(): Promise<AlertSummary> {
   try {
     const response = await axios.get<AlertSummary>(